@@ -2,8 +2,11 @@
 Servidor API REST para atualização de atividades
 Permite atualizar tarefas via requisições HTTP
 """
-from fastapi import FastAPI, HTTPException, Depends, Request, UploadFile, File
+from fastapi import FastAPI, HTTPException, Depends, Request, UploadFile, File, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.middleware.gzip import GZipMiddleware
+from fastapi.concurrency import run_in_threadpool
 try:
     from fastapi.middleware.base import BaseHTTPMiddleware
 except ImportError:
@@ -11,46 +14,141 @@ except ImportError:
     from starlette.middleware.base import BaseHTTPMiddleware
 from pydantic import BaseModel, Field
 from typing import Optional, List
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import logging
 import os
 import time
 import json
-import pandas as pd
-import io
+import threading
+import uuid
+import base64
+import hashlib
 
-from modules.database import DatabaseManager
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+from modules.database import DatabaseManager, DataVersionWatcher
+from modules import metrics, sql_trace
 from modules.calculations import (
     calculate_delay, parse_datetime_string, 
     validate_datetime_string
 )
-from config import DATE_FORMAT, STATUS_OPCOES
+from config import (
+    DATE_FORMAT, STATUS_OPCOES, SEQUENCIAS, STATUS_COLORS,
+    RESPONSE_COMPRESSION_MIN_BYTES, RESPONSE_COMPRESSION_LEVEL,
+    SQL_TRACE, SQL_TRACE_N_PLUS_ONE_MIN, UPLOAD_JOB_WORKERS, UPLOAD_MAX_MB
+)
 
 # Configurar logging com nível baseado em variável de ambiente
 DEBUG_MODE = os.getenv('API_DEBUG', 'false').lower() in ('true', '1', 'yes')
 LOG_LEVEL = logging.DEBUG if DEBUG_MODE else logging.INFO
 
-logging.basicConfig(
-    level=LOG_LEVEL,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('api_server.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
-if DEBUG_MODE:
-    logger.info("=" * 60)
-    logger.info("MODO DEBUG ATIVADO")
-    logger.info("Todas as requisicoes serao logadas em detalhes")
-    logger.info("=" * 60)
+# Estado do servidor, criado em startup_server() (lifespan). Importar este
+# módulo não tem efeitos colaterais: os processos "spawn" de leitura do Excel
+# reimportam o script principal como __mp_main__.
+db_manager = None
+data_version_watcher = None
+upload_executor = None
+# Serializa a gravação das importações: save_excel_data substitui toda a
+# excel_data, então dois jobs simultâneos só podem ler/processar em paralelo
+_upload_write_lock = threading.Lock()
+
+
+def configure_logging():
+    """Configura o log em arquivo e console (sem efeito se já configurado)"""
+    logging.basicConfig(
+        level=LOG_LEVEL,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('api_server.log', encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+
+
+def startup_server():
+    """Inicializa banco, jobs de upload e observador de alterações"""
+    global db_manager, data_version_watcher, upload_executor
+    
+    configure_logging()
+    
+    # Rastreamento de SQL (antes de abrir as conexões, para que recebam o trace callback)
+    if SQL_TRACE:
+        sql_trace.enable(SQL_TRACE_N_PLUS_ONE_MIN)
+        logger.info(f"Rastreamento de SQL ativado (N+1 a partir de {SQL_TRACE_N_PLUS_ONE_MIN} execucoes)")
+    
+    if DEBUG_MODE:
+        logger.info("=" * 60)
+        logger.info("MODO DEBUG ATIVADO")
+        logger.info("Todas as requisicoes serao logadas em detalhes")
+        logger.info("=" * 60)
+    
+    db_manager = DatabaseManager()
+    
+    # Jobs de upload que estavam em andamento quando o servidor parou não serão retomados
+    interrompidos = db_manager.fail_interrupted_upload_jobs()
+    if interrompidos:
+        logger.warning(f"{interrompidos} job(s) de upload interrompido(s) marcados como falhos")
+    
+    # Pool limitado para processar uploads fora das requisições HTTP
+    upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_JOB_WORKERS, thread_name_prefix="upload-job")
+    
+    # Cache HTTP: ETag derivado do contador de alterações do banco (PRAGMA data_version)
+    data_version_watcher = DataVersionWatcher(db_manager.db_path)
+
+
+def shutdown_server():
+    """Aguarda os jobs de upload em andamento e libera os recursos"""
+    from modules.excel_parser import shutdown_process_pool
+    
+    if upload_executor is not None:
+        upload_executor.shutdown(wait=True)
+    shutdown_process_pool()
+    if data_version_watcher is not None:
+        data_version_watcher.close()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Ciclo de vida do servidor (startup/shutdown)"""
+    startup_server()
+    try:
+        yield
+    finally:
+        shutdown_server()
+
+
+class FastJSONResponse(JSONResponse):
+    """Resposta JSON serializada com orjson (json padrão se orjson não estiver instalado)"""
+
+    def render(self, content) -> bytes:
+        if orjson is None:
+            return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+        return orjson.dumps(
+            content,
+            default=str,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+
 
 # Criar aplicação FastAPI
 app = FastAPI(
     title="API de Atualização de Atividades",
     description="API REST para atualizar tarefas do sistema de gerenciamento de CRQs",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan
 )
 
 # Middleware para logar requisições (modo debug)
@@ -101,10 +199,138 @@ class DebugMiddleware(BaseHTTPMiddleware):
             logger.error(traceback.format_exc())
             raise
 
+class MetricsMiddleware:
+    """
+    Middleware ASGI sempre ativo que alimenta GET /metrics
+    
+    Mede latência por rota, tamanho de requisição e resposta, requisições em
+    andamento e quantidade/tempo de consultas SQLite de cada requisição,
+    sem ler nem copiar os corpos.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        start_time = time.perf_counter()
+        token, consultas = metrics.start_request_queries()
+        tracer = sql_trace.get_tracer()
+        trace_token = tracer.start_request() if tracer is not None else None
+        tamanhos = {"request": 0, "response": 0}
+        status = {"code": 500}
+        
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                tamanhos["request"] += len(message.get("body", b""))
+            return message
+        
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            elif message["type"] == "http.response.body":
+                tamanhos["response"] += len(message.get("body", b""))
+            await send(message)
+        
+        metrics.REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            metrics.REQUESTS_IN_FLIGHT.dec()
+            metrics.finish_request_queries(token)
+            # Rota como template (ex: /activity/{sequencia}/{seq}) para não explodir os rótulos
+            route = scope.get("route")
+            rota = getattr(route, "path", None) or "nao_encontrada"
+            method = scope["method"]
+            metrics.REQUESTS_TOTAL.inc(1, method, rota, str(status["code"]))
+            metrics.REQUEST_DURATION.observe(time.perf_counter() - start_time, method, rota)
+            metrics.REQUEST_SIZE.observe(tamanhos["request"], method, rota)
+            metrics.RESPONSE_SIZE.observe(tamanhos["response"], method, rota)
+            metrics.REQUEST_SQLITE_QUERIES.observe(consultas[0], method, rota)
+            metrics.REQUEST_SQLITE_SECONDS.observe(consultas[1], method, rota)
+            if trace_token is not None:
+                tracer.finish_request(trace_token, f"{method} {rota}")
+
+
+class _UploadTooLarge(HTTPException):
+    """Limite excedido durante a leitura do corpo (HTTPException: o FastAPI não a converte em 400)"""
+    
+    def __init__(self):
+        super().__init__(status_code=413, detail=f"Arquivo excede o limite de {UPLOAD_MAX_MB} MB")
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Middleware ASGI que recusa uploads acima de UPLOAD_MAX_MB antes de lê-los
+    
+    O FastAPI recebe e grava todo o corpo multipart antes de chamar o endpoint;
+    aqui a requisição é recusada pelo Content-Length ou, sem ele (chunked),
+    assim que os bytes recebidos passam do limite.
+    """
+    
+    # Margem para cabeçalhos e separadores do multipart
+    MULTIPART_OVERHEAD = 64 * 1024
+    
+    def __init__(self, app, paths=("/upload-excel",)):
+        self.app = app
+        self.paths = set(paths)
+        self.max_bytes = UPLOAD_MAX_MB * 1024 * 1024 + self.MULTIPART_OVERHEAD
+    
+    async def _reject(self, send):
+        corpo = json.dumps({"detail": f"Arquivo excede o limite de {UPLOAD_MAX_MB} MB"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"),
+                        (b"content-length", str(len(corpo)).encode()),
+                        (b"connection", b"close")]
+        })
+        await send({"type": "http.response.body", "body": corpo})
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._reject(send)
+            return
+        
+        recebido = {"bytes": 0}
+        iniciada = {"resposta": False}
+        
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                recebido["bytes"] += len(message.get("body", b""))
+                if recebido["bytes"] > self.max_bytes:
+                    raise _UploadTooLarge()
+            return message
+        
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                iniciada["resposta"] = True
+            await send(message)
+        
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        except _UploadTooLarge:
+            if not iniciada["resposta"]:
+                await self._reject(send)
+
 # Adicionar middleware de debug
 if DEBUG_MODE:
     app.add_middleware(DebugMiddleware)
 
+# Limite de upload verificado antes de o corpo ser lido (dentro do CORS, para
+# que a resposta 413 chegue ao navegador)
+app.add_middleware(UploadSizeLimitMiddleware)
+
 # Configurar CORS para permitir requisições de qualquer origem
 app.add_middleware(
     CORSMiddleware,
@@ -114,8 +340,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Instância global do DatabaseManager
-db_manager = DatabaseManager()
+# Compressão das respostas acima do tamanho mínimo (brotli se disponível, senão gzip)
+if BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=RESPONSE_COMPRESSION_MIN_BYTES)
+else:
+    app.add_middleware(
+        GZipMiddleware,
+        minimum_size=RESPONSE_COMPRESSION_MIN_BYTES,
+        compresslevel=RESPONSE_COMPRESSION_LEVEL
+    )
+
+# Métricas (middleware mais externo: mede o tamanho já comprimido)
+app.add_middleware(MetricsMiddleware)
 
 
 # Modelos Pydantic para validação
@@ -188,6 +424,98 @@ class BulkActivityResponse(BaseModel):
     results: List[ActivityResponse]
 
 
+# Formato de "results" nas respostas em lote (?results=):
+#   full: um item por atividade, na ordem enviada (padrão)
+#   failures: apenas as atividades que falharam
+#   bitmap: falhas + "results_bitmap" com um bit de sucesso por atividade
+BULK_RESULTS_PATTERN = "^(full|failures|bitmap)$"
+
+
+def encode_results_bitmap(sucessos):
+    """
+    Codifica o resultado de cada atividade como bitmap em base64
+    
+    Args:
+        sucessos: Lista de bool na ordem das atividades enviadas
+    
+    Returns:
+        str: Base64 dos bytes; o bit i (menos significativo primeiro) é a atividade i
+    """
+    bitmap = bytearray((len(sucessos) + 7) // 8)
+    for i, sucesso in enumerate(sucessos):
+        if sucesso:
+            bitmap[i >> 3] |= 1 << (i & 7)
+    return base64.b64encode(bytes(bitmap)).decode("ascii")
+
+
+def bulk_results_response(resposta, results, modo):
+    """
+    Monta a resposta em lote no formato de results escolhido
+    
+    A resposta é serializada diretamente (sem jsonable_encoder), o que
+    importa em cargas com dezenas de milhares de atividades.
+    
+    Args:
+        resposta: Dicionário com os totais da operação
+        results: Lista de ActivityResponse na ordem das atividades
+        modo: "full", "failures" ou "bitmap"
+    
+    Returns:
+        FastJSONResponse: Resposta pronta
+    """
+    if modo == "full":
+        resposta["results"] = [r.model_dump() for r in results]
+    else:
+        resposta["results"] = [r.model_dump() for r in results if not r.success]
+        if modo == "bitmap":
+            resposta["results_bitmap"] = encode_results_bitmap([r.success for r in results])
+    return FastJSONResponse(resposta)
+
+
+# Metadados estáticos expostos em GET /metadata
+METADATA = {
+    "sequencias": SEQUENCIAS,
+    "status_opcoes": STATUS_OPCOES,
+    "status_colors": STATUS_COLORS,
+    "date_format": DATE_FORMAT
+}
+METADATA_ETAG = hashlib.sha1(json.dumps(METADATA, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+# Metadados estáticos: podem ficar em cache no cliente
+METADATA_CACHE_CONTROL = "public, max-age=3600"
+# Dados: o cliente guarda a resposta mas revalida com If-None-Match
+DATA_CACHE_CONTROL = "no-cache"
+
+
+def versioned_etag(request: Request):
+    """
+    Calcula o ETag de uma leitura sem consultar as tabelas
+    
+    O ETag combina a versão atual do banco com a rota e os parâmetros da
+    requisição: enquanto nenhuma alteração for confirmada, a mesma consulta
+    tem o mesmo ETag.
+    
+    Returns:
+        str: ETag fraco
+    """
+    chave = f"{request.url.path}?{sorted(request.query_params.multi_items())}"
+    digest = hashlib.sha1(chave.encode("utf-8")).hexdigest()[:16]
+    return f'W/"{data_version_watcher.version()}-{digest}"'
+
+
+def etag_matches(request: Request, etag):
+    """Verifica se o cliente já tem a versão atual (If-None-Match)"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+
+
+def not_modified(etag, cache_control=DATA_CACHE_CONTROL):
+    """Resposta 304 com os mesmos cabeçalhos de cache da resposta completa"""
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
 # Endpoints
 @app.get("/")
 async def root():
@@ -198,9 +526,16 @@ async def root():
         "endpoints": {
             "GET /": "Informações da API",
             "GET /health": "Status de saúde da API",
+            "GET /metadata": "CRQs, status e formatos (cacheável)",
+            "GET /metrics": "Métricas de desempenho (formato Prometheus)",
+            "GET /debug/sql-trace": "Relatório do rastreamento de SQL (SQL_TRACE=true)",
             "PUT /activity": "Atualizar uma atividade",
             "PUT /activities/bulk": "Atualizar múltiplas atividades",
-            "GET /activity/{sequencia}/{seq}": "Buscar uma atividade"
+            "GET /activity/{sequencia}/{seq}": "Buscar uma atividade",
+            "GET /stats": "Totais do dashboard por CRQ e geral (cacheado)",
+            "GET /activities": "Listar atividades (filtros, busca, campos e paginação por cursor)",
+            "POST /upload-excel": "Enviar arquivo Excel (processamento em segundo plano)",
+            "GET /jobs/{job_id}": "Acompanhar processamento de upload"
         }
     }
 
@@ -209,8 +544,8 @@ async def root():
 async def health_check():
     """Verifica saúde da API e conexão com banco"""
     try:
-        conn = db_manager.get_connection()
-        conn.close()
+        # Consulta à conexão já aberta do observador (sem abrir conexão nem ler tabelas)
+        data_version_watcher.version()
         return {
             "status": "healthy",
             "database": "connected",
@@ -221,16 +556,135 @@ async def health_check():
         raise HTTPException(status_code=503, detail=f"Database connection failed: {str(e)}")
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """Métricas de desempenho no formato texto do Prometheus"""
+    return Response(
+        content=metrics.registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+def get_active_sql_tracer():
+    """Rastreador de SQL ativo ou 404 se SQL_TRACE estiver desligado"""
+    tracer = sql_trace.get_tracer()
+    if tracer is None:
+        raise HTTPException(status_code=404, detail="Rastreamento de SQL desativado (defina SQL_TRACE=true)")
+    return tracer
+
+
+@app.get("/debug/sql-trace")
+async def get_sql_trace_report(
+    format: str = Query("json", pattern="^(json|text)$"),
+    limit: int = Query(50, ge=1, le=1000)
+):
+    """
+    Relatório dos comandos SQL: chamadas, tempo total, média, p95 e máximo
+    por comando normalizado, além das ocorrências de N+1 por rota
+    """
+    tracer = get_active_sql_tracer()
+    if format == "text":
+        return Response(content=tracer.format_report(limit), media_type="text/plain; charset=utf-8")
+    return tracer.report(limit)
+
+
+@app.delete("/debug/sql-trace")
+async def reset_sql_trace():
+    """Zera as estatísticas do rastreamento de SQL"""
+    get_active_sql_tracer().reset()
+    return {"success": True, "message": "Estatísticas de SQL zeradas"}
+
+
+@app.get("/metadata")
+async def get_metadata(request: Request, response: Response):
+    """
+    Metadados estáticos (CRQs, status, cores e formato de data)
+    
+    Não consultam o banco e mudam apenas com nova versão da aplicação:
+    respondem com Cache-Control público e ETag do conteúdo.
+    """
+    etag = f'"{METADATA_ETAG}"'
+    if etag_matches(request, etag):
+        return not_modified(etag, METADATA_CACHE_CONTROL)
+    
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = METADATA_CACHE_CONTROL
+    return METADATA
+
+
+# Estatísticas por versão do banco: uma alteração confirmada gera nova versão (e nova consulta)
+_stats_cache = {}
+_stats_cache_lock = threading.Lock()
+
+
+def get_cached_statistics(rollback):
+    """
+    Estatísticas do dashboard reaproveitadas enquanto o banco não muda
+    
+    Args:
+        rollback: None para todas, True apenas rollback, False apenas principais
+        
+    Returns:
+        tuple: (versão do banco, estatísticas)
+    """
+    versao = data_version_watcher.version()
+    chave = (versao, rollback)
+    with _stats_cache_lock:
+        if chave in _stats_cache:
+            return versao, _stats_cache[chave]
+    
+    stats = db_manager.get_statistics(rollback=rollback)
+    
+    with _stats_cache_lock:
+        # Mantém apenas a versão atual
+        for antiga in [k for k in _stats_cache if k[0] != versao]:
+            del _stats_cache[antiga]
+        _stats_cache[chave] = stats
+    return versao, stats
+
+
+@app.get("/stats")
+async def get_stats(request: Request, response: Response,
+                    rollback: str = Query("all", pattern="^(all|principal|rollback)$")):
+    """
+    Totais do dashboard (contagens e percentuais por CRQ e geral) calculados no banco
+    
+    Uma única consulta agrupada, cacheada em memória até a próxima alteração do
+    banco. Suporta ETag/If-None-Match (304).
+    """
+    etag = versioned_etag(request)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    filtro = {"all": None, "principal": False, "rollback": True}[rollback]
+    try:
+        _, stats = await run_in_threadpool(get_cached_statistics, filtro)
+    except Exception as e:
+        logger.error(f"Erro ao calcular estatísticas: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro ao calcular estatísticas: {str(e)}")
+    
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = DATA_CACHE_CONTROL
+    return stats
+
+
 @app.get("/activity/{sequencia}/{seq}")
-async def get_activity(sequencia: str, seq: int, excel_data_id: Optional[int] = None):
-    """Busca uma atividade específica"""
+async def get_activity(request: Request, response: Response, sequencia: str, seq: int,
+                       excel_data_id: Optional[int] = None):
+    """Busca uma atividade específica (suporta ETag/If-None-Match)"""
+    etag = versioned_etag(request)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
     try:
-        activity = db_manager.get_activity_control(seq, sequencia, excel_data_id)
+        activity = db_manager.get_activity_dao().get(seq, sequencia, excel_data_id)
         if not activity:
             raise HTTPException(
                 status_code=404,
                 detail=f"Atividade não encontrada: Seq {seq}, CRQ {sequencia}"
             )
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = DATA_CACHE_CONTROL
         return {
             "success": True,
             "activity": activity
@@ -242,6 +696,86 @@ async def get_activity(sequencia: str, seq: int, excel_data_id: Optional[int] =
         raise HTTPException(status_code=500, detail=f"Erro ao buscar atividade: {str(e)}")
 
 
+ACTIVITIES_PAGE_MAX = 1000
+
+
+def encode_page_cursor(chave):
+    """Codifica a chave (sequencia, seq, excel_data_id) da última linha como cursor opaco"""
+    return base64.urlsafe_b64encode(json.dumps(list(chave)).encode("utf-8")).decode("ascii")
+
+
+def decode_page_cursor(cursor):
+    """
+    Decodifica o cursor recebido em ?cursor=
+    
+    Returns:
+        tuple: Chave (sequencia, seq, excel_data_id)
+    """
+    try:
+        sequencia, seq, excel_data_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return sequencia, seq, int(excel_data_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor de paginação inválido")
+
+
+@app.get("/activities")
+async def list_activities(
+    request: Request,
+    response: Response,
+    sequencia: Optional[str] = None,
+    status: Optional[str] = Query(None, description="Um ou mais status separados por vírgula"),
+    is_milestone: Optional[bool] = None,
+    is_rollback: Optional[bool] = None,
+    arquivado: Optional[bool] = None,
+    q: Optional[str] = Query(None, description="Texto procurado no nome da atividade"),
+    fields: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula"),
+    cursor: Optional[str] = Query(None, description="Cursor retornado em next_cursor"),
+    limit: int = Query(100, ge=1, le=ACTIVITIES_PAGE_MAX)
+):
+    """
+    Lista atividades com filtros, busca e paginação por cursor
+    
+    A paginação é por chave (sequencia, seq, excel_data_id): use next_cursor
+    para buscar a página seguinte. Suporta ETag/If-None-Match (304).
+    """
+    etag = versioned_etag(request)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    campos = None
+    if fields:
+        campos = [campo.strip() for campo in fields.split(",") if campo.strip()]
+        invalidos = [campo for campo in campos if campo not in DatabaseManager.ACTIVITY_LIST_FIELDS]
+        if invalidos:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Campos inválidos: {invalidos}. Disponíveis: {list(DatabaseManager.ACTIVITY_LIST_FIELDS)}"
+            )
+    
+    status_list = [item.strip() for item in status.split(",") if item.strip()] if status else None
+    after = decode_page_cursor(cursor) if cursor else None
+    
+    try:
+        activities, proxima = await run_in_threadpool(
+            db_manager.list_activities,
+            sequencia=sequencia, status=status_list, is_milestone=is_milestone,
+            is_rollback=is_rollback, arquivado=arquivado, q=q, fields=campos,
+            after=after, limit=limit
+        )
+    except Exception as e:
+        logger.error(f"Erro ao listar atividades: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro ao listar atividades: {str(e)}")
+    
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = DATA_CACHE_CONTROL
+    return {
+        "success": True,
+        "count": len(activities),
+        "next_cursor": encode_page_cursor(proxima) if proxima else None,
+        "activities": activities
+    }
+
+
 @app.post("/activity")
 async def create_activity(activity: ActivityCreate):
     """
@@ -350,64 +884,18 @@ async def create_activity(activity: ActivityCreate):
             logger.warning(f"Erro ao processar atraso: {e}")
         
         try:
-            # Salvar com flag de rollback usando SQL direto
-            conn = db_manager.get_connection()
-            cursor = conn.cursor()
-            
-            # Verificar se já existe
-            cursor.execute("""
-                SELECT id FROM activity_control 
-                WHERE seq = ? AND sequencia = ? AND excel_data_id = ?
-            """, (activity.seq, activity.sequencia, excel_data_id))
-            
-            existing_control = cursor.fetchone()
-            
-            if existing_control:
-                # Atualizar
-                cursor.execute("""
-                    UPDATE activity_control
-                    SET status = COALESCE(?, status),
-                        horario_inicio_real = ?,
-                        horario_fim_real = ?,
-                        atraso_minutos = ?,
-                        observacoes = ?,
-                        is_rollback = ?,
-                        arquivado = 0,
-                        data_atualizacao = ?
-                    WHERE seq = ? AND sequencia = ? AND excel_data_id = ?
-                """, (
-                    activity.status or "Planejado",
-                    activity.horario_inicio_real,
-                    activity.horario_fim_real,
-                    atraso_minutos,
-                    activity.observacoes,
-                    1 if activity.is_rollback else 0,
-                    datetime.now().isoformat(),
-                    activity.seq,
-                    activity.sequencia,
-                    excel_data_id
-                ))
-            else:
-                # Inserir novo
-                cursor.execute("""
-                    INSERT INTO activity_control
-                    (seq, sequencia, excel_data_id, status, horario_inicio_real, 
-                     horario_fim_real, atraso_minutos, observacoes, is_rollback, arquivado)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
-                """, (
-                    activity.seq,
-                    activity.sequencia,
-                    excel_data_id,
-                    activity.status or "Planejado",
-                    activity.horario_inicio_real,
-                    activity.horario_fim_real,
-                    atraso_minutos,
-                    activity.observacoes,
-                    1 if activity.is_rollback else 0
-                ))
-            
-            conn.commit()
-            conn.close()
+            # Salvar com flag de rollback (upsert único via DAO)
+            db_manager.get_activity_dao().upsert_many([{
+                "seq": activity.seq,
+                "sequencia": activity.sequencia,
+                "excel_data_id": excel_data_id,
+                "status": activity.status or "Planejado",
+                "horario_inicio_real": activity.horario_inicio_real,
+                "horario_fim_real": activity.horario_fim_real,
+                "atraso_minutos": atraso_minutos,
+                "observacoes": activity.observacoes,
+                "is_rollback": activity.is_rollback
+            }], replace=True)
             
             total_time = time.time() - start_time
             logger.info(f"Registro de controle salvo: Seq {activity.seq}, CRQ {activity.sequencia}, Excel_ID: {excel_data_id}, Rollback: {activity.is_rollback}, Tempo: {total_time:.3f}s")
@@ -499,7 +987,8 @@ async def update_activity(activity: ActivityUpdate):
             # Mas avisar no log
         
         # Buscar atividade existente para calcular atraso
-        existing = db_manager.get_activity_control(
+        activity_dao = db_manager.get_activity_dao()
+        existing = activity_dao.get(
             activity.seq, 
             activity.sequencia, 
             activity.excel_data_id
@@ -548,19 +1037,19 @@ async def update_activity(activity: ActivityUpdate):
         
         # Salvar no banco
         try:
-            db_manager.save_activity_control(
-                seq=activity.seq,
-                sequencia=activity.sequencia,
+            activity_dao.upsert(
+                activity.seq,
+                activity.sequencia,
+                activity.excel_data_id,
                 status=activity.status,
                 horario_inicio_real=activity.horario_inicio_real,
                 horario_fim_real=activity.horario_fim_real,
                 atraso_minutos=atraso_minutos,
-                observacoes=activity.observacoes,
-                excel_data_id=activity.excel_data_id
+                observacoes=activity.observacoes
             )
             
             # Verificar se foi salvo corretamente
-            saved = db_manager.get_activity_control(
+            saved = activity_dao.get(
                 activity.seq, 
                 activity.sequencia, 
                 activity.excel_data_id
@@ -601,21 +1090,8 @@ async def archive_execution_activities(sequencia: str):
         logger.debug(f"[ARCHIVE] Iniciando arquivamento de execucao para {sequencia}")
     
     try:
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
-        
         # Arquivar atividades de execução (não rollback) da sequência
-        cursor.execute("""
-            UPDATE activity_control
-            SET arquivado = 1,
-                status = 'Arquivado',
-                data_atualizacao = ?
-            WHERE sequencia = ? AND (is_rollback = 0 OR is_rollback IS NULL) AND arquivado = 0
-        """, (datetime.now().isoformat(), sequencia))
-        
-        archived_count = cursor.rowcount
-        conn.commit()
-        conn.close()
+        archived_count = db_manager.get_activity_dao().archive_execution(sequencia)
         
         total_time = time.time() - start_time
         logger.info(f"Arquivadas {archived_count} atividades de execucao para {sequencia} em {total_time:.3f}s")
@@ -645,21 +1121,8 @@ async def activate_rollback_activities(sequencia: str):
         logger.debug(f"[ACTIVATE ROLLBACK] Iniciando ativacao de rollback para {sequencia}")
     
     try:
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
-        
         # Ativar atividades de rollback (desarquivar e definir status como Planejado)
-        cursor.execute("""
-            UPDATE activity_control
-            SET arquivado = 0,
-                status = 'Planejado',
-                data_atualizacao = ?
-            WHERE sequencia = ? AND is_rollback = 1
-        """, (datetime.now().isoformat(), sequencia))
-        
-        activated_count = cursor.rowcount
-        conn.commit()
-        conn.close()
+        activated_count = db_manager.get_activity_dao().activate_rollback(sequencia)
         
         total_time = time.time() - start_time
         logger.info(f"Ativadas {activated_count} atividades de rollback para {sequencia} em {total_time:.3f}s")
@@ -680,15 +1143,19 @@ async def activate_rollback_activities(sequencia: str):
 
 
 @app.post("/activities/bulk-create")
-async def create_activities_bulk(bulk_create: BulkActivityCreate):
+async def create_activities_bulk(
+    bulk_create: BulkActivityCreate,
+    results_mode: str = Query("full", alias="results", pattern=BULK_RESULTS_PATTERN)
+):
     """
     Cria/atualiza múltiplas atividades em lote via POST
     
     Recebe todas as atividades do Excel e faz a carga completa no banco.
     Compara com dados existentes e cria/atualiza conforme necessário.
+    Use ?results=failures ou ?results=bitmap para uma resposta compacta.
     """
     start_time = time.time()
-    results = []
+    results = [None] * len(bulk_create.activities)
     created = 0
     updated = 0
     failed = 0
@@ -698,12 +1165,19 @@ async def create_activities_bulk(bulk_create: BulkActivityCreate):
         logger.debug(f"[BULK] Iniciando processamento de {len(bulk_create.activities)} atividades")
         logger.debug(f"[BULK] Primeiras 3 atividades: {[{'seq': a.seq, 'sequencia': a.sequencia, 'rollback': a.is_rollback} for a in bulk_create.activities[:3]]}")
     
-    for activity in bulk_create.activities:
+    controles_pendentes = []
+    
+    # Uma transação para excel_data e activity_control; cada atividade em um
+    # savepoint, para que uma falha desfaça apenas a própria linha
+    conn = db_manager.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN")
+    
+    for indice, activity in enumerate(bulk_create.activities):
         try:
-            # Verificar se já existe
-            conn = db_manager.get_connection()
-            cursor = conn.cursor()
+            cursor.execute("SAVEPOINT atividade")
             
+            # Verificar se já existe
             cursor.execute("""
                 SELECT id FROM excel_data 
                 WHERE seq = ? AND sequencia = ?
@@ -762,8 +1236,7 @@ async def create_activities_bulk(bulk_create: BulkActivityCreate):
                 created += 1
                 action = "created"
             
-            conn.commit()
-            conn.close()
+            cursor.execute("RELEASE SAVEPOINT atividade")
             
             # Criar/atualizar registro de controle
             atraso_minutos = None
@@ -783,83 +1256,64 @@ async def create_activities_bulk(bulk_create: BulkActivityCreate):
             except:
                 pass
             
-            # Salvar com flag de rollback usando SQL direto
-            conn_control = db_manager.get_connection()
-            cursor_control = conn_control.cursor()
-            
-            # Verificar se já existe
-            cursor_control.execute("""
-                SELECT id FROM activity_control 
-                WHERE seq = ? AND sequencia = ? AND excel_data_id = ?
-            """, (activity.seq, activity.sequencia, excel_data_id))
-            
-            existing_control = cursor_control.fetchone()
-            
-            if existing_control:
-                # Atualizar
-                cursor_control.execute("""
-                    UPDATE activity_control
-                    SET status = COALESCE(?, status),
-                        horario_inicio_real = ?,
-                        horario_fim_real = ?,
-                        atraso_minutos = ?,
-                        observacoes = ?,
-                        is_rollback = ?,
-                        arquivado = 0,
-                        data_atualizacao = ?
-                    WHERE seq = ? AND sequencia = ? AND excel_data_id = ?
-                """, (
-                    activity.status or "Planejado",
-                    activity.horario_inicio_real,
-                    activity.horario_fim_real,
-                    atraso_minutos,
-                    activity.observacoes,
-                    1 if activity.is_rollback else 0,
-                    datetime.now().isoformat(),
-                    activity.seq,
-                    activity.sequencia,
-                    excel_data_id
-                ))
-            else:
-                # Inserir novo
-                cursor_control.execute("""
-                    INSERT INTO activity_control
-                    (seq, sequencia, excel_data_id, status, horario_inicio_real, 
-                     horario_fim_real, atraso_minutos, observacoes, is_rollback, arquivado)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
-                """, (
-                    activity.seq,
-                    activity.sequencia,
-                    excel_data_id,
-                    activity.status or "Planejado",
-                    activity.horario_inicio_real,
-                    activity.horario_fim_real,
-                    atraso_minutos,
-                    activity.observacoes,
-                    1 if activity.is_rollback else 0
-                ))
-            
-            conn_control.commit()
-            conn_control.close()
-            
-            results.append(ActivityResponse(
-                success=True,
-                message=f"Atividade {action}",
-                seq=activity.seq,
-                sequencia=activity.sequencia,
-                updated_fields=["excel_data", "activity_control"]
-            ))
+            # Registro de controle gravado em lote ao final (um único executemany)
+            controles_pendentes.append(({
+                "seq": activity.seq,
+                "sequencia": activity.sequencia,
+                "excel_data_id": excel_data_id,
+                "status": activity.status or "Planejado",
+                "horario_inicio_real": activity.horario_inicio_real,
+                "horario_fim_real": activity.horario_fim_real,
+                "atraso_minutos": atraso_minutos,
+                "observacoes": activity.observacoes,
+                "is_rollback": activity.is_rollback
+            }, indice, action))
             
         except Exception as e:
             logger.error(f"Erro ao processar atividade Seq {activity.seq}, CRQ {activity.sequencia}: {e}")
+            cursor.execute("ROLLBACK TO SAVEPOINT atividade")
+            cursor.execute("RELEASE SAVEPOINT atividade")
             failed += 1
-            results.append(ActivityResponse(
+            results[indice] = ActivityResponse(
                 success=False,
                 message=f"Erro: {str(e)}",
                 seq=activity.seq,
                 sequencia=activity.sequencia,
                 updated_fields=[]
-            ))
+            )
+    
+    try:
+        db_manager.get_activity_dao().upsert_many(
+            [controle for controle, _, _ in controles_pendentes], replace=True, conn=conn
+        )
+        conn.commit()
+        for controle, indice, action in controles_pendentes:
+            results[indice] = ActivityResponse(
+                success=True,
+                message=f"Atividade {action}",
+                seq=controle["seq"],
+                sequencia=controle["sequencia"],
+                updated_fields=["excel_data", "activity_control"]
+            )
+    except Exception as e:
+        # Nada da carga é gravado: excel_data e controles são desfeitos juntos
+        logger.error(f"Erro ao salvar registros de controle em lote: {e}")
+        conn.rollback()
+        for controle, indice, action in controles_pendentes:
+            if action == "created":
+                created -= 1
+            else:
+                updated -= 1
+            failed += 1
+            results[indice] = ActivityResponse(
+                success=False,
+                message=f"Erro: {str(e)}",
+                seq=controle["seq"],
+                sequencia=controle["sequencia"],
+                updated_fields=[]
+            )
+    finally:
+        conn.close()
     
     total_time = time.time() - start_time
     logger.info(f"Carga concluida: {created} criadas, {updated} atualizadas, {failed} falhas em {total_time:.3f}s")
@@ -873,24 +1327,27 @@ async def create_activities_bulk(bulk_create: BulkActivityCreate):
                     logger.debug(f"  - Seq {r.seq}, CRQ {r.sequencia}: {r.message}")
     
     # Retornar resposta customizada com informações de criação/atualização
-    return {
+    return bulk_results_response({
         "total": len(bulk_create.activities),
         "created": created,
         "updated": updated,
         "successful": created + updated,
         "failed": failed,
-        "processing_time": round(total_time, 3),
-        "results": results
-    }
+        "processing_time": round(total_time, 3)
+    }, results, results_mode)
 
 
 @app.put("/activities/bulk")
-async def update_activities_bulk(bulk_update: BulkActivityUpdate):
+async def update_activities_bulk(
+    bulk_update: BulkActivityUpdate,
+    results_mode: str = Query("full", alias="results", pattern=BULK_RESULTS_PATTERN)
+):
     """
     Atualiza múltiplas atividades em lote
     
     Processa uma lista de atividades e atualiza cada uma.
-    Retorna resultado detalhado de cada atualização.
+    Retorna resultado detalhado de cada atualização
+    (?results=failures ou ?results=bitmap para uma resposta compacta).
     """
     results = []
     successful = 0
@@ -922,159 +1379,83 @@ async def update_activities_bulk(bulk_update: BulkActivityUpdate):
             ))
             failed += 1
     
-    return BulkActivityResponse(
-        total=len(bulk_update.activities),
-        successful=successful,
-        failed=failed,
-        results=results
-    )
+    if results_mode == "full":
+        return BulkActivityResponse(
+            total=len(bulk_update.activities),
+            successful=successful,
+            failed=failed,
+            results=results
+        )
+    return bulk_results_response({
+        "total": len(bulk_update.activities),
+        "successful": successful,
+        "failed": failed
+    }, results, results_mode)
+
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
-def load_excel_file_api(uploaded_file: UploadFile):
+
+def spool_upload_to_tempfile(uploaded_file: UploadFile):
     """
-    Carrega arquivo Excel e retorna dados de todas as abas (versão para API, sem Streamlit)
+    Copia o upload em blocos para um arquivo temporário, respeitando o limite de tamanho
+    
+    A cópia é feita em blocos, sem carregar o arquivo inteiro em memória, e o
+    mesmo arquivo em disco é usado para o hash do cache e para a leitura de
+    todas as abas. Quando esta função roda, o Starlette já recebeu o corpo e o
+    gravou no seu próprio arquivo temporário (acima de 1 MB), portanto o upload
+    passa pelo disco duas vezes. O limite verificado aqui é o do arquivo em si;
+    corpos maiores que o limite são recusados antes, por UploadSizeLimitMiddleware.
     
     Args:
         uploaded_file: Arquivo Excel carregado via FastAPI
         
     Returns:
-        dict: Dicionário com dados de cada sequência
+        str: Caminho do arquivo temporário (o chamador deve removê-lo)
     """
-    from config import SEQUENCIAS
+    import tempfile
+    
+    max_bytes = UPLOAD_MAX_MB * 1024 * 1024
+    if uploaded_file.size is not None and uploaded_file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Arquivo excede o limite de {UPLOAD_MAX_MB} MB")
     
+    suffix = os.path.splitext(uploaded_file.filename or "")[1] or ".xlsx"
+    tmp = tempfile.NamedTemporaryFile(prefix="upload_", suffix=suffix, delete=False)
     try:
-        # Ler arquivo em memória
-        contents = uploaded_file.file.read()
-        excel_file = pd.ExcelFile(io.BytesIO(contents))
-        sheet_names = excel_file.sheet_names
-        
-        dados = {}
+        with tmp:
+            uploaded_file.file.seek(0)
+            total = 0
+            for bloco in iter(lambda: uploaded_file.file.read(UPLOAD_CHUNK_SIZE), b""):
+                total += len(bloco)
+                if total > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"Arquivo excede o limite de {UPLOAD_MAX_MB} MB")
+                tmp.write(bloco)
+    except BaseException:
+        os.remove(tmp.name)
+        raise
+    
+    # Liberar o buffer do upload assim que copiado para disco
+    uploaded_file.file.close()
+    return tmp.name
+
+
+def load_excel_file_api(source):
+    """
+    Carrega arquivo Excel e retorna dados de todas as abas (versão para API, sem Streamlit)
+    
+    Args:
+        source: Caminho do arquivo Excel (já copiado para disco)
         
-        for sheet_name in sheet_names:
-            # Identificar sequência pelo nome da aba
-            sequencia = None
-            for seq_key, seq_info in SEQUENCIAS.items():
-                if seq_key in sheet_name.upper():
-                    sequencia = seq_key
-                    break
-            
-            if not sequencia:
-                # Tentar identificar por padrão
-                if "REDE" in sheet_name.upper():
-                    sequencia = "REDE"
-                elif "OPENSHIFT" in sheet_name.upper():
-                    sequencia = "OPENSHIFT"
-                elif "NFS" in sheet_name.upper():
-                    sequencia = "NFS"
-                elif "SI" in sheet_name.upper():
-                    sequencia = "SI"
-                else:
-                    # Pular abas não reconhecidas
-                    continue
-            
-            # Ler aba
-            df = pd.read_excel(io.BytesIO(contents), sheet_name=sheet_name)
-            
-            # Verificar se o dataframe está vazio
-            if df.empty or len(df.columns) == 0:
-                continue
-            
-            # Normalizar nomes das colunas
-            df.columns = [str(col).strip() for col in df.columns]
-            
-            # Mapear nomes de colunas para os esperados
-            expected_cols = ["Seq", "Atividade", "Grupo", "Localidade", 
-                            "Executor", "Telefone", "Inicio", "Fim", "Tempo"]
-            
-            # Criar mapeamento flexível
-            col_mapping = {}
-            for i, expected in enumerate(expected_cols):
-                found = False
-                for j, actual_col in enumerate(df.columns):
-                    if actual_col.strip().lower() == expected.lower():
-                        col_mapping[expected] = j
-                        found = True
-                        break
-                
-                if not found and i < len(df.columns):
-                    col_mapping[expected] = i
-            
-            # Verificar se temos pelo menos as colunas essenciais
-            if len(col_mapping) < 5:
-                logger.warning(f"Estrutura da aba {sheet_name} pode estar incorreta. Colunas encontradas: {list(df.columns[:9])}")
-                continue
-            
-            # Selecionar e renomear colunas
-            selected_cols = []
-            for expected in expected_cols:
-                if expected in col_mapping:
-                    idx = col_mapping[expected]
-                    if idx < len(df.columns):
-                        selected_cols.append(df.columns[idx])
-                    else:
-                        selected_cols.append(None)
-                else:
-                    selected_cols.append(None)
-            
-            # Criar novo dataframe com colunas corretas
-            new_df = pd.DataFrame()
-            for i, expected in enumerate(expected_cols):
-                if selected_cols[i] is not None and selected_cols[i] in df.columns:
-                    new_df[expected] = df[selected_cols[i]]
-                else:
-                    new_df[expected] = None
-            
-            df = new_df
-            
-            # Limpar dados
-            df["Seq"] = df["Seq"].astype(str)
-            df["Atividade"] = df["Atividade"].astype(str)
-            
-            mask_valid = (
-                (df["Seq"].notna() & (df["Seq"].str.strip() != "") & (df["Seq"].str.strip() != "nan")) |
-                (df["Atividade"].notna() & (df["Atividade"].str.strip() != "") & (df["Atividade"].str.strip() != "nan"))
-            )
-            df = df[mask_valid].copy()
-            
-            # Converter tipos
-            try:
-                df["Seq"] = pd.to_numeric(df["Seq"], errors='coerce').astype('Int64')
-            except Exception as e:
-                logger.warning(f"Erro ao converter Seq na aba {sheet_name}: {str(e)}")
-            
-            # Converter datas
-            for col in ["Inicio", "Fim"]:
-                if col in df.columns:
-                    df[col] = pd.to_datetime(df[col], errors='coerce')
-            
-            # Converter colunas de texto para string
-            def safe_str_convert(val):
-                if pd.isna(val) or val is None:
-                    return ""
-                try:
-                    if isinstance(val, (int, float)):
-                        return str(int(val)) if isinstance(val, float) and val.is_integer() else str(val)
-                    return str(val)
-                except:
-                    return ""
-            
-            for col in ["Telefone", "Grupo", "Localidade", "Executor", "Atividade"]:
-                if col in df.columns:
-                    df[col] = df[col].apply(safe_str_convert)
-            
-            # Converter coluna Tempo de hh:mm:ss para minutos
-            if "Tempo" in df.columns:
-                from modules.calculations import convert_time_to_minutes
-                df["Tempo"] = df["Tempo"].apply(convert_time_to_minutes)
-                df["Tempo"] = pd.to_numeric(df["Tempo"], errors='coerce').fillna(0)
-            
-            # Adicionar CRQ ao dataframe
-            df["CRQ"] = sequencia
-            
-            dados[sequencia] = {
-                "dataframe": df,
-                "sheet_name": sheet_name
-            }
+    Returns:
+        dict: Dicionário com dados de cada sequência
+    """
+    from modules.excel_parser import load_workbook_frames
+    from config import EXCEL_PARSE_WORKERS
+    
+    try:
+        # Ler o workbook a partir do arquivo em disco (ou do cache, se o mesmo arquivo já foi processado)
+        # Com EXCEL_PARSE_WORKERS diferente de 1 as abas são lidas em paralelo, uma por processo
+        dados = load_workbook_frames(source, warn=logger.warning, parallel=EXCEL_PARSE_WORKERS != 1)
         
         return dados
     
@@ -1083,104 +1464,106 @@ def load_excel_file_api(uploaded_file: UploadFile):
         raise HTTPException(status_code=400, detail=f"Erro ao processar arquivo Excel: {str(e)}")
 
 
-@app.post("/upload-excel")
-async def upload_excel(file: UploadFile = File(...)):
+def process_upload_job(job_id, tmp_path, filename):
     """
-    Endpoint para upload de arquivo Excel e processamento automático
+    Processa um upload em segundo plano: leitura, gravação no banco e criação de controles
     
-    Recebe um arquivo Excel, processa usando a mesma lógica do Streamlit,
-    salva no banco de dados e cria/atualiza registros de controle.
+    O progresso e o resultado são gravados na tabela upload_jobs.
     
-    Returns:
-        dict: Estatísticas do processamento
+    Args:
+        job_id: Identificador do job
+        tmp_path: Caminho do arquivo temporário (removido ao final)
+        filename: Nome original do arquivo
     """
+    jobs_db = DatabaseManager()
+    
     try:
-        # Verificar se é arquivo Excel
-        if not file.filename.endswith(('.xlsx', '.xls')):
-            raise HTTPException(status_code=400, detail="Arquivo deve ser Excel (.xlsx ou .xls)")
-        
-        logger.info(f"Recebendo upload de arquivo Excel: {file.filename}")
+        jobs_db.update_upload_job(job_id, status="running", etapa="Lendo arquivo Excel")
         
         # Carregar dados do Excel
-        excel_data = load_excel_file_api(file)
+        excel_data = load_excel_file_api(tmp_path)
         
         if not excel_data:
-            raise HTTPException(status_code=400, detail="Nenhum dado válido encontrado no arquivo Excel")
+            raise ValueError("Nenhum dado válido encontrado no arquivo Excel")
         
         # Contar total de registros
         total_rows = sum(len(data["dataframe"]) for data in excel_data.values())
+        sequencias_processed = list(excel_data.keys())
+        jobs_db.update_upload_job(
+            job_id, etapa="Salvando dados no banco",
+            total_rows=total_rows, sequencias=sequencias_processed
+        )
+        
+        with _upload_write_lock:
+            # Salvar dados do Excel no banco
+            total_saved = jobs_db.save_excel_data(excel_data, filename)
+            
+            if total_saved == 0:
+                raise ValueError("Nenhum registro foi salvo no banco. Verifique os dados do Excel.")
+            
+            jobs_db.update_upload_job(job_id, etapa="Criando registros de controle", total_saved=total_saved)
+            
+            # Criar registros de controle para atividades que não existem (em lote, no SQL)
+            control_created = jobs_db.create_missing_controls()
         
-        # Salvar dados do Excel no banco
-        db_manager = DatabaseManager()
-        total_saved = db_manager.save_excel_data(excel_data, file.filename)
+        jobs_db.update_upload_job(
+            job_id, status="completed", etapa="Concluído", control_created=control_created, erro=None
+        )
+        logger.info(f"Upload {job_id} concluído: {total_saved} registros salvos, {control_created} controles criados")
+    
+    except HTTPException as e:
+        jobs_db.update_upload_job(job_id, status="failed", etapa="Erro", erro=str(e.detail))
+        logger.error(f"Upload {job_id} falhou: {e.detail}")
+    except Exception as e:
+        jobs_db.update_upload_job(job_id, status="failed", etapa="Erro", erro=str(e))
+        logger.error(f"Upload {job_id} falhou: {str(e)}", exc_info=True)
+    finally:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+@app.post("/upload-excel", status_code=202)
+async def upload_excel(file: UploadFile = File(...)):
+    """
+    Endpoint para upload de arquivo Excel e processamento em segundo plano
+    
+    Recebe um arquivo Excel e agenda o processamento (mesma lógica do Streamlit):
+    gravação no banco e criação/atualização de registros de controle.
+    O acompanhamento é feito por GET /jobs/{job_id}.
+    
+    Returns:
+        dict: Identificador do job e URL de acompanhamento
+    """
+    try:
+        # Verificar se é arquivo Excel
+        if not file.filename.endswith(('.xlsx', '.xls')):
+            raise HTTPException(status_code=400, detail="Arquivo deve ser Excel (.xlsx ou .xls)")
         
-        if total_saved == 0:
-            raise HTTPException(status_code=400, detail="Nenhum registro foi salvo no banco. Verifique os dados do Excel.")
+        logger.info(f"Recebendo upload de arquivo Excel: {file.filename}")
         
-        # Criar registros de controle para atividades que não existem
-        control_data = db_manager.get_all_activities_control()
-        control_created = 0
+        # Copiar o upload para disco (com limite de tamanho), fora do event loop
+        tmp_path = await run_in_threadpool(spool_upload_to_tempfile, file)
         
-        for sequencia, data in excel_data.items():
-            df = data["dataframe"]
-            for _, row in df.iterrows():
-                seq = int(row["Seq"]) if pd.notna(row["Seq"]) else None
-                if seq is None:
-                    continue
-                
-                excel_data_id = row.get("Excel_Data_ID", 0) if "Excel_Data_ID" in row else 0
-                if pd.isna(excel_data_id):
-                    excel_data_id = 0
-                else:
-                    excel_data_id = int(excel_data_id)
-                
-                # Buscar usando excel_data_id se disponível
-                if excel_data_id and excel_data_id > 0:
-                    existing = db_manager.get_activity_control(seq, sequencia, excel_data_id)
-                else:
-                    existing = db_manager.get_activity_control(seq, sequencia)
-                
-                if not existing:
-                    # Obter valor de Is_Milestone do dataframe
-                    is_milestone = row.get("Is_Milestone", False) if "Is_Milestone" in row else False
-                    # Se Grupo está vazio, é milestone
-                    if "Grupo" in row:
-                        grupo_value = row.get("Grupo")
-                        is_empty = (
-                            pd.isna(grupo_value) or 
-                            grupo_value == "" or 
-                            (isinstance(grupo_value, str) and grupo_value.strip() == "") or
-                            str(grupo_value).strip() == "nan"
-                        )
-                        if is_empty:
-                            is_milestone = True
-                    
-                    db_manager.save_activity_control(
-                        seq=seq,
-                        sequencia=sequencia,
-                        status="Planejado",
-                        is_milestone=is_milestone,
-                        excel_data_id=excel_data_id if excel_data_id > 0 else None
-                    )
-                    control_created += 1
+        job_id = uuid.uuid4().hex
+        try:
+            await run_in_threadpool(db_manager.create_upload_job, job_id, file.filename)
+            upload_executor.submit(process_upload_job, job_id, tmp_path, file.filename)
+        except Exception:
+            os.remove(tmp_path)
+            raise
         
-        # Estatísticas
-        sequencias_processed = list(excel_data.keys())
+        logger.info(f"Upload {job_id} agendado: {file.filename}")
         
-        result = {
+        return {
             "success": True,
-            "message": f"Arquivo processado com sucesso",
-            "filename": file.filename,
-            "total_rows": total_rows,
-            "total_saved": total_saved,
-            "control_created": control_created,
-            "sequencias": sequencias_processed,
-            "sequencias_count": len(sequencias_processed)
+            "message": "Arquivo recebido, processamento agendado",
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/jobs/{job_id}",
+            "filename": file.filename
         }
-        
-        logger.info(f"Upload concluído: {total_saved} registros salvos, {control_created} controles criados")
-        
-        return result
     
     except HTTPException:
         raise
@@ -1189,9 +1572,28 @@ async def upload_excel(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"Erro interno ao processar arquivo: {str(e)}")
 
 
+@app.get("/jobs/{job_id}")
+async def get_upload_job(job_id: str):
+    """
+    Consulta o progresso de um job de upload
+    
+    Returns:
+        dict: Estado (queued, running, completed, failed), etapa atual, contagens e erro
+    """
+    job = await run_in_threadpool(db_manager.get_upload_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} não encontrado")
+    
+    job["success"] = job["status"] == "completed"
+    job["sequencias_count"] = len(job["sequencias"])
+    return job
+
+
 if __name__ == "__main__":
     import uvicorn
     
+    configure_logging()
+    
     if DEBUG_MODE:
         logger.info("=" * 60)
         logger.info("INICIANDO SERVIDOR API EM MODO DEBUG")
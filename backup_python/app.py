@@ -5,7 +5,6 @@ Aplicação web interativa para gerenciamento de janelas de mudança de TI
 import streamlit as st
 import pyperclip
 import json
-import pandas as pd
 import requests
 import os
 from datetime import datetime
@@ -13,7 +12,7 @@ from modules.database import DatabaseManager
 from modules.data_loader import load_excel_file, merge_control_data, validate_excel_structure
 from modules.dashboard import render_full_dashboard
 from modules.data_editor import render_data_editor
-from modules.message_builder import build_whatsapp_message
+from modules.message_builder import build_whatsapp_message, build_message_snapshot
 from modules.calculations import calculate_statistics
 from modules.crud_activities import render_crud_activities
 from modules.auth import (
@@ -115,8 +114,40 @@ def load_data_from_excel(uploaded_file, show_success_message=True, use_api=True)
         return False
 
 
+def wait_for_upload_job(job_id, status_placeholder=None, poll_interval=1.0, max_wait=1800):
+    """
+    Acompanha um job de upload da API até terminar
+    
+    Args:
+        job_id: Identificador retornado por POST /upload-excel
+        status_placeholder: Elemento do Streamlit para exibir a etapa atual (opcional)
+        poll_interval: Intervalo entre consultas (segundos)
+        max_wait: Tempo máximo de espera (segundos)
+        
+    Returns:
+        dict: Estado final do job (status completed ou failed)
+    """
+    import time
+    
+    inicio = time.time()
+    while True:
+        response = requests.get(f"{API_BASE_URL}/jobs/{job_id}", timeout=10)
+        response.raise_for_status()
+        job = response.json()
+        
+        if job["status"] in ("completed", "failed"):
+            return job
+        
+        if status_placeholder is not None:
+            status_placeholder.info(f"⏳ {job.get('etapa') or 'Processando'}... ({job.get('total_rows', 0)} linhas)")
+        
+        if time.time() - inicio > max_wait:
+            raise requests.exceptions.Timeout(f"Job {job_id} não terminou em {max_wait}s")
+        time.sleep(poll_interval)
+
+
 def load_data_from_excel_via_api(uploaded_file, show_success_message=True):
-    """Carrega dados do Excel via endpoint da API"""
+    """Carrega dados do Excel via endpoint da API (job em segundo plano com acompanhamento)"""
     try:
         with st.spinner("Enviando arquivo Excel para a API..."):
             url = f"{API_BASE_URL}/upload-excel"
@@ -127,10 +158,10 @@ def load_data_from_excel_via_api(uploaded_file, show_success_message=True):
                         'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
             }
             
-            # Fazer upload via API
-            response = requests.post(url, files=files, timeout=300)
+            # Enviar arquivo (a API apenas agenda o processamento e retorna o job)
+            response = requests.post(url, files=files, timeout=60)
             
-            if response.status_code != 200:
+            if response.status_code not in (200, 202):
                 error_msg = response.text
                 try:
                     error_json = response.json()
@@ -140,10 +171,13 @@ def load_data_from_excel_via_api(uploaded_file, show_success_message=True):
                 st.error(f"❌ Erro na API: {error_msg}")
                 return False
             
-            result = response.json()
+            # Acompanhar o processamento até terminar
+            status_placeholder = st.empty()
+            result = wait_for_upload_job(response.json()["job_id"], status_placeholder)
+            status_placeholder.empty()
             
-            if not result.get('success', False):
-                st.error(f"❌ Erro ao processar arquivo: {result.get('message', 'Erro desconhecido')}")
+            if result["status"] != "completed":
+                st.error(f"❌ Erro ao processar arquivo: {result.get('erro') or 'Erro desconhecido'}")
                 return False
             
             # Mostrar estatísticas
@@ -186,7 +220,7 @@ def load_data_from_excel_via_api(uploaded_file, show_success_message=True):
         # Fallback para processamento local
         return load_data_from_excel_local(uploaded_file, show_success_message)
     except requests.exceptions.Timeout:
-        st.error("❌ Timeout ao enviar arquivo para a API. O arquivo pode ser muito grande.")
+        st.error("❌ Timeout ao aguardar o processamento do arquivo pela API. O arquivo pode ser muito grande.")
         return False
     except Exception as e:
         st.error(f"Erro ao enviar arquivo para API: {str(e)}")
@@ -242,33 +276,8 @@ def load_data_from_excel_local(uploaded_file, show_success_message=True):
             st.session_state.data_dict = merged_data
             st.session_state.current_file = uploaded_file.name
             
-            # Inicializar dados de controle no banco se necessário
-            for sequencia, data in merged_data.items():
-                df = data["dataframe"]
-                for _, row in df.iterrows():
-                    seq = int(row["Seq"])
-                    excel_data_id = row.get("Excel_Data_ID", 0) if "Excel_Data_ID" in row else 0
-                    if pd.isna(excel_data_id):
-                        excel_data_id = 0
-                    else:
-                        excel_data_id = int(excel_data_id)
-                    
-                    # Buscar usando excel_data_id se disponível
-                    if excel_data_id and excel_data_id > 0:
-                        existing = st.session_state.db_manager.get_activity_control(seq, sequencia, excel_data_id)
-                    else:
-                        existing = st.session_state.db_manager.get_activity_control(seq, sequencia)
-                    
-                    if not existing:
-                        # Obter valor de Is_Milestone do dataframe (já detectado na importação)
-                        is_milestone = row.get("Is_Milestone", False) if "Is_Milestone" in row else False
-                        st.session_state.db_manager.save_activity_control(
-                            seq=seq,
-                            sequencia=sequencia,
-                            status="Planejado",
-                            is_milestone=is_milestone,
-                            excel_data_id=excel_data_id if excel_data_id > 0 else None
-                        )
+            # Inicializar dados de controle no banco se necessário (em lote, no SQL)
+            st.session_state.db_manager.create_missing_controls(por_linha=True)
             
             # Limpar cache do Excel após salvar no banco (não precisamos mais dele)
             load_excel_file.clear()
@@ -738,7 +747,19 @@ elif page == "Comunicação":
     st.header("💬 Comunicação")
     
     if st.session_state.data_dict:
-        message = build_whatsapp_message(st.session_state.data_dict)
+        # Snapshot do último envio (copiado) para o modo "apenas alterações"
+        ultimo_envio = st.session_state.get("whatsapp_ultimo_envio")
+        apenas_alteracoes = st.checkbox(
+            "Enviar apenas alterações desde o último envio",
+            value=False,
+            disabled=ultimo_envio is None,
+            help="Disponível após copiar a mensagem pelo menos uma vez"
+        )
+        
+        message = build_whatsapp_message(
+            st.session_state.data_dict,
+            since_snapshot=ultimo_envio if apenas_alteracoes else None
+        )
         
         # Exibir mensagem
         st.text_area(
@@ -751,6 +772,7 @@ elif page == "Comunicação":
         # Botão para copiar
         if st.button("📋 Copiar Mensagem", width='stretch'):
             pyperclip.copy(message)
+            st.session_state.whatsapp_ultimo_envio = build_message_snapshot(st.session_state.data_dict)
             st.success("✅ Mensagem copiada para a área de transferência!")
     else:
         st.warning("⚠️ Nenhum dado carregado. Por favor, carregue um arquivo Excel primeiro na sidebar.")
@@ -850,25 +872,33 @@ elif page == "API Upload":
     Use a biblioteca `requests` para fazer upload do arquivo:
     """)
     
-    python_example = f'''import requests
+    python_example = f'''import time
+import requests
 
 # URL do endpoint
 url = "{api_url}"
 
-# Fazer upload do arquivo
+# Fazer upload do arquivo (a API retorna um job e processa em segundo plano)
 with open("arquivo.xlsx", "rb") as f:
     files = {{"file": ("arquivo.xlsx", f, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")}}
-    response = requests.post(url, files=files, timeout=300)
+    response = requests.post(url, files=files, timeout=60)
+response.raise_for_status()
 
-if response.status_code == 200:
-    result = response.json()
+# Acompanhar o job até terminar
+job_id = response.json()["job_id"]
+while True:
+    result = requests.get(f"{API_BASE_URL}/jobs/{{job_id}}", timeout=10).json()
+    if result["status"] in ("completed", "failed"):
+        break
+    time.sleep(1)
+
+if result["status"] == "completed":
     print("✅ Upload realizado com sucesso!")
     print(f"  Registros salvos: {{result['total_saved']}}")
     print(f"  Controles criados: {{result['control_created']}}")
     print(f"  Sequências: {{', '.join(result['sequencias'])}}")
 else:
-    print(f"❌ Erro: {{response.status_code}}")
-    print(f"  {{response.text}}")'''
+    print(f"❌ Erro: {{result['erro']}}")'''
     
     st.code(python_example, language="python")
     
@@ -911,7 +941,12 @@ $form = @{{
     file = Get-Item -Path $filePath
 }}
 
-$response = Invoke-RestMethod -Uri $uri -Method Post -Form $form
+$job = Invoke-RestMethod -Uri $uri -Method Post -Form $form
+
+do {{
+    Start-Sleep -Seconds 1
+    $response = Invoke-RestMethod -Uri "{API_BASE_URL}/jobs/$($job.job_id)"
+}} while ($response.status -eq "queued" -or $response.status -eq "running")
 
 Write-Host "✅ Upload realizado com sucesso!"
 Write-Host "  Registros salvos: $($response.total_saved)"
@@ -930,18 +965,34 @@ Write-Host "  Sequências: $($response.sequencias -join ', ')"'''
     # Resposta esperada
     st.subheader("📥 Resposta Esperada")
     st.markdown("""
-    O endpoint retorna um JSON com as seguintes informações:
+    O endpoint agenda o processamento e retorna imediatamente (HTTP 202) o identificador do job:
+    """)
+    
+    st.json({
+        "success": True,
+        "message": "Arquivo recebido, processamento agendado",
+        "job_id": "3f2c9a...",
+        "status": "queued",
+        "status_url": "/jobs/3f2c9a...",
+        "filename": "arquivo.xlsx"
+    })
+    
+    st.markdown("""
+    O progresso é consultado em `GET /jobs/{job_id}` até o status ser `completed` ou `failed`:
     """)
     
     response_example = {
+        "job_id": "3f2c9a...",
+        "status": "completed",
+        "etapa": "Concluído",
         "success": True,
-        "message": "Arquivo processado com sucesso",
         "filename": "arquivo.xlsx",
         "total_rows": 153,
         "total_saved": 153,
         "control_created": 50,
         "sequencias": ["REDE", "OPENSHIFT", "NFS", "SI"],
-        "sequencias_count": 4
+        "sequencias_count": 4,
+        "erro": None
     }
     
     st.json(response_example)
@@ -968,10 +1019,14 @@ Write-Host "  Sequências: $($response.sequencias -join ', ')"'''
                         'file': (test_file.name, test_file.getvalue(), 
                                 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
                     }
-                    response = requests.post(api_url, files=files, timeout=300)
+                    response = requests.post(api_url, files=files, timeout=60)
                     
-                    if response.status_code == 200:
-                        result = response.json()
+                    if response.status_code in (200, 202):
+                        result = wait_for_upload_job(response.json()["job_id"])
+                        if result["status"] != "completed":
+                            st.error(f"❌ Erro no processamento: {result.get('erro')}")
+                            st.json(result)
+                            st.stop()
                         st.success("✅ Upload realizado com sucesso!")
                         st.json(result)
                         
@@ -0,0 +1,500 @@
+"""
+Benchmark reproduzível dos caminhos de sincronização, importação e API
+
+Gera planilhas sintéticas no layout do arquivo de CRQs (abas "CRQ <CRQ> 2" com
+Seq, Atividade, Grupo, Localidade, Executor, Telefone, Inicio, Fim e Tempo),
+executa cada etapa contra um banco SQLite temporário e a API em processo
+(TestClient) e grava tempos e memória em JSON para comparar entre commits.
+
+Cada tamanho roda em um processo separado, com banco, cache de planilhas e
+logs em uma pasta temporária (o banco de produção não é tocado).
+
+Uso:
+    python benchmark.py [--sizes N ...] [--output ARQUIVO] [--seed N] [--tracemalloc] [--compare ARQUIVO]
+
+Parâmetros:
+    --sizes, -s: Quantidades de linhas das planilhas (padrão: 1000 10000 100000)
+    --output, -o: Arquivo JSON de saída (padrão: benchmark_results.json)
+    --seed: Semente dos dados sintéticos (padrão: 42)
+    --tracemalloc: Mede também o pico de alocações Python por etapa (deixa as
+                   etapas várias vezes mais lentas; não compare tempos com
+                   execuções sem a opção)
+    --compare, -c: JSON de uma execução anterior para comparar os tempos
+    --keep: Mantém a pasta temporária (planilhas, banco e logs)
+
+Exemplos:
+    python benchmark.py
+    python benchmark.py --sizes 1000 10000 --output antes.json
+    python benchmark.py --sizes 1000 10000 --output depois.json --compare antes.json
+
+Memória: por padrão, cada etapa registra o pico de memória residente do
+processo ao final (rss_mb; indisponível no Windows).
+
+Requer httpx (usado pelo TestClient do FastAPI).
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+# Proporção de linhas por CRQ (mesma do total esperado de cada uma)
+CRQS = {"REDE": 72, "OPENSHIFT": 39, "NFS": 17, "SI": 25}
+
+GRUPOS = ["Rede Core", "Datacenter", "Storage", "Segurança", "Aplicações"]
+LOCALIDADES = ["São Paulo", "Rio de Janeiro", "Belo Horizonte", "Curitiba", "Brasília"]
+
+# Execução simulada aplicada às atividades antes da carga via API
+FRACAO_CONCLUIDAS = 0.4
+FRACAO_EM_EXECUCAO = 0.1
+
+ACTIVITIES_PAGE_SIZE = 1000
+
+
+def split_rows(rows):
+    """
+    Divide o total de linhas entre as CRQs proporcionalmente
+
+    Args:
+        rows: Total de linhas
+
+    Returns:
+        dict: {crq: quantidade de linhas}
+    """
+    peso_total = sum(CRQS.values())
+    divisao = {crq: rows * peso // peso_total for crq, peso in CRQS.items()}
+    divisao["REDE"] += rows - sum(divisao.values())
+    return divisao
+
+
+def generate_workbook(path, rows, seed):
+    """
+    Gera uma planilha sintética no layout das abas de CRQ
+
+    Args:
+        path: Caminho do .xlsx gerado
+        rows: Total de linhas (somando todas as abas)
+        seed: Semente dos dados aleatórios
+
+    Returns:
+        int: Tamanho do arquivo em bytes
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    inicio_janela = datetime(2025, 1, 10, 22, 0, 0)
+
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        for crq, quantidade in split_rows(rows).items():
+            duracoes = rng.integers(5, 120, size=quantidade)
+            inicios = pd.to_datetime(inicio_janela) + pd.to_timedelta(
+                np.arange(quantidade) * 2, unit="min"
+            )
+            df = pd.DataFrame({
+                "Seq": np.arange(1, quantidade + 1),
+                "Atividade": [f"Atividade {crq} {i}" for i in range(1, quantidade + 1)],
+                "Grupo": rng.choice(GRUPOS, size=quantidade),
+                "Localidade": rng.choice(LOCALIDADES, size=quantidade),
+                "Executor": [f"Executor {n}" for n in rng.integers(1, 200, size=quantidade)],
+                "Telefone": [f"(11) 9{n:04d}-{m:04d}" for n, m in
+                             zip(rng.integers(0, 10000, size=quantidade), rng.integers(0, 10000, size=quantidade))],
+                "Inicio": inicios,
+                "Fim": inicios + pd.to_timedelta(duracoes, unit="min"),
+                "Tempo": [f"{d // 60:02d}:{d % 60:02d}" for d in duracoes]
+            })
+            df.to_excel(writer, sheet_name=f"CRQ {crq} 2", index=False)
+
+    return os.path.getsize(path)
+
+
+def simulate_execution(activities, seed):
+    """
+    Marca parte das atividades como concluídas ou em execução (com horários reais)
+
+    Args:
+        activities: Lista retornada por extract_activity_data (alterada no lugar)
+        seed: Semente dos dados aleatórios
+    """
+    import random
+
+    rng = random.Random(seed)
+    for activity in activities:
+        sorteio = rng.random()
+        if sorteio >= FRACAO_CONCLUIDAS + FRACAO_EM_EXECUCAO or not activity.get("inicio"):
+            continue
+        inicio = datetime.fromisoformat(activity["inicio"])
+        activity["horario_inicio_real"] = inicio.strftime("%d/%m/%Y %H:%M:%S")
+        if sorteio < FRACAO_CONCLUIDAS:
+            activity["status"] = "Concluído"
+            fim = inicio + timedelta(minutes=rng.randint(5, 150))
+            activity["horario_fim_real"] = fim.strftime("%d/%m/%Y %H:%M:%S")
+        else:
+            activity["status"] = "Em Execução"
+
+
+def build_bulk_payload(activities):
+    """
+    Monta o corpo de POST /activities/bulk-create (mesmo formato do sync_excel.py)
+
+    Args:
+        activities: Lista de atividades extraídas
+
+    Returns:
+        dict: {"activities": [...]}
+    """
+    return {"activities": [{
+        "seq": activity["seq"],
+        "sequencia": activity["sequencia"],
+        "atividade": activity.get("atividade", ""),
+        "grupo": activity.get("grupo", ""),
+        "localidade": activity.get("localidade", ""),
+        "executor": activity.get("executor", ""),
+        "telefone": activity.get("telefone", ""),
+        "inicio": activity.get("inicio"),
+        "fim": activity.get("fim"),
+        "tempo": activity.get("tempo", ""),
+        "status": activity.get("status"),
+        "horario_inicio_real": activity.get("horario_inicio_real"),
+        "horario_fim_real": activity.get("horario_fim_real"),
+        "observacoes": activity.get("observacoes"),
+        "is_rollback": activity.get("is_rollback", False)
+    } for activity in activities]}
+
+
+class StageRecorder:
+    """Mede tempo e memória de cada etapa"""
+
+    def __init__(self, use_tracemalloc=False):
+        self.use_tracemalloc = use_tracemalloc
+        self.stages = {}
+
+    def run(self, name, func, *args, **kwargs):
+        """
+        Executa uma etapa e registra o resultado
+
+        Args:
+            name: Nome da etapa no JSON
+            func: Função da etapa (o retorno é repassado)
+
+        Returns:
+            Retorno de func
+        """
+        if self.use_tracemalloc:
+            tracemalloc.start()
+        inicio = time.perf_counter()
+        try:
+            resultado = func(*args, **kwargs)
+        finally:
+            segundos = time.perf_counter() - inicio
+            pico = None
+            if self.use_tracemalloc:
+                pico = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        self.stages[name] = {
+            "seconds": round(segundos, 4),
+            "rss_mb": _peak_rss_mb(),
+            "traced_peak_mb": round(pico / (1024 * 1024), 2) if pico is not None else None
+        }
+        print(f"  {name}: {segundos:.3f}s", file=sys.stderr, flush=True)
+        return resultado
+
+
+def _peak_rss_mb():
+    """Pico de memória residente do processo (None onde resource não existe, ex: Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB; macOS em bytes
+    return round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_size(rows, workdir, seed, use_tracemalloc):
+    """
+    Executa todas as etapas para um tamanho (chamado no processo filho)
+
+    DB_PATH e PARSE_CACHE_DIR já apontam para workdir quando os módulos
+    do projeto são importados aqui.
+
+    Args:
+        rows: Total de linhas da planilha
+        workdir: Pasta temporária deste tamanho
+        seed: Semente dos dados sintéticos
+        use_tracemalloc: Se True, mede o pico de alocações Python por etapa
+
+    Returns:
+        dict: Resultado do tamanho
+    """
+    import logging
+
+    recorder = StageRecorder(use_tracemalloc)
+    workbook_path = os.path.join(workdir, f"CRQ VIRADA REDE sintetico {rows}.xlsx")
+
+    inicio = time.perf_counter()
+    file_size = generate_workbook(workbook_path, rows, seed)
+    gerar_segundos = time.perf_counter() - inicio
+    with open(workbook_path, "rb") as f:
+        workbook_bytes = f.read()
+
+    from fastapi.testclient import TestClient
+    from modules.excel_parser import read_workbook, build_sequencia_frames
+    from modules.data_merge import merge_control_data
+    from modules.calculations import calculate_statistics
+    import sync_excel
+    import api_server
+
+    # O contexto executa o lifespan da API (banco, jobs de upload)
+    with TestClient(api_server.app) as client:
+        # Logs por linha/requisição distorcem os tempos
+        logging.getLogger().setLevel(logging.WARNING)
+        for nome in ("sync_excel", "api_server", "modules.sql_trace"):
+            logging.getLogger(nome).setLevel(logging.WARNING)
+        db_manager = api_server.db_manager
+
+        # Sincronização (sync_excel.py) e leitura do Excel (Streamlit/API)
+        sheets = recorder.run("read_workbook", read_workbook, workbook_bytes)
+        excel_data = recorder.run("build_sequencia_frames", build_sequencia_frames, sheets)
+
+        def extrair():
+            activities = []
+            for sheet_name, df in sheets.items():
+                sequencia = sync_excel.identify_sequencia(sheet_name)
+                blocks = sync_excel.detect_rollback_blocks(df)
+                activities.extend(sync_excel.extract_activity_data(blocks["execucao"], sequencia))
+                if len(blocks["rollback"]) > 0:
+                    activities.extend(sync_excel.extract_activity_data(blocks["rollback"], sequencia, is_rollback=True))
+            return activities
+
+        activities = recorder.run("extract_activity_data", extrair)
+        simulate_execution(activities, seed)
+
+        # Importação no banco
+        total_saved = recorder.run("save_excel_data", db_manager.save_excel_data, excel_data, os.path.basename(workbook_path))
+
+        # Carga via API
+        payload = build_bulk_payload(activities)
+
+        def bulk_create():
+            response = client.post("/activities/bulk-create", json=payload)
+            response.raise_for_status()
+            return response.json()
+
+        bulk = recorder.run("api_bulk_create", bulk_create)
+
+        # Leitura e cálculos do dashboard
+        def carregar():
+            return db_manager.load_excel_data(), db_manager.get_all_activities_control()
+
+        saved_excel_data, control_data = recorder.run("load_from_db", carregar)
+        merged = recorder.run("merge_control_data", merge_control_data, saved_excel_data, control_data)
+        stats = recorder.run("calculate_statistics", calculate_statistics, merged)
+
+        # Leitura via API
+        def api_stats():
+            response = client.get("/stats")
+            response.raise_for_status()
+            return response.json()
+
+        recorder.run("api_stats", api_stats)
+
+        def api_list_activities():
+            total = 0
+            cursor = None
+            while True:
+                params = {"limit": ACTIVITIES_PAGE_SIZE}
+                if cursor:
+                    params["cursor"] = cursor
+                response = client.get("/activities", params=params)
+                response.raise_for_status()
+                pagina = response.json()
+                total += len(pagina["activities"])
+                cursor = pagina.get("next_cursor")
+                if not cursor:
+                    return total
+
+        listed = recorder.run("api_list_activities", api_list_activities)
+
+        # Importação via API (upload + job em segundo plano)
+        def api_upload_excel():
+            response = client.post(
+                "/upload-excel",
+                files={"file": (os.path.basename(workbook_path), workbook_bytes,
+                                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")}
+            )
+            response.raise_for_status()
+            status_url = response.json()["status_url"]
+            while True:
+                job = client.get(status_url).json()
+                if job["status"] in ("completed", "failed"):
+                    return job
+                time.sleep(0.02)
+
+        job = recorder.run("api_upload_excel", api_upload_excel)
+
+    return {
+        "rows": rows,
+        "workbook_bytes": file_size,
+        "generate_seconds": round(gerar_segundos, 3),
+        "counts": {
+            "activities_extracted": len(activities),
+            "excel_rows_saved": total_saved,
+            "bulk_successful": bulk.get("successful"),
+            "bulk_failed": bulk.get("failed"),
+            "activities_listed": listed,
+            "total_geral": stats["geral"]["total"],
+            "upload_job_status": job["status"]
+        },
+        "stages": recorder.stages,
+        "peak_rss_mb": _peak_rss_mb()
+    }
+
+
+def _git_commit():
+    """Commit atual (None fora de um repositório git)"""
+    try:
+        resultado = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+            capture_output=True, text=True, timeout=10
+        )
+        return resultado.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_in_subprocess(rows, seed, use_tracemalloc, keep):
+    """
+    Executa um tamanho em processo separado, com banco e cache temporários
+
+    Args:
+        rows: Total de linhas
+        seed: Semente dos dados sintéticos
+        use_tracemalloc: Se True, mede o pico de alocações Python por etapa
+        keep: Se True, não remove a pasta temporária
+
+    Returns:
+        dict: Resultado do tamanho
+    """
+    workdir = tempfile.mkdtemp(prefix=f"crq_benchmark_{rows}_")
+    result_path = os.path.join(workdir, "result.json")
+
+    env = dict(os.environ)
+    env.update({
+        "DB_PATH": os.path.join(workdir, "benchmark.db"),
+        "PARSE_CACHE_DIR": os.path.join(workdir, "parse_cache"),
+        "API_DEBUG": "false",
+        "SQL_TRACE": "false",
+        "PYTHONIOENCODING": "utf-8"
+    })
+
+    comando = [sys.executable, os.path.abspath(__file__), "--child-rows", str(rows),
+               "--child-workdir", workdir, "--child-result", result_path, "--seed", str(seed)]
+    if use_tracemalloc:
+        comando.append("--tracemalloc")
+
+    try:
+        # Saída padrão descartada: o código do projeto imprime mensagens DEBUG por linha
+        subprocess.run(comando, cwd=workdir, env=env, stdout=subprocess.DEVNULL, check=True)
+        with open(result_path, encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        if keep:
+            print(f"Arquivos mantidos em {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare_results(atual, anterior):
+    """
+    Imprime a variação dos tempos em relação a uma execução anterior
+
+    Args:
+        atual: Resultado desta execução
+        anterior: Resultado carregado de --compare
+    """
+    anteriores = {r["rows"]: r for r in anterior.get("results", [])}
+    print(f"\nComparação com {anterior.get('commit') or 'execução anterior'}:")
+    if atual.get("tracemalloc") != anterior.get("tracemalloc"):
+        print("  AVISO: apenas uma das execuções usou --tracemalloc; os tempos não são comparáveis")
+    for resultado in atual["results"]:
+        base = anteriores.get(resultado["rows"])
+        if not base:
+            continue
+        print(f"  {resultado['rows']} linhas:")
+        for etapa, dados in resultado["stages"].items():
+            antes = base["stages"].get(etapa, {}).get("seconds")
+            if not antes:
+                continue
+            variacao = (dados["seconds"] - antes) / antes * 100
+            print(f"    {etapa:<24} {antes:>9.3f}s -> {dados['seconds']:>9.3f}s ({variacao:+.1f}%)")
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description='Benchmark dos caminhos de sincronização, importação e API')
+    parser.add_argument('--sizes', '-s', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='Quantidades de linhas das planilhas sintéticas')
+    parser.add_argument('--output', '-o', default='benchmark_results.json', help='Arquivo JSON de saída')
+    parser.add_argument('--seed', type=int, default=42, help='Semente dos dados sintéticos')
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help='Mede o pico de alocações Python por etapa (mais lento)')
+    parser.add_argument('--compare', '-c', help='JSON de uma execução anterior para comparação')
+    parser.add_argument('--keep', action='store_true', help='Mantém a pasta temporária de cada tamanho')
+    # Uso interno (processo filho)
+    parser.add_argument('--child-rows', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--child-workdir', help=argparse.SUPPRESS)
+    parser.add_argument('--child-result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    use_tracemalloc = args.tracemalloc
+
+    if args.child_rows:
+        resultado = run_size(args.child_rows, args.child_workdir, args.seed, use_tracemalloc)
+        with open(args.child_result, "w", encoding="utf-8") as f:
+            json.dump(resultado, f)
+        # Threads do servidor (jobs de upload) não precisam ser aguardadas
+        os._exit(0)
+
+    import pandas as pd
+
+    resultado = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "tracemalloc": use_tracemalloc,
+        "results": []
+    }
+
+    for rows in args.sizes:
+        print(f"Executando benchmark com {rows} linhas...", file=sys.stderr, flush=True)
+        try:
+            resultado["results"].append(run_in_subprocess(rows, args.seed, use_tracemalloc, args.keep))
+        except subprocess.CalledProcessError:
+            print(f"Benchmark com {rows} linhas falhou (ver erro acima)", file=sys.stderr)
+            sys.exit(1)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"Resultados gravados em {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare_results(resultado, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,36 @@ import os
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 DB_DIR = os.path.join(BASE_DIR, "db")
-DB_PATH = os.path.join(DB_DIR, "activity_control.db")
+DB_PATH = os.getenv("DB_PATH", os.path.join(DB_DIR, "activity_control.db"))
+
+# Cache de leitura de planilhas (frames já processados, por SHA-256 do arquivo)
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", os.path.join(DATA_DIR, "parse_cache"))
+PARSE_CACHE_MAX_MB = int(os.getenv("PARSE_CACHE_MAX_MB", "200"))
+
+# Processos para leitura das abas do Excel na API (1 = sequencial, 0 = automático)
+# Cada processo reabre a planilha inteira para ler sua aba; só compensa em planilhas grandes
+EXCEL_PARSE_WORKERS = int(os.getenv("EXCEL_PARSE_WORKERS", "1"))
+
+# Tamanho máximo de arquivo aceito em /upload-excel (MB)
+UPLOAD_MAX_MB = int(os.getenv("UPLOAD_MAX_MB", "50"))
+
+# Threads para processamento dos jobs de upload da API (fila limitada); a leitura
+# do Excel é paralela, a gravação no banco é feita por um job de cada vez
+UPLOAD_JOB_WORKERS = int(os.getenv("UPLOAD_JOB_WORKERS", "2"))
+
+# Agendador da mensagem de status (status_message_scheduler.py)
+STATUS_MESSAGE_INTERVAL_MIN = int(os.getenv("STATUS_MESSAGE_INTERVAL_MIN", "15"))
+STATUS_MESSAGE_POLL_SECONDS = int(os.getenv("STATUS_MESSAGE_POLL_SECONDS", "30"))
+STATUS_MESSAGE_OUTBOX_DIR = os.getenv("STATUS_MESSAGE_OUTBOX_DIR", os.path.join(DATA_DIR, "outbox"))
+STATUS_MESSAGE_WEBHOOK_URL = os.getenv("STATUS_MESSAGE_WEBHOOK_URL", "")
+
+# Compressão das respostas da API (gzip, ou brotli se brotli-asgi estiver instalado)
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+RESPONSE_COMPRESSION_LEVEL = int(os.getenv("RESPONSE_COMPRESSION_LEVEL", "5"))
+
+# Rastreamento de SQL para diagnóstico (GET /debug/sql-trace na API)
+SQL_TRACE = os.getenv("SQL_TRACE", "false").lower() in ("true", "1", "yes")
+SQL_TRACE_N_PLUS_ONE_MIN = int(os.getenv("SQL_TRACE_N_PLUS_ONE_MIN", "10"))
 
 # Configurações de CRQs
 SEQUENCIAS = {
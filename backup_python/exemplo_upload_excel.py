@@ -1,14 +1,38 @@
 """
 Exemplo de como fazer upload de arquivo Excel para a API
 """
+import time
 import requests
 
 # URL da API
 API_BASE_URL = "http://localhost:8000"
 
+def wait_for_job(job_id: str, poll_interval: float = 1.0):
+    """
+    Consulta o job de upload até o processamento terminar
+    
+    Args:
+        job_id: Identificador retornado por POST /upload-excel
+        poll_interval: Intervalo entre consultas (segundos)
+    """
+    ultima_etapa = None
+    while True:
+        response = requests.get(f"{API_BASE_URL}/jobs/{job_id}", timeout=10)
+        response.raise_for_status()
+        job = response.json()
+        
+        if job.get("etapa") != ultima_etapa:
+            ultima_etapa = job.get("etapa")
+            print(f"  [{job['status']}] {ultima_etapa}")
+        
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(poll_interval)
+
+
 def upload_excel_file(file_path: str):
     """
-    Faz upload de um arquivo Excel para a API
+    Faz upload de um arquivo Excel para a API e acompanha o processamento
     
     Args:
         file_path: Caminho do arquivo Excel (.xlsx ou .xls)
@@ -20,10 +44,14 @@ def upload_excel_file(file_path: str):
             files = {'file': (file_path, f, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')}
             
             print(f"Enviando arquivo: {file_path}")
-            response = requests.post(url, files=files, timeout=300)
+            response = requests.post(url, files=files, timeout=60)
             
-            if response.status_code == 200:
-                result = response.json()
+        if response.status_code in (200, 202):
+            job_id = response.json()["job_id"]
+            print(f"Processamento agendado (job {job_id})")
+            result = wait_for_job(job_id)
+            
+            if result["status"] == "completed":
                 print("\n✅ Upload realizado com sucesso!")
                 print(f"  Arquivo: {result['filename']}")
                 print(f"  Total de linhas: {result['total_rows']}")
@@ -32,10 +60,13 @@ def upload_excel_file(file_path: str):
                 print(f"  Sequências processadas: {', '.join(result['sequencias'])}")
                 return result
             else:
-                print(f"\n❌ Erro: HTTP {response.status_code}")
-                print(f"  Resposta: {response.text}")
+                print(f"\n❌ Erro no processamento: {result['erro']}")
                 return None
-                
+        else:
+            print(f"\n❌ Erro: HTTP {response.status_code}")
+            print(f"  Resposta: {response.text}")
+            return None
+            
     except FileNotFoundError:
         print(f"❌ Arquivo não encontrado: {file_path}")
         return None
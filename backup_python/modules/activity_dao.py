@@ -0,0 +1,361 @@
+"""
+Módulo de acesso a dados de activity_control (comandos SQL fixos e parametrizados)
+
+Todos os comandos têm texto fixo com parâmetros nomeados, de modo que o cache
+de statements do sqlite3 é reaproveitado entre chamadas. Cada thread usa sua
+própria conexão, mantida aberta, e toda operação tem variante em lote.
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+from config import DB_PATH
+from modules.metrics import InstrumentedConnection
+
+CONTROL_COLUMNS = """status, horario_inicio_real, horario_fim_real, atraso_minutos,
+                     observacoes, is_milestone, predecessoras"""
+
+SQL_GET_BY_EXCEL_ID = f"""
+    SELECT {CONTROL_COLUMNS}
+    FROM activity_control
+    WHERE seq = :seq AND sequencia = :sequencia AND excel_data_id = :excel_data_id
+"""
+
+# Compatibilidade: busca apenas por seq e sequencia (retorna a primeira linha)
+SQL_GET_BY_SEQ = f"""
+    SELECT {CONTROL_COLUMNS}
+    FROM activity_control
+    WHERE seq = :seq AND sequencia = :sequencia
+    LIMIT 1
+"""
+
+# Busca em lote: as chaves vão em um único parâmetro JSON ([[seq, sequencia,
+# excel_data_id], ...]), de modo que o texto do comando não depende da
+# quantidade; excel_data_id null busca apenas por seq e sequencia (primeira linha)
+SQL_GET_MANY = f"""
+    WITH chaves AS (
+        SELECT key AS posicao,
+               json_extract(value, '$[0]') AS seq,
+               json_extract(value, '$[1]') AS sequencia,
+               json_extract(value, '$[2]') AS excel_data_id
+        FROM json_each(:chaves)
+    )
+    SELECT chaves.posicao, {CONTROL_COLUMNS}
+    FROM chaves
+    JOIN activity_control ON activity_control.id = (
+        SELECT c.id FROM activity_control c
+        WHERE c.seq = chaves.seq AND c.sequencia = chaves.sequencia
+          AND (chaves.excel_data_id IS NULL OR c.excel_data_id = chaves.excel_data_id)
+        LIMIT 1
+    )
+"""
+
+# Campos None mantêm o valor atual (mesmo comportamento de save_activity_control)
+SQL_UPSERT_MERGE = """
+    INSERT INTO activity_control
+    (seq, sequencia, excel_data_id, status, horario_inicio_real, horario_fim_real,
+     atraso_minutos, observacoes, is_milestone, predecessoras, data_atualizacao)
+    VALUES (:seq, :sequencia, :excel_data_id, COALESCE(NULLIF(:status, ''), 'Planejado'),
+            :horario_inicio_real, :horario_fim_real, COALESCE(:atraso_minutos, 0),
+            :observacoes, COALESCE(:is_milestone, 0), COALESCE(:predecessoras, ''), :agora)
+    ON CONFLICT(seq, sequencia, excel_data_id) DO UPDATE SET
+        status = COALESCE(:status, status),
+        horario_inicio_real = COALESCE(:horario_inicio_real, horario_inicio_real),
+        horario_fim_real = COALESCE(:horario_fim_real, horario_fim_real),
+        atraso_minutos = COALESCE(:atraso_minutos, atraso_minutos),
+        observacoes = COALESCE(:observacoes, observacoes),
+        is_milestone = COALESCE(:is_milestone, is_milestone),
+        predecessoras = COALESCE(:predecessoras, predecessoras),
+        data_atualizacao = :agora
+"""
+
+# Carga via API: sobrescreve horários, atraso, observações e rollback e desarquiva
+SQL_UPSERT_REPLACE = """
+    INSERT INTO activity_control
+    (seq, sequencia, excel_data_id, status, horario_inicio_real, horario_fim_real,
+     atraso_minutos, observacoes, is_rollback, arquivado, data_atualizacao)
+    VALUES (:seq, :sequencia, :excel_data_id, COALESCE(:status, 'Planejado'),
+            :horario_inicio_real, :horario_fim_real, :atraso_minutos,
+            :observacoes, :is_rollback, 0, :agora)
+    ON CONFLICT(seq, sequencia, excel_data_id) DO UPDATE SET
+        status = COALESCE(:status, status),
+        horario_inicio_real = :horario_inicio_real,
+        horario_fim_real = :horario_fim_real,
+        atraso_minutos = :atraso_minutos,
+        observacoes = :observacoes,
+        is_rollback = :is_rollback,
+        arquivado = 0,
+        data_atualizacao = :agora
+"""
+
+SQL_UPDATE_STATUS = """
+    UPDATE activity_control
+    SET status = :status, data_atualizacao = :agora
+    WHERE seq = :seq AND sequencia = :sequencia AND excel_data_id = :excel_data_id
+"""
+
+# Rollback ativado: atividades de execução da sequência saem de cena
+SQL_ARCHIVE_EXECUTION = """
+    UPDATE activity_control
+    SET arquivado = 1, status = 'Arquivado', data_atualizacao = :agora
+    WHERE sequencia = :sequencia AND (is_rollback = 0 OR is_rollback IS NULL) AND arquivado = 0
+"""
+
+SQL_ACTIVATE_ROLLBACK = """
+    UPDATE activity_control
+    SET arquivado = 0, status = 'Planejado', data_atualizacao = :agora
+    WHERE sequencia = :sequencia AND is_rollback = 1
+"""
+
+SQL_DELETE = """
+    DELETE FROM activity_control
+    WHERE seq = :seq AND sequencia = :sequencia AND excel_data_id = :excel_data_id
+"""
+
+UPSERT_FIELDS = ["status", "horario_inicio_real", "horario_fim_real", "atraso_minutos",
+                 "observacoes", "is_milestone", "predecessoras", "is_rollback"]
+
+
+def _row_to_dict(row):
+    """
+    Converte uma linha de activity_control no formato usado pelo sistema
+
+    Args:
+        row: Tupla na ordem de CONTROL_COLUMNS
+
+    Returns:
+        dict: Dados de controle da atividade
+    """
+    return {
+        "status": row[0],
+        "horario_inicio_real": row[1],
+        "horario_fim_real": row[2],
+        "atraso_minutos": row[3],
+        "observacoes": row[4],
+        "is_milestone": bool(row[5]) if row[5] is not None else False,
+        "predecessoras": row[6] if row[6] else ""
+    }
+
+
+class ActivityDAO:
+    """Acesso a activity_control com comandos preparados e conexão por thread"""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or DB_PATH
+        self._local = threading.local()
+
+    def get_connection(self):
+        """Retorna a conexão da thread atual (aberta uma vez e reaproveitada)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, cached_statements=256,
+                                   factory=InstrumentedConnection)
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Fecha a conexão da thread atual"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @staticmethod
+    def _key_params(seq, sequencia, excel_data_id):
+        # excel_data_id None é gravado como 0 (mesma regra de save_activity_control)
+        return {"seq": seq, "sequencia": sequencia,
+                "excel_data_id": excel_data_id if excel_data_id is not None else 0}
+
+    def _upsert_params(self, row, agora):
+        params = self._key_params(row["seq"], row["sequencia"], row.get("excel_data_id"))
+        for campo in UPSERT_FIELDS:
+            params[campo] = row.get(campo)
+        if params["is_milestone"] is not None:
+            params["is_milestone"] = 1 if params["is_milestone"] else 0
+        params["is_rollback"] = 1 if params["is_rollback"] else 0
+        params["agora"] = agora
+        return params
+
+    def get(self, seq, sequencia, excel_data_id=None):
+        """
+        Busca dados de controle de uma atividade
+
+        Args:
+            seq: Número sequencial
+            sequencia: Sequência/CRQ
+            excel_data_id: ID da linha no excel_data (None busca apenas por seq e sequencia)
+
+        Returns:
+            dict: Dados de controle ou None se não existir
+        """
+        conn = self.get_connection()
+        if excel_data_id is None:
+            row = conn.execute(SQL_GET_BY_SEQ, {"seq": seq, "sequencia": sequencia}).fetchone()
+        else:
+            row = conn.execute(SQL_GET_BY_EXCEL_ID, self._key_params(seq, sequencia, excel_data_id)).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def get_many(self, keys):
+        """
+        Busca dados de controle de várias atividades em uma única consulta
+
+        Args:
+            keys: Lista de tuplas (seq, sequencia, excel_data_id); excel_data_id None
+                  busca apenas por seq e sequencia
+
+        Returns:
+            dict: {(seq, sequencia, excel_data_id): dados} apenas das encontradas
+        """
+        keys = list(keys)
+        if not keys:
+            return {}
+
+        chaves = json.dumps([
+            [int(seq), sequencia, None if excel_data_id is None else int(excel_data_id)]
+            for seq, sequencia, excel_data_id in keys
+        ])
+        conn = self.get_connection()
+        rows = conn.execute(SQL_GET_MANY, {"chaves": chaves}).fetchall()
+        return {keys[row[0]]: _row_to_dict(row[1:]) for row in rows}
+
+    def upsert(self, seq, sequencia, excel_data_id=None, **fields):
+        """
+        Cria ou atualiza o controle de uma atividade (campos None mantêm o valor atual)
+
+        Args:
+            seq: Número sequencial
+            sequencia: Sequência/CRQ
+            excel_data_id: ID da linha no excel_data (opcional)
+            **fields: status, horario_inicio_real, horario_fim_real, atraso_minutos,
+                      observacoes, is_milestone, predecessoras
+        """
+        self.upsert_many([dict(fields, seq=seq, sequencia=sequencia, excel_data_id=excel_data_id)])
+
+    def upsert_many(self, rows, replace=False, conn=None):
+        """
+        Cria ou atualiza o controle de várias atividades em uma transação
+
+        Args:
+            rows: Lista de dicts com seq, sequencia, excel_data_id e os campos de controle
+            replace: Se True, sobrescreve horários, atraso, observações e is_rollback
+                     e desarquiva (carga via API); se False, campos None mantêm o valor atual
+            conn: Conexão com transação em andamento (o commit fica a cargo de quem chamou);
+                  se None, usa a conexão da thread e faz o commit
+
+        Returns:
+            int: Quantidade de linhas processadas
+        """
+        if not rows:
+            return 0
+
+        agora = datetime.now().isoformat()
+        sql = SQL_UPSERT_REPLACE if replace else SQL_UPSERT_MERGE
+        params = (self._upsert_params(row, agora) for row in rows)
+        if conn is not None:
+            conn.executemany(sql, params)
+            return len(rows)
+
+        conn = self.get_connection()
+        with conn:
+            conn.executemany(sql, params)
+        return len(rows)
+
+
+    def update_status_many(self, rows):
+        """
+        Atualiza apenas o status de várias atividades em uma transação
+
+        Args:
+            rows: Lista de tuplas (seq, sequencia, excel_data_id, status)
+
+        Returns:
+            int: Quantidade de linhas atualizadas
+        """
+        if not rows:
+            return 0
+
+        agora = datetime.now().isoformat()
+        params = [dict(self._key_params(seq, sequencia, excel_data_id), status=status, agora=agora)
+                  for seq, sequencia, excel_data_id, status in rows]
+        conn = self.get_connection()
+        with conn:
+            cursor = conn.executemany(SQL_UPDATE_STATUS, params)
+        return cursor.rowcount
+
+    def archive_execution(self, sequencia):
+        """
+        Arquiva as atividades de execução (não rollback) de uma sequência
+
+        Args:
+            sequencia: Sequência/CRQ
+
+        Returns:
+            int: Quantidade de atividades arquivadas
+        """
+        conn = self.get_connection()
+        with conn:
+            cursor = conn.execute(SQL_ARCHIVE_EXECUTION,
+                                  {"sequencia": sequencia, "agora": datetime.now().isoformat()})
+        return cursor.rowcount
+
+    def activate_rollback(self, sequencia):
+        """
+        Desarquiva as atividades de rollback de uma sequência e as volta para Planejado
+
+        Args:
+            sequencia: Sequência/CRQ
+
+        Returns:
+            int: Quantidade de atividades ativadas
+        """
+        conn = self.get_connection()
+        with conn:
+            cursor = conn.execute(SQL_ACTIVATE_ROLLBACK,
+                                  {"sequencia": sequencia, "agora": datetime.now().isoformat()})
+        return cursor.rowcount
+
+    def delete_many(self, keys, conn=None):
+        """
+        Remove o controle de várias atividades
+
+        Args:
+            keys: Lista de tuplas (seq, sequencia, excel_data_id)
+            conn: Conexão com transação em andamento (o commit fica a cargo de quem chamou);
+                  se None, usa a conexão da thread e faz o commit
+
+        Returns:
+            int: Quantidade de linhas removidas
+        """
+        if not keys:
+            return 0
+
+        params = [self._key_params(seq, sequencia, excel_data_id) for seq, sequencia, excel_data_id in keys]
+        if conn is not None:
+            return conn.executemany(SQL_DELETE, params).rowcount
+
+        conn = self.get_connection()
+        with conn:
+            cursor = conn.executemany(SQL_DELETE, params)
+        return cursor.rowcount
+
+
+_daos = {}
+_daos_lock = threading.Lock()
+
+
+def get_activity_dao(db_path=None):
+    """
+    Retorna a instância compartilhada do DAO para o banco
+
+    Args:
+        db_path: Caminho do banco (padrão: DB_PATH)
+
+    Returns:
+        ActivityDAO: Instância do DAO
+    """
+    db_path = db_path or DB_PATH
+    with _daos_lock:
+        if db_path not in _daos:
+            _daos[db_path] = ActivityDAO(db_path)
+        return _daos[db_path]
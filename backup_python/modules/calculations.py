@@ -1,28 +1,35 @@
 """
 Módulo para cálculos e lógica de negócio
 """
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from config import DATE_FORMAT, STATUS_OPCOES, SEQUENCIAS, TOTAL_GERAL
+from modules.data_cache import versioned_cache
 
 
-def convert_time_to_minutes(time_str):
+def _time_value_to_minutes(time_str):
     """
-    Converte tempo no formato hh:mm:ss ou hh:mm para minutos
+    Converte um único valor de tempo para minutos
+    
+    Usado em valores avulsos e quando pyarrow não está disponível.
     
     Args:
-        time_str: String no formato "hh:mm:ss" ou "hh:mm" ou número (já em minutos)
+        time_str: String no formato "hh:mm:ss" ou "hh:mm", número (já em minutos) ou timedelta
         
     Returns:
         float: Tempo em minutos
     """
-    if pd.isna(time_str) or time_str is None:
+    if time_str is None or pd.isna(time_str):
         return 0
     
     # Se já é um número, assumir que já está em minutos
     if isinstance(time_str, (int, float)):
         return float(time_str)
     
+    if isinstance(time_str, timedelta):
+        return time_str.total_seconds() / 60
+    
     # Converter para string
     time_str = str(time_str).strip()
     
@@ -35,6 +42,11 @@ def convert_time_to_minutes(time_str):
     except ValueError:
         pass
     
+    # timedelta com dias ("1 day, 2:00:00")
+    if " day" in time_str:
+        delta = pd.to_timedelta(time_str, errors='coerce')
+        return 0 if pd.isna(delta) else delta.total_seconds() / 60
+    
     # Tentar parsear formato hh:mm:ss ou hh:mm
     try:
         parts = time_str.split(":")
@@ -53,6 +65,103 @@ def convert_time_to_minutes(time_str):
         return 0
 
 
+def _text_series_to_minutes(texto):
+    """
+    Converte uma série de texto (dtype Arrow) com tempos para minutos
+    
+    Args:
+        texto: Series de strings (pd.ArrowDtype(pa.string())), já sem espaços nas pontas
+        
+    Returns:
+        Series: Tempo em minutos (NaN quando não reconhecido)
+    """
+    minutos = pd.Series(float("nan"), index=texto.index)
+    
+    # Strings numéricas: já estão em minutos
+    numerico = texto.str.fullmatch(r"[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?").fillna(False).astype(bool)
+    if numerico.any():
+        minutos[numerico] = texto[numerico].astype("float64")
+    
+    # "hh:mm:ss" / "hh:mm" com partes inteiras (segundos ausentes valem 0)
+    hms = texto.str.fullmatch(r"-?\d+:\d+(:\d+)?").fillna(False).astype(bool)
+    if hms.any():
+        # extract em object: com ArrowDtype exige pandas >= 2.2
+        partes = texto[hms].astype(object).str.extract(r"(-?\d+):(\d+)(?::(\d+))?")
+        horas = partes[0].astype("float64")
+        mins = partes[1].astype("float64")
+        segs = partes[2].astype("float64").fillna(0.0)
+        minutos[hms] = (horas * 60 + mins + segs / 60).astype(float)
+    
+    # timedelta com dias ("1 day, 2:00:00")
+    com_dias = minutos.isna() & texto.str.contains(" day", regex=False).fillna(False).astype(bool)
+    if com_dias.any():
+        minutos[com_dias] = pd.to_timedelta(texto[com_dias].astype(object), errors='coerce').dt.total_seconds() / 60
+    
+    return minutos
+
+
+def convert_time_series_to_minutes(values):
+    """
+    Converte uma série inteira de tempos para minutos (vetorizado)
+    
+    Aceita números (já em minutos), strings "hh:mm:ss" ou "hh:mm", datetime.time
+    e timedelta. Valores vazios ou não reconhecidos viram 0.
+    
+    Args:
+        values: Series (ou lista) com os tempos
+        
+    Returns:
+        Series: Tempo em minutos (float)
+    """
+    serie = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    
+    if pd.api.types.is_timedelta64_dtype(serie):
+        return (serie.dt.total_seconds() / 60).fillna(0.0)
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        return pd.to_numeric(serie, errors='coerce').astype(float).fillna(0.0)
+    
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return serie.map(_time_value_to_minutes).astype(float)
+    
+    # Colunas homogêneas (datetime.time, timedelta, números ou texto) viram um array Arrow direto
+    try:
+        array = pa.array(serie.astype(object).values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        array = None
+    
+    if array is not None and pa.types.is_time(array.type):
+        micros = array.cast(pa.time64("us")).cast(pa.int64()).to_numpy(zero_copy_only=False)
+        minutos = pd.Series(micros, index=serie.index, dtype=float) / 60_000_000
+    elif array is not None and pa.types.is_duration(array.type):
+        micros = array.cast(pa.duration("us")).cast(pa.int64()).to_numpy(zero_copy_only=False)
+        minutos = pd.Series(micros, index=serie.index, dtype=float) / 60_000_000
+    elif array is not None and (pa.types.is_integer(array.type) or pa.types.is_floating(array.type)):
+        minutos = pd.Series(array.cast(pa.float64()).to_numpy(zero_copy_only=False), index=serie.index)
+    else:
+        # Texto ou tipos misturados: converter a representação em texto
+        texto = serie.astype(object).where(serie.notna(), None).map(str, na_action='ignore')
+        texto = texto.astype(pd.ArrowDtype(pa.string())).str.strip()
+        minutos = _text_series_to_minutes(texto)
+    
+    return minutos.fillna(0.0)
+
+
+def convert_time_to_minutes(time_str):
+    """
+    Converte tempo no formato hh:mm:ss ou hh:mm para minutos
+    (para séries inteiras use convert_time_series_to_minutes)
+    
+    Args:
+        time_str: String no formato "hh:mm:ss" ou "hh:mm" ou número (já em minutos)
+        
+    Returns:
+        float: Tempo em minutos
+    """
+    return float(_time_value_to_minutes(time_str))
+
+
 def calculate_delay(fim_planejado, fim_real):
     """
     Calcula atraso/adiantamento em minutos
@@ -232,7 +341,172 @@ def calculate_statistics(data_dict):
     return stats
 
 
-def get_activities_by_status(data_dict, status, sequencia=None, exclude_milestones=True):
+class ActivityStatusIndex:
+    """
+    Índice das atividades particionado por status, milestone e CRQ
+
+    Os dataframes de todos os CRQs são concatenados uma única vez e ordenados
+    por (milestone, status, CRQ, posição original). Cada combinação ocupa uma
+    faixa contínua de linhas, de modo que as consultas retornam fatias
+    (iloc[a:b]) do frame compartilhado, sem filtros nem cópias.
+    """
+
+    def __init__(self, data_dict):
+        """
+        Constrói o índice a partir dos dataframes por CRQ
+
+        Args:
+            data_dict: Dicionário com dataframes
+        """
+        partes = [(crq, data["dataframe"]) for crq, data in data_dict.items()
+                  if data.get("dataframe") is not None]
+        self.crqs = [crq for crq, _ in partes]
+        self.faixas = {}
+        self.proximas = {}
+        self.atrasadas = {}
+
+        if not partes:
+            self.frame = pd.DataFrame()
+            self._posicao_original = np.array([], dtype=np.int64)
+            return
+
+        combinado = pd.concat([df for _, df in partes], ignore_index=True)
+        n = len(combinado)
+        crq_codigo = np.repeat(np.arange(len(partes)), [len(df) for _, df in partes])
+        if "Is_Milestone" in combinado.columns:
+            milestone = (combinado["Is_Milestone"].fillna(False) == True).to_numpy(dtype=bool)
+        else:
+            milestone = np.zeros(n, dtype=bool)
+        status = combinado["Status"] if "Status" in combinado.columns else pd.Series([None] * n)
+        status_codigo, status_valores = pd.factorize(status)
+
+        ordem = np.lexsort((np.arange(n), crq_codigo, status_codigo, milestone))
+        self.frame = combinado.take(ordem).reset_index(drop=True)
+        self._posicao_original = ordem
+
+        # Faixas contínuas por (milestone, status, crq)
+        ms, st_, cs = milestone[ordem], status_codigo[ordem], crq_codigo[ordem]
+        mudancas = np.flatnonzero((ms[1:] != ms[:-1]) | (st_[1:] != st_[:-1]) | (cs[1:] != cs[:-1])) + 1
+        inicios = np.concatenate(([0], mudancas))
+        fins = np.concatenate((mudancas, [n]))
+        for inicio, fim in zip(inicios.tolist(), fins.tolist()):
+            valor = status_valores[st_[inicio]] if st_[inicio] >= 0 else None
+            self.faixas[(bool(ms[inicio]), valor, self.crqs[cs[inicio]])] = (inicio, fim)
+
+        # Próximas: planejadas (sem milestones) ordenadas por Inicio, por CRQ e geral
+        if "Inicio" in self.frame.columns:
+            planejadas = self._ranges(["Planejado"], [False], None)
+            if planejadas:
+                inicio, fim = planejadas[0][0], planejadas[-1][1]
+                ordenadas = self.frame.iloc[inicio:fim].sort_values("Inicio", kind="stable").index.to_numpy()
+                self.proximas[None] = ordenadas
+                for crq in self.crqs:
+                    faixa = self.faixas.get((False, "Planejado", crq))
+                    if faixa:
+                        self.proximas[crq] = ordenadas[(ordenadas >= faixa[0]) & (ordenadas < faixa[1])]
+
+        # Atrasadas: status "Atrasado" ou atraso > 0 (sem milestones), na ordem original
+        atrasado = status.eq("Atrasado").fillna(False).to_numpy(dtype=bool)[ordem]
+        if "Atraso_Minutos" in self.frame.columns:
+            atraso = pd.to_numeric(self.frame["Atraso_Minutos"], errors="coerce").fillna(0).to_numpy()
+            atrasado |= atraso > 0
+        mascara = ~ms & atrasado
+        posicoes = np.flatnonzero(mascara)
+        posicoes = posicoes[np.argsort(ordem[posicoes], kind="stable")]
+        self.atrasadas[None] = posicoes
+        for i, crq in enumerate(self.crqs):
+            self.atrasadas[crq] = posicoes[cs[posicoes] == i]
+
+    def _ranges(self, statuses, milestones, sequencia):
+        """
+        Faixas do frame para a combinação pedida, unindo faixas adjacentes
+
+        Args:
+            statuses: Lista de status (None para todos)
+            milestones: Lista de flags de milestone a incluir
+            sequencia: CRQ específico (None para todos)
+
+        Returns:
+            list: Lista de tuplas (início, fim)
+        """
+        crqs = [sequencia] if sequencia else self.crqs
+        faixas = []
+        for (milestone, status, crq), (inicio, fim) in self.faixas.items():
+            if milestone in milestones and crq in crqs and (statuses is None or status in statuses):
+                faixas.append((milestone, status, inicio, fim))
+        faixas.sort(key=lambda f: f[2])
+
+        # Faixas do mesmo (milestone, status) em CRQs seguidos são contíguas e
+        # já estão na ordem original: unir em uma única fatia
+        unidas = []
+        for milestone, status, inicio, fim in faixas:
+            if unidas and unidas[-1][0] == (milestone, status) and unidas[-1][2] == inicio:
+                unidas[-1][2] = fim
+            else:
+                unidas.append([(milestone, status), inicio, fim])
+        return [(inicio, fim) for _, inicio, fim in unidas]
+
+    def _select(self, faixas):
+        """
+        Retorna as linhas das faixas (fatia sem cópia quando há uma única faixa)
+
+        Args:
+            faixas: Lista de tuplas (início, fim)
+
+        Returns:
+            pd.DataFrame: Linhas selecionadas, na ordem original dos dados
+        """
+        if not faixas:
+            return self.frame.iloc[0:0]
+        if len(faixas) == 1:
+            return self.frame.iloc[faixas[0][0]:faixas[0][1]]
+        posicoes = np.concatenate([np.arange(inicio, fim) for inicio, fim in faixas])
+        return self.frame.iloc[posicoes[np.argsort(self._posicao_original[posicoes], kind="stable")]]
+
+    def by_status(self, statuses, sequencia=None, exclude_milestones=True):
+        """Atividades com os status informados"""
+        milestones = [False] if exclude_milestones else [False, True]
+        return self._select(self._ranges(statuses, milestones, sequencia))
+
+    def milestones(self, sequencia=None):
+        """Linhas marcadas como milestone"""
+        return self._select(self._ranges(None, [True], sequencia))
+
+    def delayed(self, sequencia=None):
+        """Atividades atrasadas (status Atrasado ou atraso > 0)"""
+        posicoes = self.atrasadas.get(sequencia)
+        if posicoes is None:
+            return self.frame.iloc[0:0]
+        return self.frame.iloc[posicoes]
+
+    def next_planned(self, sequencia=None, limit=10):
+        """Próximas atividades planejadas ordenadas por Inicio"""
+        posicoes = self.proximas.get(sequencia)
+        if posicoes is None:
+            return self.by_status(["Planejado"], sequencia).head(limit)
+        return self.frame.iloc[posicoes[:limit]]
+
+    def count(self, sequencia, status=None):
+        """Quantidade de atividades (sem milestones) do CRQ, opcionalmente por status"""
+        return sum(fim - inicio for inicio, fim in
+                   self._ranges(None if status is None else [status], [False], sequencia))
+
+
+@versioned_cache(maxsize=8)
+def build_activity_status_index(data_dict):
+    """
+    Constrói (uma vez por versão dos dados) o índice por status das atividades
+
+    Args:
+        data_dict: Dicionário com dataframes
+
+    Returns:
+        ActivityStatusIndex: Índice compartilhado (os frames retornados não devem ser alterados)
+    """
+    return ActivityStatusIndex(data_dict)
+
+
+def get_activities_by_status(data_dict, status, sequencia=None, exclude_milestones=True, data_version=None):
     """
     Retorna atividades filtradas por status
     EXCLUI milestones por padrão
@@ -243,43 +517,25 @@ def get_activities_by_status(data_dict, status, sequencia=None, exclude_mileston
         status: Status para filtrar
         sequencia: Sequência específica (None para todas)
         exclude_milestones: Se True, exclui milestones das atividades
+        data_version: Token de versão dos dados (opcional, evita recalcular)
         
     Returns:
-        pd.DataFrame: Dataframe filtrado
+        pd.DataFrame: Dataframe filtrado (fatia somente leitura do índice)
     """
+    if sequencia and sequencia not in data_dict:
+        return pd.DataFrame()
+    
     # Se buscar "Em Execução", incluir também "Adiantado"
     if status == "Em Execução":
         statuses_to_filter = ["Em Execução", "Adiantado"]
     else:
         statuses_to_filter = [status]
     
-    if sequencia:
-        if sequencia in data_dict:
-            df = data_dict[sequencia]["dataframe"]
-            filtered = df[df["Status"].isin(statuses_to_filter)].copy()
-            # Excluir milestones se solicitado
-            if exclude_milestones and "Is_Milestone" in filtered.columns:
-                # Verificação mais robusta: excluir se Is_Milestone é True (não importa se é NaN, None, etc)
-                filtered = filtered[filtered["Is_Milestone"].fillna(False) != True]
-            return filtered
-        return pd.DataFrame()
-    else:
-        all_dfs = []
-        for seq, data in data_dict.items():
-            df = data["dataframe"]
-            filtered = df[df["Status"].isin(statuses_to_filter)].copy()
-            # Excluir milestones se solicitado
-            if exclude_milestones and "Is_Milestone" in filtered.columns:
-                # Verificação mais robusta: excluir se Is_Milestone é True (não importa se é NaN, None, etc)
-                filtered = filtered[filtered["Is_Milestone"].fillna(False) != True]
-            all_dfs.append(filtered)
-        
-        if all_dfs:
-            return pd.concat(all_dfs, ignore_index=True)
-        return pd.DataFrame()
+    indice = build_activity_status_index(data_dict, data_version=data_version)
+    return indice.by_status(statuses_to_filter, sequencia, exclude_milestones)
 
 
-def get_delayed_activities(data_dict, sequencia=None):
+def get_delayed_activities(data_dict, sequencia=None, data_version=None):
     """
     Retorna atividades atrasadas
     EXCLUI milestones
@@ -287,35 +543,17 @@ def get_delayed_activities(data_dict, sequencia=None):
     Args:
         data_dict: Dicionário com dataframes
         sequencia: Sequência específica (None para todas)
+        data_version: Token de versão dos dados (opcional, evita recalcular)
         
     Returns:
         pd.DataFrame: Dataframe com atividades atrasadas
     """
-    if sequencia:
-        if sequencia in data_dict:
-            df = data_dict[sequencia]["dataframe"]
-            filtered = df[(df["Status"] == "Atrasado") | (df["Atraso_Minutos"] > 0)].copy()
-            # Excluir milestones
-            if "Is_Milestone" in filtered.columns:
-                filtered = filtered[filtered["Is_Milestone"].fillna(False) != True]
-            return filtered
-        return pd.DataFrame()
-    else:
-        all_dfs = []
-        for seq, data in data_dict.items():
-            df = data["dataframe"]
-            filtered = df[(df["Status"] == "Atrasado") | (df["Atraso_Minutos"] > 0)].copy()
-            # Excluir milestones
-            if "Is_Milestone" in filtered.columns:
-                filtered = filtered[filtered["Is_Milestone"].fillna(False) != True]
-            all_dfs.append(filtered)
-        
-        if all_dfs:
-            return pd.concat(all_dfs, ignore_index=True)
+    if sequencia and sequencia not in data_dict:
         return pd.DataFrame()
+    return build_activity_status_index(data_dict, data_version=data_version).delayed(sequencia or None)
 
 
-def get_next_activities(data_dict, sequencia=None, limit=10):
+def get_next_activities(data_dict, sequencia=None, limit=10, data_version=None):
     """
     Retorna próximas atividades a executar (planejadas, ordenadas por horário)
     EXCLUI milestones
@@ -324,25 +562,18 @@ def get_next_activities(data_dict, sequencia=None, limit=10):
         data_dict: Dicionário com dataframes
         sequencia: Sequência específica (None para todas)
         limit: Limite de resultados
+        data_version: Token de versão dos dados (opcional, evita recalcular)
         
     Returns:
         pd.DataFrame: Dataframe com próximas atividades
     """
-    df = get_activities_by_status(data_dict, "Planejado", sequencia, exclude_milestones=True)
-    
-    # Garantir que milestones sejam excluídos (verificação adicional)
-    if len(df) > 0 and "Is_Milestone" in df.columns:
-        df = df[df["Is_Milestone"].fillna(False) != True]
-    
-    if len(df) > 0 and "Inicio" in df.columns:
-        # Ordenar por horário planejado
-        df = df.sort_values("Inicio")
-        return df.head(limit)
-    
-    return df.head(limit)
+    if sequencia and sequencia not in data_dict:
+        return pd.DataFrame()
+    indice = build_activity_status_index(data_dict, data_version=data_version)
+    return indice.next_planned(sequencia or None, limit)
 
 
-def is_sequence_completed(data_dict, sequencia):
+def is_sequence_completed(data_dict, sequencia, data_version=None):
     """
     Verifica se uma sequência está 100% concluída
     Considera apenas atividades (exclui milestones)
@@ -350,6 +581,7 @@ def is_sequence_completed(data_dict, sequencia):
     Args:
         data_dict: Dicionário com dataframes
         sequencia: Sequência para verificar
+        data_version: Token de versão dos dados (opcional, evita recalcular)
         
     Returns:
         bool: True se concluída, False caso contrário
@@ -357,14 +589,9 @@ def is_sequence_completed(data_dict, sequencia):
     if sequencia not in data_dict:
         return False
     
-    df = data_dict[sequencia]["dataframe"]
-    
-    # Excluir milestones
-    if "Is_Milestone" in df.columns:
-        df = df[df["Is_Milestone"].fillna(False) != True]
-    
-    total = len(df)
-    concluidas = len(df[df["Status"] == "Concluído"])
+    indice = build_activity_status_index(data_dict, data_version=data_version)
+    total = indice.count(sequencia)
+    concluidas = indice.count(sequencia, "Concluído")
     
     return total > 0 and concluidas == total
 
@@ -410,34 +637,21 @@ def parse_datetime_string(dt_string):
         return None
 
 
-def get_milestones(data_dict, sequencia=None):
+def get_milestones(data_dict, sequencia=None, data_version=None):
     """
     Retorna milestones (marcos do projeto)
     
     Args:
         data_dict: Dicionário com dataframes
         sequencia: Sequência específica (None para todas)
+        data_version: Token de versão dos dados (opcional, evita recalcular)
         
     Returns:
         pd.DataFrame: Dataframe com milestones
     """
-    if sequencia:
-        if sequencia in data_dict:
-            df = data_dict[sequencia]["dataframe"]
-            if "Is_Milestone" in df.columns:
-                return df[df["Is_Milestone"] == True].copy()
-        return pd.DataFrame()
-    else:
-        all_dfs = []
-        for seq, data in data_dict.items():
-            df = data["dataframe"]
-            if "Is_Milestone" in df.columns:
-                filtered = df[df["Is_Milestone"] == True].copy()
-                all_dfs.append(filtered)
-        
-        if all_dfs:
-            return pd.concat(all_dfs, ignore_index=True)
+    if sequencia and sequencia not in data_dict:
         return pd.DataFrame()
+    return build_activity_status_index(data_dict, data_version=data_version).milestones(sequencia or None)
 
 
 def get_predecessoras_list(predecessoras_str):
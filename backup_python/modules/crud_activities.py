@@ -268,16 +268,16 @@ def render_create_activity(data_dict, db_manager):
                 conn.close()
                 
                 # Criar registro de controle
-                db_manager.save_activity_control(
-                    seq=int(seq),
-                    sequencia=crq_selecionado,
+                db_manager.get_activity_dao().upsert(
+                    int(seq),
+                    crq_selecionado,
+                    excel_data_id,
                     status=status,
                     horario_inicio_real=horario_inicio_real.strip() if horario_inicio_real else None,
                     horario_fim_real=horario_fim_real.strip() if horario_fim_real else None,
                     atraso_minutos=atraso_minutos,
                     observacoes=observacoes.strip() if observacoes else None,
-                    is_milestone=is_milestone,
-                    excel_data_id=excel_data_id
+                    is_milestone=is_milestone
                 )
                 
                 st.success(f"✅ Atividade criada com sucesso! (Seq: {seq}, CRQ: {crq_selecionado})")
@@ -483,16 +483,16 @@ def render_edit_activity(data_dict, db_manager):
                         conn.close()
                         
                         # Atualizar controle
-                        db_manager.save_activity_control(
-                            seq=int(seq_selecionado),
-                            sequencia=crq_selecionado,
+                        db_manager.get_activity_dao().upsert(
+                            int(seq_selecionado),
+                            crq_selecionado,
+                            excel_data_id if excel_data_id > 0 else None,
                             status=status,
                             horario_inicio_real=horario_inicio_real.strip() if horario_inicio_real else None,
                             horario_fim_real=horario_fim_real.strip() if horario_fim_real else None,
                             atraso_minutos=atraso_minutos,
                             observacoes=observacoes.strip() if observacoes else None,
-                            is_milestone=is_milestone,
-                            excel_data_id=excel_data_id if excel_data_id > 0 else None
+                            is_milestone=is_milestone
                         )
                         
                         st.success("✅ Atividade atualizada com sucesso!")
@@ -576,12 +576,10 @@ def render_delete_activity(data_dict, db_manager):
                         conn = db_manager.get_connection()
                         cursor = conn.cursor()
                         
-                        # Excluir de activity_control
-                        cursor.execute("""
-                            DELETE FROM activity_control
-                            WHERE seq = ? AND sequencia = ? AND excel_data_id = ?
-                        """, (seq_selecionado, crq_selecionado, excel_data_id))
-                        control_removidos = cursor.rowcount
+                        # Excluir de activity_control (na mesma transação da exclusão em excel_data)
+                        control_removidos = db_manager.get_activity_dao().delete_many(
+                            [(seq_selecionado, crq_selecionado, excel_data_id)], conn=conn
+                        )
                         
                         # Excluir de excel_data
                         cursor.execute("""
@@ -11,6 +11,10 @@ from modules.calculations import (
     get_milestones
 )
 from modules.ui import render_status_card, render_sequence_status_card
+from modules.data_cache import get_data_version
+
+# Fragmentos (reexecução parcial) disponíveis a partir do Streamlit 1.33/1.37
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
 
 
 def render_main_indicators(stats):
@@ -64,122 +68,38 @@ def render_main_indicators(stats):
     st.divider()
 
 
-def render_burndown_chart(data_dict, crq_filtro=None):
+def build_burndown_figure(data_dict, crq_selecionado, agora, data_version=None):
     """
-    Renderiza gráfico Burndown com tempo no eixo horizontal
-    Apenas atividades "Concluídas" reduzem o trabalho restante.
-    Outros status (Em Execução, Atrasado, Adiantado) são tratados como "Planejado".
+    Monta a figura do gráfico Burndown
     
     Args:
         data_dict: Dicionário com dataframes
-        crq_filtro: CRQ específico para filtrar (None para todas)
+        crq_selecionado: CRQ selecionado ou "Todas"
+        agora: Data/hora usada como ponto final da série
+        data_version: Token de versão dos dados (opcional, evita recalcular)
+        
+    Returns:
+        go.Figure: Figura do Burndown ou None se não houver atividades
     """
-    import pandas as pd
-    from datetime import datetime
-    from config import SEQUENCIAS, DATE_FORMAT
-    from modules.calculations import parse_datetime_string
-    
-    # Filtro por CRQ
-    col1, col2 = st.columns([1, 3])
-    with col1:
-        crqs_disponiveis = ["Todas"] + sorted(list(data_dict.keys()))
-        crq_selecionado = st.selectbox(
-            "Filtrar por CRQ:",
-            crqs_disponiveis,
-            key="burndown_crq_filter",
-            index=0
-        )
-    
-    # Determinar qual CRQ usar
-    if crq_selecionado == "Todas":
-        crqs_para_processar = sorted(list(data_dict.keys()))
-    else:
-        if crq_selecionado in data_dict:
-            crqs_para_processar = [crq_selecionado]
-        else:
-            st.warning(f"CRQ '{crq_selecionado}' não encontrado")
-            return
+    from config import SEQUENCIAS
+    from modules.dashboard_data import build_burndown_series
     
-    # Coletar todas as atividades e calcular totais
-    all_activities = []
-    total_atividades = 0
-    
-    for crq in crqs_para_processar:
-        if crq not in data_dict:
-            continue
-        
-        df = data_dict[crq]["dataframe"].copy()
-        
-        # Excluir milestones das contagens
-        if "Is_Milestone" in df.columns:
-            df = df[df["Is_Milestone"].fillna(False) == False]
-        
-        total_atividades += len(df)
-        
-        # Coletar atividades concluídas com data de fim real
-        for _, row in df.iterrows():
-            status = row.get("Status", "Planejado")
-            if status == "Concluído":
-                horario_fim_real = row.get("Horario_Fim_Real")
-                if horario_fim_real and pd.notna(horario_fim_real) and str(horario_fim_real).strip():
-                    try:
-                        # Tentar parsear a data
-                        if isinstance(horario_fim_real, str):
-                            dt = parse_datetime_string(horario_fim_real)
-                        elif hasattr(horario_fim_real, 'to_pydatetime'):
-                            dt = horario_fim_real.to_pydatetime()
-                        elif isinstance(horario_fim_real, datetime):
-                            dt = horario_fim_real
-                        else:
-                            continue
-                        
-                        if dt:
-                            all_activities.append({
-                                'data': dt,
-                                'crq': crq
-                            })
-                    except:
-                        continue
+    # Série calculada de forma vetorizada (cacheada por CRQ e versão dos dados)
+    serie = build_burndown_series(data_dict, crq_selecionado, data_version=data_version)
+    total_atividades = serie["total"]
     
     if total_atividades == 0:
-        st.info("Não há atividades para exibir")
-        return
+        return None
     
-    # Ordenar atividades por data
-    all_activities.sort(key=lambda x: x['data'])
+    # Adicionar ponto final (atual)
+    agora = pd.Timestamp(agora)
+    timestamps = pd.DatetimeIndex(serie["timestamps"]).append(pd.DatetimeIndex([agora]))
+    concluidas_count = int(serie["concluidas"][-1]) if len(serie["concluidas"]) else 0
+    restantes = list(serie["restantes"]) + [total_atividades - concluidas_count]
+    concluidas = list(serie["concluidas"]) + [concluidas_count]
     
-    # Calcular burndown ao longo do tempo
-    if not all_activities:
-        # Se não há atividades concluídas, mostrar apenas o total
-        timestamps = [datetime.now()]
-        restantes = [total_atividades]
-        concluidas = [0]
-    else:
-        # Criar pontos temporais: início (total) + cada conclusão
-        timestamps = []
-        restantes = []
-        concluidas = []
-        
-        # Ponto inicial: todas as atividades ainda pendentes
-        if all_activities:
-            # Usar a primeira data de conclusão ou data atual como início
-            primeira_data = all_activities[0]['data']
-            timestamps.append(primeira_data)
-            restantes.append(total_atividades)
-            concluidas.append(0)
-        
-        # Adicionar pontos para cada atividade concluída
-        concluidas_count = 0
-        for activity in all_activities:
-            concluidas_count += 1
-            timestamps.append(activity['data'])
-            restantes.append(total_atividades - concluidas_count)
-            concluidas.append(concluidas_count)
-        
-        # Adicionar ponto final (atual)
-        timestamps.append(datetime.now())
-        restantes.append(total_atividades - concluidas_count)
-        concluidas.append(concluidas_count)
+    # Marcadores apenas quando há poucos pontos (payload menor em janelas longas)
+    modo_linha = 'lines+markers' if len(timestamps) <= 200 else 'lines'
     
     # Criar gráfico Burndown
     fig = go.Figure()
@@ -188,7 +108,7 @@ def render_burndown_chart(data_dict, crq_filtro=None):
     fig.add_trace(go.Scatter(
         x=timestamps,
         y=restantes,
-        mode='lines+markers',
+        mode=modo_linha,
         name='Trabalho Restante (Real)',
         line=dict(color='#dc3545', width=3),
         marker=dict(size=8, color='#dc3545'),
@@ -198,7 +118,7 @@ def render_burndown_chart(data_dict, crq_filtro=None):
     ))
     
     # Linha do trabalho total (inicial) - constante
-    if timestamps:
+    if len(timestamps) > 0:
         fig.add_trace(go.Scatter(
             x=[timestamps[0], timestamps[-1]],
             y=[total_atividades, total_atividades],
@@ -212,7 +132,7 @@ def render_burndown_chart(data_dict, crq_filtro=None):
     fig.add_trace(go.Scatter(
         x=timestamps,
         y=concluidas,
-        mode='lines+markers',
+        mode=modo_linha,
         name='Concluídas (Acumulado)',
         line=dict(color='#28a745', width=2),
         marker=dict(size=6, color='#28a745'),
@@ -258,6 +178,66 @@ def render_burndown_chart(data_dict, crq_filtro=None):
         plot_bgcolor='white'
     )
     
+    return fig
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _cached_burndown_figure(data_version, crq_selecionado, agora_minuto, _data_dict):
+    """
+    Figura do Burndown cacheada por versão dos dados, filtro de CRQ e minuto atual
+    
+    Args:
+        data_version: Token de versão dos dados
+        crq_selecionado: CRQ selecionado ou "Todas"
+        agora_minuto: Data/hora atual truncada no minuto
+        _data_dict: Dicionário com dataframes (não entra no hash do cache)
+        
+    Returns:
+        go.Figure: Figura do Burndown ou None
+    """
+    return build_burndown_figure(_data_dict, crq_selecionado, agora_minuto, data_version)
+
+
+@_fragment
+def render_burndown_chart(data_dict, crq_filtro=None, data_version=None):
+    """
+    Renderiza gráfico Burndown com tempo no eixo horizontal
+    Apenas atividades "Concluídas" reduzem o trabalho restante.
+    Outros status (Em Execução, Atrasado, Adiantado) são tratados como "Planejado".
+    Executado como fragmento: trocar o filtro de CRQ não reexecuta o dashboard inteiro.
+    
+    Args:
+        data_dict: Dicionário com dataframes
+        crq_filtro: CRQ específico para filtrar (None para todas)
+        data_version: Token de versão dos dados (opcional)
+    """
+    from datetime import datetime
+    
+    # Filtro por CRQ
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        crqs_disponiveis = ["Todas"] + sorted(list(data_dict.keys()))
+        crq_selecionado = st.selectbox(
+            "Filtrar por CRQ:",
+            crqs_disponiveis,
+            key="burndown_crq_filter",
+            index=0
+        )
+    
+    if crq_selecionado != "Todas" and crq_selecionado not in data_dict:
+        st.warning(f"CRQ '{crq_selecionado}' não encontrado")
+        return
+    
+    if data_version is None:
+        data_version = get_data_version(data_dict)
+    
+    agora_minuto = datetime.now().replace(second=0, microsecond=0)
+    fig = _cached_burndown_figure(data_version, crq_selecionado, agora_minuto, data_dict)
+    
+    if fig is None:
+        st.info("Não há atividades para exibir")
+        return
+    
     st.plotly_chart(fig, width='stretch')
     
     # Adicionar informações adicionais
@@ -267,173 +247,33 @@ def render_burndown_chart(data_dict, crq_filtro=None):
            "- O trabalho restante = Total - Concluídas")
 
 
-def render_gantt_chart(data_dict):
+def build_gantt_figure(data_dict, agora, data_version=None):
     """
-    Renderiza gráfico de Gantt mostrando CRQs no eixo vertical e horários no horizontal
-    Mostra barras planejadas e reais, com linha vertical indicando data/hora atual
+    Monta a figura do gráfico de Gantt por CRQ
     
     Args:
         data_dict: Dicionário com dataframes por CRQ
+        agora: Data/hora atual (GMT-3)
+        data_version: Token de versão dos dados (opcional, evita recalcular)
+        
+    Returns:
+        go.Figure: Figura do Gantt ou None se não houver datas
     """
-    from modules.calculations import parse_datetime_string
     from config import SEQUENCIAS
-    from datetime import datetime, timezone, timedelta
-    
-    st.subheader("📊 Gráfico de Gantt - CRQs vs Horários")
+    from datetime import datetime, timedelta
+    from modules.dashboard_data import build_gantt_spans
     
-    # Data/hora atual (GMT-3)
-    gmt_minus_3 = timezone(timedelta(hours=-3))
-    agora = datetime.now(gmt_minus_3)
     agora_naive = agora.replace(tzinfo=None) if agora.tzinfo else agora
     
-    # Coletar dados de todas as atividades por CRQ
-    gantt_data = []
-    
-    for sequencia, data in data_dict.items():
-        df = data["dataframe"]
-        
-        # Filtrar apenas atividades (não milestones)
-        if "Is_Milestone" in df.columns:
-            df_activities = df[df["Is_Milestone"].fillna(False) != True].copy()
-        else:
-            df_activities = df.copy()
-        
-        # Calcular início e fim planejados e reais para o CRQ (uma barra por CRQ)
-        # Início planejado: menor data de início entre todas as atividades
-        # Fim planejado: maior data de fim entre todas as atividades
-        # Início real: menor data de início real entre todas as atividades
-        # Fim real: maior data de fim real entre todas as atividades
-        # Também coletar informações sobre atividades em execução e adiantadas
-        inicio_planejado_min = None
-        fim_planejado_max = None
-        inicio_real_min = None
-        fim_real_max = None
-        
-        # Para atividades em execução: calcular período de execução
-        inicio_execucao_min = None
-        fim_execucao_max = None  # Será agora ou fim_real, o que vier primeiro
-        
-        # Para atividades adiantadas: verificar se há parte após a linha do tempo
-        tem_adiantadas = False
-        fim_adiantada_max = None
-        
-        for idx, row in df_activities.iterrows():
-            # Datas planejadas
-            inicio_planejado = row.get("Inicio")
-            fim_planejado = row.get("Fim")
-            
-            if pd.notna(inicio_planejado):
-                if isinstance(inicio_planejado, (datetime, pd.Timestamp)):
-                    inicio_dt = inicio_planejado.to_pydatetime() if isinstance(inicio_planejado, pd.Timestamp) else inicio_planejado
-                else:
-                    inicio_dt = parse_datetime_string(str(inicio_planejado))
-                if inicio_dt:
-                    # Remover timezone se existir
-                    if inicio_dt.tzinfo is not None:
-                        inicio_dt = inicio_dt.replace(tzinfo=None)
-                    if inicio_planejado_min is None or inicio_dt < inicio_planejado_min:
-                        inicio_planejado_min = inicio_dt
-            
-            if pd.notna(fim_planejado):
-                if isinstance(fim_planejado, (datetime, pd.Timestamp)):
-                    fim_dt = fim_planejado.to_pydatetime() if isinstance(fim_planejado, pd.Timestamp) else fim_planejado
-                else:
-                    fim_dt = parse_datetime_string(str(fim_planejado))
-                if fim_dt:
-                    # Remover timezone se existir
-                    if fim_dt.tzinfo is not None:
-                        fim_dt = fim_dt.replace(tzinfo=None)
-                    if fim_planejado_max is None or fim_dt > fim_planejado_max:
-                        fim_planejado_max = fim_dt
-            
-            # Datas reais
-            inicio_real = row.get("Horario_Inicio_Real")
-            fim_real = row.get("Horario_Fim_Real")
-            status = str(row.get("Status", "")).strip()
-            
-            # Para atividades concluídas ou adiantadas, sempre considerar o fim_real
-            # mesmo que seja anterior à hora atual (mostra que foi cumprida)
-            is_concluida_ou_adiantada = status in ["Concluído", "Atrasado", "Adiantado"]
-            is_em_execucao = status == "Em Execução" or status == "Adiantado"
-            is_adiantada = status == "Adiantado"
-            
-            if pd.notna(inicio_real):
-                if isinstance(inicio_real, (datetime, pd.Timestamp)):
-                    inicio_dt = inicio_real.to_pydatetime() if isinstance(inicio_real, pd.Timestamp) else inicio_real
-                elif isinstance(inicio_real, str):
-                    inicio_dt = parse_datetime_string(inicio_real)
-                else:
-                    inicio_dt = None
-                if inicio_dt:
-                    # Remover timezone se existir
-                    if inicio_dt.tzinfo is not None:
-                        inicio_dt = inicio_dt.replace(tzinfo=None)
-                    if inicio_real_min is None or inicio_dt < inicio_real_min:
-                        inicio_real_min = inicio_dt
-            
-            if pd.notna(fim_real):
-                if isinstance(fim_real, (datetime, pd.Timestamp)):
-                    fim_dt = fim_real.to_pydatetime() if isinstance(fim_real, pd.Timestamp) else fim_real
-                elif isinstance(fim_real, str):
-                    fim_dt = parse_datetime_string(fim_real)
-                else:
-                    fim_dt = None
-                if fim_dt:
-                    # Remover timezone se existir
-                    if fim_dt.tzinfo is not None:
-                        fim_dt = fim_dt.replace(tzinfo=None)
-                    # Sempre considerar o fim_real, especialmente para atividades concluídas/adiantadas
-                    # mesmo que seja anterior à hora atual (mostra que foi cumprida)
-                    if fim_real_max is None or fim_dt > fim_real_max:
-                        fim_real_max = fim_dt
-                    
-                    # Se é adiantada, marcar para barra tracejada
-                    if is_adiantada:
-                        tem_adiantadas = True
-                        if fim_adiantada_max is None or fim_dt > fim_adiantada_max:
-                            fim_adiantada_max = fim_dt
-            
-            # Coletar informações sobre atividades em execução
-            if is_em_execucao and inicio_dt:  # inicio_dt foi calculado acima
-                if inicio_execucao_min is None or inicio_dt < inicio_execucao_min:
-                    inicio_execucao_min = inicio_dt
-                
-                # Fim de execução: se tem fim_real, usar ele; senão, será agora (será calculado depois)
-                if fim_dt:  # fim_dt foi calculado acima se existe
-                    if fim_execucao_max is None or fim_dt > fim_execucao_max:
-                        fim_execucao_max = fim_dt
-            elif is_concluida_ou_adiantada:
-                # Se está concluída/adiantada mas não tem fim_real, usar o fim planejado como referência
-                # para garantir que a barra seja mostrada
-                if pd.notna(fim_planejado):
-                    if isinstance(fim_planejado, (datetime, pd.Timestamp)):
-                        fim_dt = fim_planejado.to_pydatetime() if isinstance(fim_planejado, pd.Timestamp) else fim_planejado
-                    else:
-                        fim_dt = parse_datetime_string(str(fim_planejado))
-                    if fim_dt:
-                        if fim_dt.tzinfo is not None:
-                            fim_dt = fim_dt.replace(tzinfo=None)
-                        if fim_real_max is None or fim_dt > fim_real_max:
-                            fim_real_max = fim_dt
-        
-        # Adicionar dados do CRQ se tiver pelo menos uma data
-        # Uma única entrada por CRQ com o range completo (início mínimo ao fim máximo)
-        if inicio_planejado_min or fim_planejado_max or inicio_real_min or fim_real_max:
-            gantt_data.append({
-                "CRQ": sequencia,
-                "Inicio_Planejado": inicio_planejado_min,
-                "Fim_Planejado": fim_planejado_max,
-                "Inicio_Real": inicio_real_min,
-                "Fim_Real": fim_real_max,
-                "Inicio_Execucao": inicio_execucao_min,
-                "Fim_Execucao": fim_execucao_max,  # Será ajustado para agora se necessário
-                "Tem_Adiantadas": tem_adiantadas,
-                "Fim_Adiantada": fim_adiantada_max
-            })
+    # Intervalos por CRQ calculados de forma vetorizada (cacheados pela versão dos dados)
+    spans = build_gantt_spans(data_dict, data_version=data_version)
+    gantt_data = [
+        {col: (None if pd.isna(valor) else valor) for col, valor in registro.items()}
+        for registro in spans.to_dict("records")
+    ]
     
     if not gantt_data:
-        st.info("ℹ️ Não há dados suficientes para gerar o gráfico de Gantt. É necessário ter atividades com datas planejadas ou reais.")
-        return
+        return None
     
     # Criar gráfico de Gantt
     fig = go.Figure()
@@ -462,8 +302,7 @@ def render_gantt_chart(data_dict):
             todas_datas.append(d["Fim_Real"])
     
     if not todas_datas:
-        st.info("ℹ️ Não há datas válidas para gerar o gráfico de Gantt.")
-        return
+        return None
     
     # Converter para datetime se necessário e normalizar timezone
     todas_datas_dt = []
@@ -693,6 +532,66 @@ def render_gantt_chart(data_dict):
         plot_bgcolor='white'
     )
     
+    return fig
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _cached_gantt_figure(data_version, por_atividade, agora_minuto, _data_dict):
+    """
+    Figura do Gantt cacheada por versão dos dados, modo e minuto atual
+    
+    Args:
+        data_version: Token de versão dos dados
+        por_atividade: Se True, uma barra por atividade; senão, uma por CRQ
+        agora_minuto: Data/hora atual (GMT-3) truncada no minuto
+        _data_dict: Dicionário com dataframes (não entra no hash do cache)
+        
+    Returns:
+        go.Figure: Figura do Gantt ou None
+    """
+    if por_atividade:
+        agora_naive = agora_minuto.replace(tzinfo=None)
+        return build_activity_gantt_figure(_data_dict, agora_naive, data_version)
+    return build_gantt_figure(_data_dict, agora_minuto, data_version)
+
+
+@_fragment
+def render_gantt_chart(data_dict, data_version=None):
+    """
+    Renderiza gráfico de Gantt mostrando CRQs no eixo vertical e horários no horizontal
+    Mostra barras planejadas e reais, com linha vertical indicando data/hora atual
+    Executado como fragmento: alternar o modo não reexecuta o dashboard inteiro.
+    
+    Args:
+        data_dict: Dicionário com dataframes por CRQ
+        data_version: Token de versão dos dados (opcional)
+    """
+    from datetime import datetime, timezone, timedelta
+    
+    st.subheader("📊 Gráfico de Gantt - CRQs vs Horários")
+    
+    # Data/hora atual (GMT-3)
+    gmt_minus_3 = timezone(timedelta(hours=-3))
+    agora = datetime.now(gmt_minus_3)
+    agora_naive = agora.replace(tzinfo=None) if agora.tzinfo else agora
+    
+    # Modo por atividade (uma barra por atividade) para análise detalhada
+    por_atividade = st.checkbox(
+        "Exibir uma barra por atividade",
+        value=False,
+        key="gantt_por_atividade"
+    )
+    
+    if data_version is None:
+        data_version = get_data_version(data_dict)
+    
+    agora_minuto = agora.replace(second=0, microsecond=0)
+    fig = _cached_gantt_figure(data_version, por_atividade, agora_minuto, data_dict)
+    
+    if fig is None:
+        st.info("ℹ️ Não há dados suficientes para gerar o gráfico de Gantt. É necessário ter atividades com datas planejadas ou reais.")
+        return
+    
     st.plotly_chart(fig, use_container_width=True)
     
     # Informações adicionais
@@ -701,10 +600,152 @@ def render_gantt_chart(data_dict):
     st.divider()
     
     # Lista de atividades que deveriam estar em execução e não estão
-    render_activities_execution_status(data_dict, agora_naive)
+    render_activities_execution_status(data_dict, agora_naive, data_version=data_version)
 
 
-def render_activities_execution_status(data_dict, agora):
+def _gantt_segments(inicios, fins, y_positions, textos):
+    """
+    Monta arrays de segmentos horizontais separados por None (um único trace)
+    
+    Args:
+        inicios: Series datetime64 com os inícios
+        fins: Series datetime64 com os fins
+        y_positions: Array com a posição vertical de cada segmento
+        textos: Array com o texto de hover de cada segmento
+        
+    Returns:
+        tuple: (x, y, text) prontos para go.Scatter
+    """
+    import numpy as np
+    
+    n = len(inicios)
+    x = np.empty(n * 3, dtype=object)
+    y = np.empty(n * 3, dtype=object)
+    text = np.empty(n * 3, dtype=object)
+    
+    x[0::3] = inicios.dt.to_pydatetime()
+    x[1::3] = fins.dt.to_pydatetime()
+    x[2::3] = None
+    y[0::3] = y_positions
+    y[1::3] = y_positions
+    y[2::3] = None
+    text[0::3] = textos
+    text[1::3] = textos
+    text[2::3] = None
+    
+    return x, y, text
+
+
+def build_activity_gantt_figure(data_dict, agora, data_version=None):
+    """
+    Monta a figura do gráfico de Gantt com uma barra por atividade
+    Usa um único trace por tipo de barra para continuar responsivo com milhares de linhas
+    
+    Args:
+        data_dict: Dicionário com dataframes por CRQ
+        agora: Data/hora atual (datetime sem timezone)
+        data_version: Token de versão dos dados (opcional, evita recalcular)
+        
+    Returns:
+        go.Figure: Figura do Gantt ou None se não houver datas
+    """
+    import numpy as np
+    from config import SEQUENCIAS
+    from modules.dashboard_data import build_gantt_spans
+    
+    spans = build_gantt_spans(data_dict, por_atividade=True, data_version=data_version)
+    
+    if spans.empty:
+        return None
+    
+    emojis = spans["CRQ"].map(lambda crq: SEQUENCIAS.get(crq, {}).get("emoji", "📋"))
+    labels = (emojis + " " + spans["CRQ"].astype(str) + " #" + spans["Seq"].astype(str)).to_numpy()
+    posicoes = np.arange(len(spans))
+    textos = (labels + " - " + spans["Atividade"].str.slice(0, 60)).to_numpy()
+    
+    fig = go.Figure()
+    
+    # Barras planejadas
+    planejadas = spans["Inicio_Planejado"].notna() & spans["Fim_Planejado"].notna()
+    if planejadas.any():
+        x, y, text = _gantt_segments(
+            spans.loc[planejadas, "Inicio_Planejado"],
+            spans.loc[planejadas, "Fim_Planejado"],
+            posicoes[planejadas.to_numpy()],
+            textos[planejadas.to_numpy()]
+        )
+        fig.add_trace(go.Scatter(
+            x=x, y=y, text=text,
+            mode='lines',
+            line=dict(color='rgba(0, 123, 255, 0.6)', width=10),
+            name='Planejado',
+            hovertemplate='<b>%{text}</b><br>Planejado: %{x|%d/%m/%Y %H:%M:%S}<extra></extra>'
+        ))
+    
+    # Barras reais (atividades sem fim real vão até agora)
+    fim_real = spans["Fim_Real"].fillna(pd.Timestamp(agora))
+    reais = spans["Inicio_Real"].notna() & (fim_real >= spans["Inicio_Real"])
+    if reais.any():
+        x, y, text = _gantt_segments(
+            spans.loc[reais, "Inicio_Real"],
+            fim_real[reais],
+            posicoes[reais.to_numpy()],
+            textos[reais.to_numpy()]
+        )
+        fig.add_trace(go.Scatter(
+            x=x, y=y, text=text,
+            mode='lines',
+            line=dict(color='rgba(40, 167, 69, 0.8)', width=5),
+            name='Real',
+            hovertemplate='<b>%{text}</b><br>Real: %{x|%d/%m/%Y %H:%M:%S}<extra></extra>'
+        ))
+    
+    fig.add_shape(
+        type="line",
+        x0=agora,
+        x1=agora,
+        y0=-0.5,
+        y1=len(spans) - 0.5,
+        line=dict(color="red", width=2, dash="dash"),
+    )
+    
+    # Exibir rótulos apenas quando cabem no gráfico
+    mostrar_rotulos = len(spans) <= 60
+    fig.update_layout(
+        title={
+            'text': '📊 Gráfico de Gantt - Atividades vs Horários',
+            'x': 0.5,
+            'xanchor': 'center',
+            'font': {'size': 18}
+        },
+        xaxis_title="Data/Hora",
+        yaxis=dict(
+            tickmode='array' if mostrar_rotulos else 'auto',
+            tickvals=posicoes if mostrar_rotulos else None,
+            ticktext=labels if mostrar_rotulos else None,
+            showticklabels=mostrar_rotulos,
+            autorange="reversed"
+        ),
+        xaxis=dict(
+            type='date',
+            tickformat='%d/%m/%Y %H:%M'
+        ),
+        height=min(2000, max(400, len(spans) * 18)),
+        hovermode='closest',
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        ),
+        plot_bgcolor='white'
+    )
+    
+    return fig
+
+
+def render_activities_execution_status(data_dict, agora, data_version=None):
     """
     Renderiza lista de atividades que deveriam estar em execução e não estão,
     e atividades em execução indicando se estão adiantadas
@@ -712,88 +753,17 @@ def render_activities_execution_status(data_dict, agora):
     Args:
         data_dict: Dicionário com dataframes por CRQ
         agora: Data/hora atual (datetime sem timezone)
+        data_version: Token de versão dos dados (opcional)
     """
-    from datetime import datetime
     from config import SEQUENCIAS
-    from modules.calculations import parse_datetime_string
+    from modules.dashboard_data import build_execution_status_index
     
     st.subheader("📋 Status de Execução das Atividades")
     
-    atividades_atrasadas = []  # Deveriam estar em execução mas não estão
-    atividades_em_execucao = []  # Estão em execução (com indicação de adiantamento)
-    
-    for sequencia, data in data_dict.items():
-        df = data["dataframe"]
-        
-        # Filtrar apenas atividades (não milestones)
-        if "Is_Milestone" in df.columns:
-            df_activities = df[df["Is_Milestone"].fillna(False) != True].copy()
-        else:
-            df_activities = df.copy()
-        
-        crq_info = SEQUENCIAS.get(sequencia, {})
-        emoji = crq_info.get("emoji", "📋")
-        nome_crq = crq_info.get("nome", sequencia)
-        
-        for idx, row in df_activities.iterrows():
-            status = str(row.get("Status", "")).strip()
-            atividade = str(row.get("Atividade", "")).strip()
-            seq = row.get("Seq", "")
-            
-            # Datas planejadas
-            inicio_planejado = row.get("Inicio")
-            
-            # Data de início real
-            inicio_real = row.get("Horario_Inicio_Real")
-            
-            # Converter datas para datetime
-            inicio_planejado_dt = None
-            if pd.notna(inicio_planejado):
-                if isinstance(inicio_planejado, (datetime, pd.Timestamp)):
-                    inicio_planejado_dt = inicio_planejado.to_pydatetime() if isinstance(inicio_planejado, pd.Timestamp) else inicio_planejado
-                else:
-                    inicio_planejado_dt = parse_datetime_string(str(inicio_planejado))
-                if inicio_planejado_dt and inicio_planejado_dt.tzinfo is not None:
-                    inicio_planejado_dt = inicio_planejado_dt.replace(tzinfo=None)
-            
-            inicio_real_dt = None
-            if pd.notna(inicio_real):
-                if isinstance(inicio_real, (datetime, pd.Timestamp)):
-                    inicio_real_dt = inicio_real.to_pydatetime() if isinstance(inicio_real, pd.Timestamp) else inicio_real
-                elif isinstance(inicio_real, str):
-                    inicio_real_dt = parse_datetime_string(inicio_real)
-                if inicio_real_dt and inicio_real_dt.tzinfo is not None:
-                    inicio_real_dt = inicio_real_dt.replace(tzinfo=None)
-            
-            # Verificar se deveria estar em execução
-            if inicio_planejado_dt and inicio_planejado_dt <= agora:
-                # Já passou do horário planejado de início
-                if status not in ["Em Execução", "Concluído", "Atrasado", "Adiantado"]:
-                    # Deveria estar em execução mas não está
-                    atividades_atrasadas.append({
-                        "CRQ": nome_crq,
-                        "Emoji": emoji,
-                        "Seq": seq,
-                        "Atividade": atividade,
-                        "Inicio_Planejado": inicio_planejado_dt,
-                        "Status": status
-                    })
-                elif status == "Em Execução" or status == "Adiantado":
-                    # Está em execução, verificar se está adiantada
-                    is_adiantada = False
-                    if inicio_real_dt and inicio_planejado_dt:
-                        if inicio_real_dt < inicio_planejado_dt:
-                            is_adiantada = True
-                    
-                    atividades_em_execucao.append({
-                        "CRQ": nome_crq,
-                        "Emoji": emoji,
-                        "Seq": seq,
-                        "Atividade": atividade,
-                        "Inicio_Planejado": inicio_planejado_dt,
-                        "Inicio_Real": inicio_real_dt,
-                        "Is_Adiantada": is_adiantada
-                    })
+    # Índice temporal por CRQ (construído uma vez por versão dos dados)
+    indice = build_execution_status_index(data_dict, data_version=data_version)
+    atividades_atrasadas = indice.overdue_to_start(agora)  # Deveriam estar em execução mas não estão
+    atividades_em_execucao = indice.running(agora)  # Estão em execução (com indicação de adiantamento)
     
     # Exibir atividades que deveriam estar em execução e não estão
     if atividades_atrasadas:
@@ -801,7 +771,7 @@ def render_activities_execution_status(data_dict, agora):
         
         # Agrupar por CRQ
         for sequencia_key, sequencia_info in SEQUENCIAS.items():
-            crq_atrasadas = [a for a in atividades_atrasadas if a["CRQ"] == sequencia_info["nome"]]
+            crq_atrasadas = atividades_atrasadas.get(sequencia_key, [])
             if crq_atrasadas:
                 emoji = sequencia_info["emoji"]
                 nome = sequencia_info["nome"]
@@ -822,7 +792,7 @@ def render_activities_execution_status(data_dict, agora):
         
         # Agrupar por CRQ
         for sequencia_key, sequencia_info in SEQUENCIAS.items():
-            crq_execucao = [a for a in atividades_em_execucao if a["CRQ"] == sequencia_info["nome"]]
+            crq_execucao = atividades_em_execucao.get(sequencia_key, [])
             if crq_execucao:
                 emoji = sequencia_info["emoji"]
                 nome = sequencia_info["nome"]
@@ -842,44 +812,56 @@ def render_activities_execution_status(data_dict, agora):
         st.info("ℹ️ Não há atividades em execução no momento.")
 
 
-def render_activities_tables(data_dict):
+@st.cache_data(show_spinner=False, max_entries=16)
+def _cached_statistics(data_version, _data_dict):
+    """
+    Estatísticas cacheadas pela versão dos dados
+    
+    Args:
+        data_version: Token de versão dos dados
+        _data_dict: Dicionário com dataframes (não entra no hash do cache)
+        
+    Returns:
+        dict: Estatísticas calculadas
+    """
+    return calculate_statistics(_data_dict)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _cached_activity_tables(data_version, _data_dict):
+    """
+    Dataframes das tabelas de detalhes cacheados pela versão dos dados
+    
+    Args:
+        data_version: Token de versão dos dados
+        _data_dict: Dicionário com dataframes (não entra no hash do cache)
+        
+    Returns:
+        tuple: (em execução, atrasadas, próximas)
+    """
+    exec_df = get_activities_by_status(_data_dict, "Em Execução", data_version=data_version)
+    delayed_df = get_delayed_activities(_data_dict, data_version=data_version)
+    next_df = get_next_activities(_data_dict, limit=10, data_version=data_version)
+    return exec_df, delayed_df, next_df
+
+
+def render_activities_tables(data_dict, data_version=None):
     """
     Renderiza tabelas de detalhes
     
     Args:
         data_dict: Dicionário com dataframes
+        data_version: Token de versão dos dados (opcional)
     """
-    import pandas as pd
+    if data_version is None:
+        data_version = get_data_version(data_dict)
     
-    # Função para garantir que colunas sensíveis sejam string
-    def ensure_string_columns(df):
-        """Garante que colunas sensíveis sejam string para evitar erros do PyArrow"""
-        if df is None or len(df) == 0:
-            return df
-        
-        def safe_str_convert(val):
-            if pd.isna(val) or val is None:
-                return ""
-            try:
-                if isinstance(val, (int, float)):
-                    return str(int(val)) if isinstance(val, float) and val.is_integer() else str(val)
-                return str(val)
-            except:
-                return ""
-        
-        for col in ["Telefone", "Grupo", "Localidade", "Executor", "Tempo", "Atividade"]:
-            if col in df.columns:
-                df[col] = df[col].apply(safe_str_convert)
-        
-        return df
+    exec_df, delayed_df, next_df = _cached_activity_tables(data_version, data_dict)
     
     st.subheader("📋 Tabelas de Detalhes")
     
     # Tabela 1: Atividades em Execução (segmentada por CRQ)
     st.markdown("#### ⏳ Atividades em Execução")
-    exec_df = get_activities_by_status(data_dict, "Em Execução")
-    exec_df = ensure_string_columns(exec_df)
-    
     if len(exec_df) > 0:
         # Agrupar por CRQ
         if "CRQ" in exec_df.columns:
@@ -908,9 +890,6 @@ def render_activities_tables(data_dict):
     
     # Tabela 2: Atividades Atrasadas (segmentada por CRQ)
     st.markdown("#### 🚨 Atividades Atrasadas")
-    delayed_df = get_delayed_activities(data_dict)
-    delayed_df = ensure_string_columns(delayed_df)
-    
     if len(delayed_df) > 0:
         from modules.calculations import format_delay
         delayed_display = delayed_df.copy()
@@ -953,9 +932,6 @@ def render_activities_tables(data_dict):
     
     # Tabela 3: Próximas Atividades (segmentada por CRQ)
     st.markdown("#### 📅 Próximas Atividades a Executar")
-    next_df = get_next_activities(data_dict, limit=10)
-    next_df = ensure_string_columns(next_df)
-    
     if len(next_df) > 0:
         # Agrupar por CRQ
         if "CRQ" in next_df.columns:
@@ -1027,8 +1003,11 @@ def render_full_dashboard(data_dict):
         st.warning("⚠️ Nenhum dado carregado. Por favor, carregue um arquivo Excel primeiro.")
         return
     
+    # Versão dos dados: chave dos caches de estatísticas, tabelas e gráficos
+    data_version = get_data_version(data_dict)
+    
     # Calcular estatísticas
-    stats = calculate_statistics(data_dict)
+    stats = _cached_statistics(data_version, data_dict)
     
     # Indicadores principais
     render_main_indicators(stats)
@@ -1036,7 +1015,7 @@ def render_full_dashboard(data_dict):
     st.divider()
     
     # Tabelas de detalhes
-    render_activities_tables(data_dict)
+    render_activities_tables(data_dict, data_version=data_version)
     
     # Status por CRQ
     render_sequence_status_cards(stats)
@@ -1044,4 +1023,4 @@ def render_full_dashboard(data_dict):
     st.divider()
     
     # Gráfico de Gantt (CRQs vs Horários)
-    render_gantt_chart(data_dict)
\ No newline at end of file
+    render_gantt_chart(data_dict, data_version=data_version)
\ No newline at end of file
@@ -0,0 +1,379 @@
+"""
+Módulo para cálculos vetorizados usados pelos gráficos do dashboard
+"""
+import numpy as np
+import pandas as pd
+from config import DATE_FORMAT
+from modules.data_cache import versioned_cache
+
+# Acima desta quantidade de pontos o burndown é agregado em intervalos fixos
+BURNDOWN_MAX_PONTOS = 500
+BURNDOWN_BUCKET_PADRAO = "1min"
+
+
+def to_datetime_series(values):
+    """
+    Converte uma série mista (strings DATE_FORMAT, datetime, Timestamp) para datetime64
+
+    Args:
+        values: Series com valores de data/hora
+
+    Returns:
+        Series: Série datetime64 sem timezone (NaT para valores inválidos)
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        resultado = values
+    else:
+        resultado = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+        is_str = values.map(lambda v: isinstance(v, str))
+        if is_str.any():
+            resultado[is_str] = pd.to_datetime(
+                values[is_str].str.strip(), format=DATE_FORMAT, errors="coerce"
+            )
+        outros = ~is_str & values.notna()
+        if outros.any():
+            convertidos = pd.to_datetime(values[outros], errors="coerce", utc=True)
+            resultado[outros] = convertidos.dt.tz_localize(None)
+
+    if getattr(resultado.dt, "tz", None) is not None:
+        resultado = resultado.dt.tz_localize(None)
+    return resultado
+
+
+def _non_milestone_mask(df):
+    """
+    Retorna máscara das linhas que não são milestones
+
+    Args:
+        df: DataFrame da CRQ
+
+    Returns:
+        Series: Máscara booleana
+    """
+    if "Is_Milestone" not in df.columns:
+        return pd.Series(True, index=df.index)
+    return df["Is_Milestone"].fillna(False) != True
+
+
+@versioned_cache(maxsize=32)
+def build_burndown_series(data_dict, crq_filtro=None, bucket=None):
+    """
+    Calcula a série do burndown (restantes e concluídas acumuladas ao longo do tempo)
+
+    Apenas atividades "Concluído" com Horario_Fim_Real válido reduzem o trabalho
+    restante. Os horários são ordenados com NumPy e acumulados com cumsum; com
+    bucket (ex: "1min") as conclusões são agrupadas em intervalos fixos.
+    O ponto "agora" não é incluído, para que o resultado possa ser cacheado.
+
+    Args:
+        data_dict: Dicionário com dataframes
+        crq_filtro: CRQ específico (None ou "Todas" para todas)
+        bucket: Frequência pandas para agrupar as conclusões (None para automático)
+
+    Returns:
+        dict: total, timestamps (datetime64), restantes e concluidas (arrays)
+    """
+    if crq_filtro in (None, "Todas"):
+        crqs = sorted(data_dict.keys())
+    else:
+        crqs = [crq_filtro] if crq_filtro in data_dict else []
+
+    total = 0
+    fins = []
+    for crq in crqs:
+        df = data_dict[crq]["dataframe"]
+        mask = _non_milestone_mask(df)
+        total += int(mask.sum())
+
+        if "Status" in df.columns and "Horario_Fim_Real" in df.columns:
+            fins.append(df.loc[mask & (df["Status"] == "Concluído"), "Horario_Fim_Real"])
+
+    if fins:
+        horarios = to_datetime_series(pd.concat(fins, ignore_index=True)).dropna()
+        horarios = np.sort(horarios.to_numpy(dtype="datetime64[ns]"))
+    else:
+        horarios = np.array([], dtype="datetime64[ns]")
+
+    if bucket is None and len(horarios) > BURNDOWN_MAX_PONTOS:
+        bucket = BURNDOWN_BUCKET_PADRAO
+
+    if len(horarios) == 0:
+        timestamps = horarios
+        concluidas = np.array([], dtype=np.int64)
+    elif bucket:
+        intervalos = pd.DatetimeIndex(horarios).floor(bucket).to_numpy()
+        timestamps, contagens = np.unique(intervalos, return_counts=True)
+        concluidas = np.cumsum(contagens)
+    else:
+        timestamps = horarios
+        concluidas = np.arange(1, len(horarios) + 1, dtype=np.int64)
+
+    if len(timestamps) > 0:
+        # Ponto inicial: todas as atividades pendentes no momento da primeira conclusão
+        timestamps = np.concatenate([timestamps[:1], timestamps])
+        concluidas = np.concatenate([[0], concluidas])
+
+    return {
+        "total": total,
+        "timestamps": timestamps,
+        "restantes": total - concluidas,
+        "concluidas": concluidas,
+        "bucket": bucket
+    }
+
+
+GANTT_COLUNAS_CRQ = [
+    "CRQ", "Inicio_Planejado", "Fim_Planejado", "Inicio_Real", "Fim_Real",
+    "Inicio_Execucao", "Fim_Execucao", "Tem_Adiantadas", "Fim_Adiantada"
+]
+
+
+@versioned_cache(maxsize=8)
+def build_activity_time_frame(data_dict):
+    """
+    Monta um único dataframe de atividades (sem milestones) com horários tipados
+
+    Args:
+        data_dict: Dicionário com dataframes
+
+    Returns:
+        DataFrame: CRQ, Seq, Atividade, Status e colunas datetime64
+                   Inicio_Planejado, Fim_Planejado, Inicio_Real, Fim_Real
+    """
+    partes = []
+    for sequencia, data in data_dict.items():
+        df = data["dataframe"]
+        df = df[_non_milestone_mask(df)]
+        if df.empty:
+            continue
+
+        def coluna(nome):
+            if nome in df.columns:
+                return df[nome].reset_index(drop=True)
+            return pd.Series([None] * len(df))
+
+        partes.append(pd.DataFrame({
+            "CRQ": sequencia,
+            "Seq": coluna("Seq"),
+            "Atividade": coluna("Atividade").fillna("").astype(str).str.strip(),
+            "Status": coluna("Status").fillna("").astype(str).str.strip(),
+            "Inicio_Planejado": to_datetime_series(coluna("Inicio")),
+            "Fim_Planejado": to_datetime_series(coluna("Fim")),
+            "Inicio_Real": to_datetime_series(coluna("Horario_Inicio_Real")),
+            "Fim_Real": to_datetime_series(coluna("Horario_Fim_Real"))
+        }))
+
+    if not partes:
+        return pd.DataFrame(columns=[
+            "CRQ", "Seq", "Atividade", "Status",
+            "Inicio_Planejado", "Fim_Planejado", "Inicio_Real", "Fim_Real"
+        ])
+
+    return pd.concat(partes, ignore_index=True)
+
+
+@versioned_cache(maxsize=8)
+def build_gantt_spans(data_dict, por_atividade=False):
+    """
+    Calcula os intervalos do gráfico de Gantt de forma vetorizada
+
+    Por CRQ (padrão): mínimo/máximo planejado e real via groupby, período das
+    atividades em execução e fim máximo das adiantadas. Atividades concluídas
+    ou atrasadas também estendem o fim real até o fim planejado.
+    Por atividade: uma linha por atividade com seus horários planejados e reais.
+
+    Args:
+        data_dict: Dicionário com dataframes
+        por_atividade: Se True, retorna uma linha por atividade
+
+    Returns:
+        DataFrame: Intervalos ordenados por CRQ (datetime64, NaT quando ausente)
+    """
+    base = build_activity_time_frame(data_dict)
+
+    if por_atividade:
+        spans = base[base[["Inicio_Planejado", "Fim_Planejado", "Inicio_Real", "Fim_Real"]].notna().any(axis=1)]
+        return spans.sort_values(["CRQ", "Inicio_Planejado", "Seq"], kind="stable").reset_index(drop=True)
+
+    if base.empty:
+        return pd.DataFrame(columns=GANTT_COLUNAS_CRQ)
+
+    status = base["Status"]
+    # Em execução: início real (ou planejado) até fim real (ou planejado)
+    inicio_ref = base["Inicio_Real"].fillna(base["Inicio_Planejado"])
+    fim_ref = base["Fim_Real"].fillna(base["Fim_Planejado"])
+    em_execucao = status.isin(["Em Execução", "Adiantado"]) & inicio_ref.notna()
+    concluida = status.isin(["Concluído", "Atrasado"]) | ((status == "Adiantado") & inicio_ref.isna())
+
+    aux = pd.DataFrame({
+        "CRQ": base["CRQ"],
+        "Inicio_Planejado": base["Inicio_Planejado"],
+        "Fim_Planejado": base["Fim_Planejado"],
+        "Inicio_Real": base["Inicio_Real"],
+        "Fim_Real": base["Fim_Real"],
+        "Fim_Referencia": base["Fim_Planejado"].where(concluida),
+        "Inicio_Execucao": inicio_ref.where(em_execucao),
+        "Fim_Execucao": fim_ref.where(em_execucao),
+        "Fim_Adiantada": base["Fim_Real"].where(status == "Adiantado")
+    })
+
+    spans = aux.groupby("CRQ", sort=True, observed=True).agg(
+        Inicio_Planejado=("Inicio_Planejado", "min"),
+        Fim_Planejado=("Fim_Planejado", "max"),
+        Inicio_Real=("Inicio_Real", "min"),
+        Fim_Real=("Fim_Real", "max"),
+        Fim_Referencia=("Fim_Referencia", "max"),
+        Inicio_Execucao=("Inicio_Execucao", "min"),
+        Fim_Execucao=("Fim_Execucao", "max"),
+        Fim_Adiantada=("Fim_Adiantada", "max")
+    ).reset_index()
+
+    spans["Fim_Real"] = spans[["Fim_Real", "Fim_Referencia"]].max(axis=1)
+    spans["Tem_Adiantadas"] = spans["Fim_Adiantada"].notna()
+
+    # Manter apenas CRQs com pelo menos uma data
+    tem_data = spans[["Inicio_Planejado", "Fim_Planejado", "Inicio_Real", "Fim_Real"]].notna().any(axis=1)
+    return spans.loc[tem_data, GANTT_COLUNAS_CRQ].reset_index(drop=True)
+
+
+STATUS_INICIADOS = ["Em Execução", "Concluído", "Atrasado", "Adiantado"]
+STATUS_EM_EXECUCAO = ["Em Execução", "Adiantado"]
+
+
+class ExecutionStatusIndex:
+    """
+    Índice temporal por CRQ para consultas de status de execução
+
+    Mantém, para cada CRQ, os inícios planejados ordenados (datetime64) das
+    atividades não iniciadas e das em execução. As consultas "deveria ter
+    iniciado até T" e "em execução (e adiantada)" usam busca binária e
+    retornam apenas o prefixo relevante: O(log n + k).
+    """
+
+    def __init__(self, base):
+        """
+        Constrói o índice a partir do dataframe de atividades tipado
+
+        Args:
+            base: DataFrame retornado por build_activity_time_frame
+        """
+        self._nao_iniciadas = {}
+        self._em_execucao = {}
+
+        base = base[base["Inicio_Planejado"].notna()]
+        for crq, grupo in base.groupby("CRQ", sort=True, observed=True):
+            nao_iniciadas = grupo[~grupo["Status"].isin(STATUS_INICIADOS)]
+            em_execucao = grupo[grupo["Status"].isin(STATUS_EM_EXECUCAO)]
+
+            self._nao_iniciadas[crq] = self._build_entries(nao_iniciadas)
+            self._em_execucao[crq] = self._build_entries(em_execucao)
+
+    @staticmethod
+    def _build_entries(df):
+        """
+        Ordena as atividades pelo início planejado e pré-monta os registros
+
+        Args:
+            df: DataFrame de atividades de um CRQ
+
+        Returns:
+            tuple: (inícios ordenados em datetime64[ns], lista de registros)
+        """
+        df = df.sort_values("Inicio_Planejado", kind="stable")
+        inicios = df["Inicio_Planejado"].to_numpy(dtype="datetime64[ns]")
+        adiantadas = (df["Inicio_Real"] < df["Inicio_Planejado"]).tolist()
+
+        registros = []
+        for seq, atividade, status, inicio_p, inicio_r, adiantada in zip(
+            df["Seq"].tolist(), df["Atividade"].tolist(), df["Status"].tolist(),
+            df["Inicio_Planejado"].tolist(), df["Inicio_Real"].tolist(), adiantadas
+        ):
+            registros.append({
+                "Seq": seq,
+                "Atividade": atividade,
+                "Status": status,
+                "Inicio_Planejado": inicio_p.to_pydatetime(),
+                "Inicio_Real": None if pd.isna(inicio_r) else inicio_r.to_pydatetime(),
+                "Is_Adiantada": bool(adiantada)
+            })
+
+        return inicios, registros
+
+    @staticmethod
+    def _prefix(entries, agora):
+        """
+        Retorna os registros com início planejado <= agora (busca binária)
+
+        Args:
+            entries: Tupla (inícios ordenados, registros)
+            agora: Data/hora de referência (sem timezone)
+
+        Returns:
+            list: Registros cujo início planejado já passou
+        """
+        inicios, registros = entries
+        k = int(np.searchsorted(inicios, np.datetime64(pd.Timestamp(agora), "ns"), side="right"))
+        return registros[:k]
+
+    def overdue_to_start(self, agora, crq=None):
+        """
+        Atividades cujo início planejado já passou e que ainda não foram iniciadas
+
+        Args:
+            agora: Data/hora de referência (sem timezone)
+            crq: CRQ específico (None para todas)
+
+        Returns:
+            dict: {crq: lista de registros} apenas com CRQs que têm resultados
+        """
+        return self._query(self._nao_iniciadas, agora, crq)
+
+    def running(self, agora, crq=None):
+        """
+        Atividades em execução cujo início planejado já passou (com flag Is_Adiantada)
+
+        Args:
+            agora: Data/hora de referência (sem timezone)
+            crq: CRQ específico (None para todas)
+
+        Returns:
+            dict: {crq: lista de registros} apenas com CRQs que têm resultados
+        """
+        return self._query(self._em_execucao, agora, crq)
+
+    def _query(self, particoes, agora, crq):
+        """
+        Aplica a consulta de prefixo nas partições de cada CRQ
+
+        Args:
+            particoes: Dicionário {crq: (inícios, registros)}
+            agora: Data/hora de referência (sem timezone)
+            crq: CRQ específico (None para todas)
+
+        Returns:
+            dict: {crq: lista de registros}
+        """
+        crqs = [crq] if crq is not None else list(particoes.keys())
+        resultado = {}
+        for chave in crqs:
+            if chave not in particoes:
+                continue
+            registros = self._prefix(particoes[chave], agora)
+            if registros:
+                resultado[chave] = registros
+        return resultado
+
+
+@versioned_cache(maxsize=8)
+def build_execution_status_index(data_dict):
+    """
+    Constrói (uma vez por versão dos dados) o índice temporal de execução
+
+    Args:
+        data_dict: Dicionário com dataframes
+
+    Returns:
+        ExecutionStatusIndex: Índice pronto para consultas por horário
+    """
+    return ExecutionStatusIndex(build_activity_time_frame(data_dict))
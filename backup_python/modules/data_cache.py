@@ -0,0 +1,108 @@
+"""
+Módulo para versionamento e cache de dados derivados
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+import pandas as pd
+
+
+def _hash_dataframe(df):
+    """
+    Calcula hash vetorizado do conteúdo de um dataframe
+
+    Args:
+        df: DataFrame a ser processado
+
+    Returns:
+        int: Hash do conteúdo (linhas e índice)
+    """
+    try:
+        return int(pd.util.hash_pandas_object(df, index=True).sum())
+    except TypeError:
+        # Células com objetos não hasheáveis (listas, dicts): usar representação em texto
+        return int(pd.util.hash_pandas_object(df.astype(str), index=True).sum())
+
+
+def get_data_version(data_dict):
+    """
+    Calcula um token de versão para o conjunto de dados carregado
+
+    O token muda sempre que qualquer valor, coluna ou CRQ dos dataframes muda,
+    permitindo reaproveitar resultados derivados entre renders.
+
+    Args:
+        data_dict: Dicionário com dataframes
+
+    Returns:
+        str: Token hexadecimal da versão dos dados
+    """
+    if not data_dict:
+        return "vazio"
+
+    digest = hashlib.sha1()
+    for sequencia in sorted(data_dict.keys()):
+        df = data_dict[sequencia].get("dataframe")
+        if df is None:
+            digest.update(f"{sequencia}|None;".encode("utf-8"))
+            continue
+        colunas = "|".join(str(col) for col in df.columns)
+        digest.update(f"{sequencia}|{colunas}|{len(df)}|{_hash_dataframe(df)};".encode("utf-8"))
+
+    return digest.hexdigest()
+
+
+def versioned_cache(maxsize=16):
+    """
+    Decorator que memoiza uma função de data_dict pela versão dos dados
+
+    A chave do cache é (versão dos dados, demais argumentos). A versão pode ser
+    informada via argumento nomeado data_version para evitar recalculá-la.
+    Os resultados são compartilhados entre chamadas e não devem ser alterados.
+
+    Args:
+        maxsize: Quantidade máxima de entradas mantidas (LRU)
+
+    Returns:
+        function: Decorator
+    """
+    def decorator(func):
+        cache = OrderedDict()
+        lock = threading.Lock()
+
+        @wraps(func)
+        def wrapper(data_dict, *args, data_version=None, **kwargs):
+            if data_version is None:
+                data_version = get_data_version(data_dict)
+            chave = (data_version, args, tuple(sorted(kwargs.items())))
+
+            try:
+                hash(chave)
+            except TypeError:
+                # Argumentos não hasheáveis: calcular sem cache
+                return func(data_dict, *args, **kwargs)
+
+            with lock:
+                if chave in cache:
+                    cache.move_to_end(chave)
+                    return cache[chave]
+
+            resultado = func(data_dict, *args, **kwargs)
+
+            with lock:
+                cache[chave] = resultado
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+
+            return resultado
+
+        def cache_clear():
+            with lock:
+                cache.clear()
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
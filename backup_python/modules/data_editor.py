@@ -140,22 +140,6 @@ def render_editor_tab(data_dict, crq_selecionado, db_manager, tab_name):
         if df is None or len(df) == 0:
             st.info("Nenhum dado disponível para este CRQ")
             return
-        
-        # Garantir que colunas sensíveis sejam string ANTES de qualquer processamento
-        # Isso evita erros do PyArrow mesmo que as colunas não sejam exibidas
-        def safe_str_convert(val):
-            if pd.isna(val) or val is None:
-                return ""
-            try:
-                if isinstance(val, (int, float)):
-                    return str(int(val)) if isinstance(val, float) and val.is_integer() else str(val)
-                return str(val)
-            except:
-                return ""
-        
-        for col in ["Telefone", "Grupo", "Localidade", "Executor", "Tempo", "Atividade"]:
-            if col in df.columns:
-                df[col] = df[col].apply(safe_str_convert)
     except Exception as e:
         st.error(f"❌ Erro ao preparar dataframe: {str(e)}")
         import traceback
@@ -195,23 +179,7 @@ def render_editor_tab(data_dict, crq_selecionado, db_manager, tab_name):
     # Preparar dataframe para exibição
     display_df = df_filtered.copy()
     
-    # Converter colunas que podem ter tipos mistos para string ANTES de selecionar colunas
-    # (para evitar erros do PyArrow)
-    def convert_to_string_safe(val):
-        if pd.isna(val) or val is None:
-            return ""
-        try:
-            # Se for numérico, converter para string
-            if isinstance(val, (int, float)):
-                return str(int(val)) if isinstance(val, float) and val.is_integer() else str(val)
-            return str(val)
-        except:
-            return ""
-    
-    # Converter colunas problemáticas para string
-    for col in ["Grupo", "Tempo", "Atividade", "Observacoes"]:
-        if col in display_df.columns:
-            display_df[col] = display_df[col].apply(convert_to_string_safe)
+    # Colunas de texto já chegam tipadas (apply_data_schema no carregamento)
     
     # Selecionar colunas para exibir (removendo colunas sensíveis: Executor, Localidade, Telefone)
     columns_to_show = [
@@ -598,17 +566,17 @@ def validate_and_save_activity(df_filtered, original_idx, seq, seq_crq, crq_sele
     
     # Salvar no banco de dados (FONTE ÚNICA DE VERDADE)
     # Usar excel_data_id para garantir que atualizamos apenas a linha correta
-    db_manager.save_activity_control(
-        seq=seq,
-        sequencia=seq_crq,
+    db_manager.get_activity_dao().upsert(
+        seq,
+        seq_crq,
+        excel_data_id if excel_data_id > 0 else None,
         status=new_status,
         horario_inicio_real=horario_inicio_real_final,
         horario_fim_real=horario_fim_real_final,
         atraso_minutos=atraso_minutos,
         observacoes=observacoes_final,
         is_milestone=is_milestone_final,
-        predecessoras=predecessoras_final,
-        excel_data_id=excel_data_id if excel_data_id > 0 else None
+        predecessoras=predecessoras_final
     )
     
     # IMPORTANTE: Após salvar no banco, atualizar st.session_state.data_dict
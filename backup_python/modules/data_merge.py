@@ -0,0 +1,102 @@
+"""
+Módulo para mesclagem dos dados do Excel com os dados de controle (sem dependência do Streamlit)
+"""
+import pandas as pd
+from modules.data_schema import apply_data_schema
+
+
+def merge_control_data(excel_data, control_data):
+    """
+    Mescla dados do Excel com dados de controle do banco
+    
+    Args:
+        excel_data: Dados carregados do Excel
+        control_data: Dados de controle do banco de dados
+        
+    Returns:
+        dict: Dados mesclados
+    """
+    merged_data = {}
+    
+    for sequencia, data in excel_data.items():
+        df = data["dataframe"].copy()
+        
+        # Adicionar colunas de controle
+        df["Status"] = "Planejado"
+        df["Horario_Inicio_Real"] = None
+        df["Horario_Fim_Real"] = None
+        df["Atraso_Minutos"] = 0
+        df["Observacoes"] = ""
+        df["Is_Milestone"] = False
+        df["Predecessoras"] = ""
+        
+        # Marcar como milestone linhas com Grupo vazio
+        if "Grupo" in df.columns:
+            for idx, row in df.iterrows():
+                grupo_value = row.get("Grupo")
+                # Verificar se Grupo está vazio (NaN), string vazia, ou contém apenas espaços
+                is_empty = (
+                    pd.isna(grupo_value) or 
+                    grupo_value == "" or 
+                    (isinstance(grupo_value, str) and grupo_value.strip() == "") or
+                    str(grupo_value).strip() == "nan"
+                )
+                if is_empty:
+                    df.at[idx, "Is_Milestone"] = True
+        
+        # Preencher com dados de controle existentes
+        for idx, row in df.iterrows():
+            seq = int(row["Seq"])
+            excel_data_id = row.get("Excel_Data_ID", 0) if "Excel_Data_ID" in row else 0
+            
+            # Tentar buscar usando excel_data_id primeiro (mais preciso)
+            if excel_data_id and excel_data_id != 0:
+                key = f"{seq}_{sequencia}_{excel_data_id}"
+            else:
+                key = f"{seq}_{sequencia}"
+            
+            # Se não encontrou com excel_data_id, tentar sem ele (compatibilidade)
+            if key not in control_data:
+                key = f"{seq}_{sequencia}"
+            
+            if key in control_data:
+                control = control_data[key]
+                df.at[idx, "Status"] = control.get("status", "Planejado")
+                df.at[idx, "Horario_Inicio_Real"] = control.get("horario_inicio_real")
+                df.at[idx, "Horario_Fim_Real"] = control.get("horario_fim_real")
+                df.at[idx, "Atraso_Minutos"] = control.get("atraso_minutos", 0)
+                df.at[idx, "Observacoes"] = control.get("observacoes", "")
+                # Se já existe milestone no banco, manter o valor do banco
+                # Caso contrário, usar o valor detectado do Excel
+                if control.get("is_milestone", False):
+                    df.at[idx, "Is_Milestone"] = True
+                # Se não está no banco mas foi detectado como milestone, manter True
+                # (já foi definido acima)
+                df.at[idx, "Predecessoras"] = control.get("predecessoras", "")
+        
+        # Aplicar esquema tipado uma única vez (evita tipos mistos do PyArrow)
+        df = apply_data_schema(df)
+        
+        merged_data[sequencia] = {
+            "dataframe": df,
+            "sheet_name": data["sheet_name"]
+        }
+    
+    return merged_data
+
+
+def load_merged_data(db_manager):
+    """
+    Carrega do banco os dados do Excel já mesclados com os dados de controle
+
+    Args:
+        db_manager: Instância de DatabaseManager
+
+    Returns:
+        dict: Dados mesclados por sequência, ou None se não houver dados salvos
+    """
+    saved_excel_data = db_manager.load_excel_data()
+    if not saved_excel_data:
+        return None
+    control_data = db_manager.get_all_activities_control()
+    return merge_control_data(saved_excel_data, control_data)
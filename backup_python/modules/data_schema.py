@@ -0,0 +1,105 @@
+"""
+Módulo com o esquema tipado dos dataframes em memória (data_dict)
+"""
+import pandas as pd
+from config import SEQUENCIAS, STATUS_OPCOES
+
+try:
+    import pyarrow  # noqa: F401
+    TEXT_DTYPE = "string[pyarrow]"
+except ImportError:
+    TEXT_DTYPE = "string"
+
+# Colunas de texto livre (sempre string, "" para vazio)
+TEXT_COLUMNS = [
+    "Atividade", "Grupo", "Localidade", "Executor", "Telefone",
+    "Observacoes", "Predecessoras"
+]
+
+# Categorias fixas: mantêm o mesmo dtype entre CRQs (concat preserva a categoria)
+STATUS_CATEGORIES = STATUS_OPCOES + ["Arquivado"]
+CRQ_CATEGORIES = list(SEQUENCIAS.keys())
+
+
+def safe_str_convert(val):
+    """
+    Converte qualquer valor para string (números inteiros sem ".0", vazio para nulos)
+
+    Args:
+        val: Valor a converter
+
+    Returns:
+        str: Valor convertido
+    """
+    if val is None or pd.isna(val):
+        return ""
+    try:
+        if isinstance(val, (int, float)):
+            return str(int(val)) if isinstance(val, float) and val.is_integer() else str(val)
+        return str(val)
+    except:
+        return ""
+
+
+def _as_category(series, base_categories):
+    """
+    Converte uma série para categórica com as categorias base mais as extras encontradas
+
+    Args:
+        series: Série a converter
+        base_categories: Categorias conhecidas (ordem preservada)
+
+    Returns:
+        Series: Série categórica
+    """
+    valores = series.astype(object).where(series.notna(), None)
+    extras = sorted({str(v) for v in valores.dropna().unique()} - set(base_categories))
+    return pd.Categorical(valores, categories=list(base_categories) + extras)
+
+
+def apply_data_schema(df):
+    """
+    Aplica o esquema tipado a um dataframe de CRQ (uma única vez, no carregamento)
+
+    - Seq: Int64 (nullable)
+    - Status e CRQ: categóricas
+    - Is_Milestone: bool
+    - Tempo: float32 (minutos)
+    - Colunas de texto: string (pyarrow quando disponível), "" para vazio
+
+    Horário real (Horario_Inicio_Real/Horario_Fim_Real) permanece como objeto
+    (string no formato DATE_FORMAT ou None), pois o código testa a veracidade do valor.
+
+    Args:
+        df: DataFrame a tipar
+
+    Returns:
+        DataFrame: Novo dataframe com os tipos do esquema
+    """
+    df = df.copy()
+
+    if "Seq" in df.columns:
+        df["Seq"] = pd.to_numeric(df["Seq"], errors='coerce').astype('Int64')
+
+    for col in TEXT_COLUMNS:
+        if col in df.columns:
+            if not isinstance(df[col].dtype, pd.StringDtype) or df[col].isna().any():
+                df[col] = df[col].map(safe_str_convert)
+            df[col] = df[col].astype(TEXT_DTYPE)
+
+    if "Status" in df.columns:
+        df["Status"] = _as_category(df["Status"].fillna("Planejado"), STATUS_CATEGORIES)
+
+    if "CRQ" in df.columns:
+        df["CRQ"] = _as_category(df["CRQ"], CRQ_CATEGORIES)
+
+    if "Is_Milestone" in df.columns:
+        df["Is_Milestone"] = df["Is_Milestone"].fillna(False).astype(bool)
+
+    if "Tempo" in df.columns:
+        if not pd.api.types.is_numeric_dtype(df["Tempo"]):
+            from modules.calculations import convert_time_series_to_minutes
+            df["Tempo"] = convert_time_series_to_minutes(df["Tempo"])
+        df["Tempo"] = pd.to_numeric(df["Tempo"], errors='coerce').fillna(0).astype('float32')
+
+    return df
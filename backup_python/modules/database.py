@@ -3,331 +3,335 @@ Módulo para gerenciamento do banco de dados SQLite
 """
 import sqlite3
 import os
+import threading
 from datetime import datetime
 from config import DB_PATH
+from modules.metrics import InstrumentedConnection
+
+
+class DataVersionWatcher:
+    """
+    Contador de alterações do banco via PRAGMA data_version
+
+    Uma conexão fica aberta só para observar o banco: o valor de
+    PRAGMA data_version muda sempre que outra conexão (de qualquer processo)
+    confirma uma alteração, sem ler nenhuma tabela.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or DB_PATH
+        self._conn = None
+        self._lock = threading.Lock()
+        # O valor só é comparável na mesma conexão: prefixo único por observador
+        self._prefixo = os.urandom(4).hex()
+
+    def version(self):
+        """
+        Retorna o token da versão atual dos dados
+
+        Returns:
+            str: Token que muda a cada alteração confirmada no banco
+        """
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                                             factory=InstrumentedConnection)
+            valor = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        return f"{self._prefixo}.{valor}"
+
+    def close(self):
+        """Fecha a conexão de observação"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
 
 
 class DatabaseManager:
     """Gerenciador do banco de dados SQLite"""
     
+    # Seq gerado para linhas do Excel sem Seq válido (999000 + posição)
+    SEQ_TEMPORARIO_BASE = 999000
+    
     def __init__(self):
         self.db_path = DB_PATH
         self.init_database()
     
     def get_connection(self):
-        """Retorna conexão com o banco de dados"""
-        return sqlite3.connect(self.db_path)
+        """Retorna conexão com o banco de dados (consultas contabilizadas em /metrics)"""
+        return sqlite3.connect(self.db_path, factory=InstrumentedConnection)
+    
+    # Versão atual do esquema (PRAGMA user_version); cada migração leva à versão seguinte
+    SCHEMA_VERSION = 3
+    
+    # Bancos já verificados neste processo (novas instâncias não repetem a verificação)
+    _initialized_paths = set()
+    _init_lock = threading.Lock()
+    
+    ACTIVITY_CONTROL_COLUMNS = """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        seq INTEGER,
+        sequencia TEXT,
+        excel_data_id INTEGER,
+        status TEXT DEFAULT 'Planejado',
+        horario_inicio_real TEXT,
+        horario_fim_real TEXT,
+        atraso_minutos INTEGER DEFAULT 0,
+        observacoes TEXT,
+        is_milestone INTEGER DEFAULT 0,
+        predecessoras TEXT,
+        arquivado INTEGER DEFAULT 0,
+        is_rollback INTEGER DEFAULT 0,
+        data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(seq, sequencia, excel_data_id)
+    """
+    
+    # IMPORTANTE: Não usar UNIQUE(sequencia, seq) porque pode haver múltiplas linhas
+    # com o mesmo Seq no mesmo CRQ no Excel. Cada linha do Excel deve ser única.
+    EXCEL_DATA_COLUMNS = """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sequencia TEXT,
+        seq INTEGER,
+        atividade TEXT,
+        grupo TEXT,
+        localidade TEXT,
+        executor TEXT,
+        telefone TEXT,
+        inicio TEXT,
+        fim TEXT,
+        tempo TEXT,
+        data_importacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    """
     
     def init_database(self):
-        """Inicializa o banco de dados e cria tabelas se não existirem"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Verificar se a tabela já existe e qual constraint ela tem
-        cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='activity_control'")
-        existing_table = cursor.fetchone()
-        
-        # Se a tabela existe e tem constraint antiga, vamos recriá-la
-        if existing_table:
-            old_sql = existing_table[0]
-            # Se tem constraint antiga sem excel_data_id, precisa recriar
-            if 'UNIQUE(seq, sequencia)' in old_sql and 'UNIQUE(seq, sequencia, excel_data_id)' not in old_sql:
-                print("AVISO: Tabela activity_control tem constraint antiga, será recriada na migração abaixo")
-        else:
-            # Tabela não existe, criar com constraint correta
-            cursor.execute("""
-                CREATE TABLE activity_control (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    seq INTEGER,
-                    sequencia TEXT,
-                    excel_data_id INTEGER,
-                    status TEXT DEFAULT 'Planejado',
-                    horario_inicio_real TEXT,
-                    horario_fim_real TEXT,
-                    atraso_minutos INTEGER DEFAULT 0,
-                    observacoes TEXT,
-                    is_milestone INTEGER DEFAULT 0,
-                    predecessoras TEXT,
-                    arquivado INTEGER DEFAULT 0,
-                    is_rollback INTEGER DEFAULT 0,
-                    data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(seq, sequencia, excel_data_id)
-                )
-            """)
-        
-        # Migração: Adicionar coluna excel_data_id se não existir
-        try:
-            cursor.execute("ALTER TABLE activity_control ADD COLUMN excel_data_id INTEGER")
-            # Para registros antigos, usar NULL (será tratado como 0 para compatibilidade)
-        except sqlite3.OperationalError:
-            pass  # Coluna já existe
-        
-        # Migração: Adicionar coluna arquivado se não existir
-        try:
-            cursor.execute("ALTER TABLE activity_control ADD COLUMN arquivado INTEGER DEFAULT 0")
-        except sqlite3.OperationalError:
-            pass  # Coluna já existe
+        """
+        Inicializa o banco de dados aplicando as migrações pendentes (PRAGMA user_version)
         
-        # Migração: Adicionar coluna is_rollback se não existir
-        try:
-            cursor.execute("ALTER TABLE activity_control ADD COLUMN is_rollback INTEGER DEFAULT 0")
-        except sqlite3.OperationalError:
-            pass  # Coluna já existe
+        Depois da primeira verificação no processo, novas instâncias não acessam o banco.
+        Cada migração roda uma única vez, dentro de uma transação.
+        """
+        if self.db_path in DatabaseManager._initialized_paths:
+            return
         
-        # Migração: Remover constraint UNIQUE antiga e criar nova com excel_data_id
-        try:
-            # SQLite não suporta DROP CONSTRAINT, então precisamos recriar a tabela
-            cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='activity_control'")
-            old_sql_result = cursor.fetchone()
+        with DatabaseManager._init_lock:
+            if self.db_path in DatabaseManager._initialized_paths:
+                return
             
-            # Verificar se precisa migrar
-            needs_migration = False
-            if old_sql_result:
-                old_sql = old_sql_result[0]
-                # Verificar se tem constraint antiga sem excel_data_id
-                has_old_constraint = 'UNIQUE(seq, sequencia)' in old_sql and 'UNIQUE(seq, sequencia, excel_data_id)' not in old_sql
-                # Se tem UNIQUE mas não tem excel_data_id na constraint, precisa migrar
-                if has_old_constraint:
-                    needs_migration = True
-                    print(f"DEBUG: Detectada constraint antiga: {old_sql[:200]}")
+            conn = self.get_connection()
+            conn.isolation_level = None  # Transações controladas explicitamente
+            try:
+                versao = conn.execute("PRAGMA user_version").fetchone()[0]
+                
+                for destino in range(versao + 1, self.SCHEMA_VERSION + 1):
+                    migracao = getattr(self, f"_migration_{destino:03d}")
+                    conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        migracao(conn.cursor())
+                        conn.execute(f"PRAGMA user_version = {destino}")
+                        conn.execute("COMMIT")
+                    except Exception:
+                        conn.execute("ROLLBACK")
+                        raise
+                    print(f"DEBUG: Esquema do banco migrado para a versão {destino}")
+            finally:
+                conn.close()
             
-            # Verificar também se a coluna excel_data_id existe mas não está na constraint
-            if not needs_migration:
-                try:
-                    cursor.execute("PRAGMA table_info(activity_control)")
-                    columns = cursor.fetchall()
-                    has_excel_data_id_col = any(col[1] == 'excel_data_id' for col in columns)
-                    if has_excel_data_id_col and old_sql_result:
-                        old_sql = old_sql_result[0]
-                        # Se tem a coluna mas não está na constraint UNIQUE, precisa migrar
-                        if 'UNIQUE(seq, sequencia, excel_data_id)' not in old_sql:
-                            needs_migration = True
-                            print("DEBUG: Coluna excel_data_id existe mas não está na constraint UNIQUE")
-                except:
-                    pass
+            DatabaseManager._initialized_paths.add(self.db_path)
+    
+    def _table_sql(self, cursor, table):
+        """Retorna o CREATE TABLE de uma tabela (ou None se não existir)"""
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    
+    def _migration_001(self, cursor):
+        """
+        Esquema base: activity_control e excel_data
+        
+        Também converte bancos criados antes do versionamento (user_version 0):
+        adiciona colunas que faltam e recria activity_control sem a constraint
+        antiga UNIQUE(seq, sequencia) e excel_data sem UNIQUE(sequencia, seq).
+        """
+        control_sql = self._table_sql(cursor, "activity_control")
+        
+        if control_sql is None:
+            cursor.execute(f"CREATE TABLE activity_control ({self.ACTIVITY_CONTROL_COLUMNS})")
+        else:
+            # Colunas adicionadas ao longo do tempo
+            cursor.execute("PRAGMA table_info(activity_control)")
+            colunas = {col[1] for col in cursor.fetchall()}
+            for coluna, tipo in [("excel_data_id", "INTEGER"), ("arquivado", "INTEGER DEFAULT 0"),
+                                 ("is_rollback", "INTEGER DEFAULT 0"), ("is_milestone", "INTEGER DEFAULT 0"),
+                                 ("predecessoras", "TEXT")]:
+                if coluna not in colunas:
+                    cursor.execute(f"ALTER TABLE activity_control ADD COLUMN {coluna} {tipo}")
             
-            if needs_migration:
-                # Tabela antiga precisa ser migrada
+            # Constraint antiga sem excel_data_id: recriar a tabela (SQLite não suporta DROP CONSTRAINT)
+            if 'UNIQUE(seq, sequencia, excel_data_id)' not in control_sql:
                 print("AVISO: Migrando tabela activity_control para suportar excel_data_id")
-                
-                # Verificar se a tabela tem dados
-                cursor.execute("SELECT COUNT(*) FROM activity_control")
-                has_data = cursor.fetchone()[0] > 0
-                
-                if has_data:
-                    # Criar tabela nova
-                    cursor.execute("""
-                        CREATE TABLE activity_control_new (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            seq INTEGER,
-                            sequencia TEXT,
-                            excel_data_id INTEGER,
-                            status TEXT DEFAULT 'Planejado',
-                            horario_inicio_real TEXT,
-                            horario_fim_real TEXT,
-                            atraso_minutos INTEGER DEFAULT 0,
-                            observacoes TEXT,
-                            is_milestone INTEGER DEFAULT 0,
-                            predecessoras TEXT,
-                            data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            UNIQUE(seq, sequencia, excel_data_id)
-                        )
-                    """)
-                    
-                    # Copiar dados existentes (usar NULL para excel_data_id de registros antigos)
-                    cursor.execute("""
-                        INSERT INTO activity_control_new 
-                        (id, seq, sequencia, excel_data_id, status, horario_inicio_real, 
-                         horario_fim_real, atraso_minutos, observacoes, is_milestone, 
-                         predecessoras, data_criacao, data_atualizacao)
-                        SELECT id, seq, sequencia, 
-                               COALESCE(excel_data_id, 0) as excel_data_id,
-                               status, horario_inicio_real, 
-                               horario_fim_real, atraso_minutos, observacoes, is_milestone, 
-                               predecessoras, data_criacao, data_atualizacao
-                        FROM activity_control
-                    """)
-                    
-                    # Remover tabela antiga e renomear nova
-                    cursor.execute("DROP TABLE activity_control")
-                    cursor.execute("ALTER TABLE activity_control_new RENAME TO activity_control")
-                else:
-                    # Sem dados, apenas recriar a tabela
-                    cursor.execute("DROP TABLE activity_control")
-                    cursor.execute("""
-                        CREATE TABLE activity_control (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            seq INTEGER,
-                            sequencia TEXT,
-                            excel_data_id INTEGER,
-                            status TEXT DEFAULT 'Planejado',
-                            horario_inicio_real TEXT,
-                            horario_fim_real TEXT,
-                            atraso_minutos INTEGER DEFAULT 0,
-                            observacoes TEXT,
-                            is_milestone INTEGER DEFAULT 0,
-                            predecessoras TEXT,
-                            data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            UNIQUE(seq, sequencia, excel_data_id)
-                        )
-                    """)
-                
-                # Recriar índices
+                cursor.execute(f"CREATE TABLE activity_control_new ({self.ACTIVITY_CONTROL_COLUMNS})")
                 cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_seq_sequencia 
-                    ON activity_control(seq, sequencia)
+                    INSERT INTO activity_control_new 
+                    (id, seq, sequencia, excel_data_id, status, horario_inicio_real, 
+                     horario_fim_real, atraso_minutos, observacoes, is_milestone, 
+                     predecessoras, arquivado, is_rollback, data_criacao, data_atualizacao)
+                    SELECT id, seq, sequencia, 
+                           COALESCE(excel_data_id, 0) as excel_data_id,
+                           status, horario_inicio_real, 
+                           horario_fim_real, atraso_minutos, observacoes, is_milestone, 
+                           predecessoras, COALESCE(arquivado, 0), COALESCE(is_rollback, 0),
+                           data_criacao, data_atualizacao
+                    FROM activity_control
                 """)
-                cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_excel_data_id 
-                    ON activity_control(excel_data_id)
-                """)
-                
-                conn.commit()
-                print("AVISO: Migração concluída com sucesso")
-            else:
-                # Tabela já tem constraint correta, não precisa migrar
-                print("DEBUG: Tabela activity_control já tem constraint correta")
-        except Exception as e:
-            print(f"AVISO: Erro na migração (pode ser ignorado se tabela já está correta): {e}")
-            import traceback
-            print(traceback.format_exc())
-        
-        # Adicionar novas colunas se a tabela já existir (migração)
-        try:
-            cursor.execute("ALTER TABLE activity_control ADD COLUMN is_milestone INTEGER DEFAULT 0")
-        except sqlite3.OperationalError:
-            pass  # Coluna já existe
+                cursor.execute("DROP TABLE activity_control")
+                cursor.execute("ALTER TABLE activity_control_new RENAME TO activity_control")
         
-        try:
-            cursor.execute("ALTER TABLE activity_control ADD COLUMN predecessoras TEXT")
-        except sqlite3.OperationalError:
-            pass  # Coluna já existe
-        
-        # Criar índices para melhor performance
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_seq_sequencia 
-            ON activity_control(seq, sequencia)
-        """)
-        
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_excel_data_id 
-            ON activity_control(excel_data_id)
-        """)
-        
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_status 
-            ON activity_control(status)
-        """)
+        excel_sql = self._table_sql(cursor, "excel_data")
         
+        if excel_sql is None:
+            cursor.execute(f"CREATE TABLE excel_data ({self.EXCEL_DATA_COLUMNS})")
+        elif 'UNIQUE(sequencia, seq)' in excel_sql:
+            print("AVISO: Removendo constraint UNIQUE da tabela excel_data (migração)")
+            cursor.execute(f"CREATE TABLE excel_data_new ({self.EXCEL_DATA_COLUMNS})")
+            cursor.execute("""
+                INSERT INTO excel_data_new 
+                (id, sequencia, seq, atividade, grupo, localidade, executor,
+                 telefone, inicio, fim, tempo, data_importacao)
+                SELECT id, sequencia, seq, atividade, grupo, localidade, executor,
+                       telefone, inicio, fim, tempo, data_importacao
+                FROM excel_data
+            """)
+            cursor.execute("DROP TABLE excel_data")
+            cursor.execute("ALTER TABLE excel_data_new RENAME TO excel_data")
+    
+    def _migration_002(self, cursor):
+        """Tabela de jobs de upload (processamento em segundo plano da API)"""
         cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_sequencia 
-            ON activity_control(sequencia)
+            CREATE TABLE IF NOT EXISTS upload_jobs (
+                id TEXT PRIMARY KEY,
+                filename TEXT,
+                status TEXT DEFAULT 'queued',
+                etapa TEXT,
+                total_rows INTEGER DEFAULT 0,
+                total_saved INTEGER DEFAULT 0,
+                control_created INTEGER DEFAULT 0,
+                sequencias TEXT,
+                erro TEXT,
+                data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
         """)
+    
+    def _migration_003(self, cursor):
+        """Índices ajustados às consultas reais (substitui os índices antigos redundantes)"""
+        self._migrate_indexes(cursor)
+    
+    # Índices antigos: redundantes com o índice da constraint UNIQUE(seq, sequencia, excel_data_id)
+    # ou sem nenhuma consulta que os use (apenas custo em cada INSERT/UPDATE)
+    OBSOLETE_INDEXES = [
+        "idx_seq_sequencia", "idx_excel_data_id", "idx_status", "idx_sequencia", "idx_seq",
+        "idx_is_milestone", "idx_status_sequencia", "idx_excel_sequencia", "idx_excel_seq_sequencia"
+    ]
+    
+    # Buscas por (seq, sequencia[, excel_data_id]) já usam o índice da constraint UNIQUE
+    INDEXES = {
+        # Listagens e exportação ORDER BY sequencia, seq
+        "idx_control_sequencia_seq": "ON activity_control(sequencia, seq)",
+        # Arquivamento da execução: WHERE sequencia = ? AND arquivado = 0 AND is_rollback ...
+        "idx_control_ativas_sequencia": "ON activity_control(sequencia, is_rollback) WHERE arquivado = 0",
+        # Ativação do rollback: WHERE sequencia = ? AND is_rollback = 1
+        "idx_control_rollback_sequencia": "ON activity_control(sequencia) WHERE is_rollback = 1",
+        # excel_data: buscas por (seq, sequencia) retornando id/fim e ORDER BY sequencia, seq
+        "idx_excel_sequencia_seq_fim": "ON excel_data(sequencia, seq, fim)",
+    }
+    
+    # Formatos das consultas mais frequentes (usados no relatório de EXPLAIN QUERY PLAN)
+    QUERY_SHAPES = {
+        "controle por linha": (
+            "SELECT status FROM activity_control WHERE seq = ? AND sequencia = ? AND excel_data_id = ?",
+            (1, "REDE", 1)),
+        "controle por seq": (
+            "SELECT status FROM activity_control WHERE seq = ? AND sequencia = ? LIMIT 1",
+            (1, "REDE")),
+        "arquivar execução": (
+            "UPDATE activity_control SET arquivado = 1 "
+            "WHERE sequencia = ? AND (is_rollback = 0 OR is_rollback IS NULL) AND arquivado = 0",
+            ("REDE",)),
+        "ativar rollback": (
+            "UPDATE activity_control SET arquivado = 0 WHERE sequencia = ? AND is_rollback = 1",
+            ("REDE",)),
+        "exportar controle": (
+            "SELECT * FROM activity_control ORDER BY sequencia, seq", ()),
+        "carregar excel": (
+            "SELECT * FROM excel_data ORDER BY sequencia, seq", ()),
+        "fim da linha do excel": (
+            "SELECT fim FROM excel_data WHERE seq = ? AND sequencia = ?", (1, "REDE")),
+        "criar controles faltantes": (
+            "SELECT e.seq, e.sequencia, MIN(e.id) FROM excel_data e "
+            "WHERE e.seq IS NOT NULL GROUP BY e.sequencia, e.seq", ()),
+    }
+    
+    def explain_query_plans(self, cursor=None):
+        """
+        Retorna o EXPLAIN QUERY PLAN das consultas mais frequentes
         
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_seq 
-            ON activity_control(seq)
-        """)
+        Args:
+            cursor: Cursor a usar (opcional, abre uma conexão se não informado)
+            
+        Returns:
+            dict: {nome da consulta: plano em texto}
+        """
+        conn = None
+        if cursor is None:
+            conn = self.get_connection()
+            cursor = conn.cursor()
         
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_is_milestone 
-            ON activity_control(is_milestone)
-        """)
+        planos = {}
+        for nome, (sql, params) in self.QUERY_SHAPES.items():
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            planos[nome] = " | ".join(row[3] for row in cursor.fetchall())
         
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_status_sequencia 
-            ON activity_control(status, sequencia)
-        """)
+        if conn is not None:
+            conn.close()
+        return planos
+    
+    def _migrate_indexes(self, cursor):
+        """
+        Troca os índices antigos pelos índices ajustados às consultas (idempotente)
+        Quando índices antigos são removidos, imprime o EXPLAIN QUERY PLAN antes e depois
         
-        # Criar tabela para persistir dados base do Excel
-        # IMPORTANTE: Não usar UNIQUE(sequencia, seq) porque pode haver múltiplas linhas
-        # com o mesmo Seq no mesmo CRQ no Excel. Cada linha do Excel deve ser única.
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS excel_data (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                sequencia TEXT,
-                seq INTEGER,
-                atividade TEXT,
-                grupo TEXT,
-                localidade TEXT,
-                executor TEXT,
-                telefone TEXT,
-                inicio TEXT,
-                fim TEXT,
-                tempo TEXT,
-                data_importacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        Args:
+            cursor: Cursor da conexão em uso no init_database
+        """
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        existentes = {row[0] for row in cursor.fetchall()}
+        remover = [nome for nome in self.OBSOLETE_INDEXES if nome in existentes]
+        criar = [nome for nome in self.INDEXES if nome not in existentes]
         
-        # Remover constraint UNIQUE se existir (migração)
-        try:
-            cursor.execute("""
-                CREATE UNIQUE INDEX IF NOT EXISTS temp_idx ON excel_data(sequencia, seq)
-            """)
-            cursor.execute("DROP INDEX IF EXISTS temp_idx")
-        except:
-            pass
+        if not remover and not criar:
+            return
         
-        # Criar índices para excel_data (sem UNIQUE, permitir duplicatas de Seq no mesmo CRQ)
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_excel_sequencia 
-            ON excel_data(sequencia)
-        """)
+        antes = self.explain_query_plans(cursor)
         
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_excel_seq_sequencia 
-            ON excel_data(seq, sequencia)
-        """)
+        for nome in remover:
+            cursor.execute(f"DROP INDEX IF EXISTS {nome}")
+        for nome in criar:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {nome} {self.INDEXES[nome]}")
         
-        # Migração: Remover constraint UNIQUE se existir em tabelas antigas
-        # SQLite não suporta DROP CONSTRAINT diretamente, então precisamos recriar a tabela
-        try:
-            cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='excel_data'")
-            old_sql = cursor.fetchone()
-            if old_sql and 'UNIQUE(sequencia, seq)' in old_sql[0]:
-                # Tabela antiga tem UNIQUE, precisa recriar
-                print("AVISO: Removendo constraint UNIQUE da tabela excel_data (migração)")
-                cursor.execute("""
-                    CREATE TABLE excel_data_new (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        sequencia TEXT,
-                        seq INTEGER,
-                        atividade TEXT,
-                        grupo TEXT,
-                        localidade TEXT,
-                        executor TEXT,
-                        telefone TEXT,
-                        inicio TEXT,
-                        fim TEXT,
-                        tempo TEXT,
-                        data_importacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                cursor.execute("""
-                    INSERT INTO excel_data_new 
-                    SELECT * FROM excel_data
-                """)
-                cursor.execute("DROP TABLE excel_data")
-                cursor.execute("ALTER TABLE excel_data_new RENAME TO excel_data")
-                
-                # Recriar índices
-                cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_excel_sequencia 
-                    ON excel_data(sequencia)
-                """)
-                cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_excel_seq_sequencia 
-                    ON excel_data(seq, sequencia)
-                """)
-        except Exception as e:
-            # Se der erro na migração, continuar (pode ser que a tabela já esteja correta)
-            print(f"AVISO: Erro na migração (pode ser ignorado se tabela já está correta): {e}")
+        depois = self.explain_query_plans(cursor)
         
-        conn.commit()
-        conn.close()
+        print(f"DEBUG: Índices removidos: {remover or '-'}; criados: {criar or '-'}")
+        if not remover:
+            return  # Banco novo: nada a comparar
+        for nome in self.QUERY_SHAPES:
+            if antes[nome] != depois[nome]:
+                print(f"DEBUG: Plano '{nome}': {antes[nome]}  ->  {depois[nome]}")
+    
+    def get_activity_dao(self):
+        """Retorna o DAO de activity_control deste banco (comandos preparados)"""
+        from modules.activity_dao import get_activity_dao
+        return get_activity_dao(self.db_path)
     
     def get_activity_control(self, seq, sequencia, excel_data_id=None):
         """
@@ -338,42 +342,7 @@ class DatabaseManager:
             sequencia: Sequência/CRQ
             excel_data_id: ID da linha no excel_data (opcional, para identificar linha única)
         """
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        if excel_data_id is not None:
-            # Buscar por excel_data_id (mais preciso quando há duplicatas)
-            cursor.execute("""
-                SELECT status, horario_inicio_real, horario_fim_real, 
-                       atraso_minutos, observacoes, is_milestone, predecessoras
-                FROM activity_control
-                WHERE seq = ? AND sequencia = ? AND excel_data_id = ?
-            """, (seq, sequencia, excel_data_id))
-        else:
-            # Buscar apenas por seq e sequencia (compatibilidade com código antigo)
-            # Se houver múltiplas linhas, retorna a primeira
-            cursor.execute("""
-                SELECT status, horario_inicio_real, horario_fim_real, 
-                       atraso_minutos, observacoes, is_milestone, predecessoras
-                FROM activity_control
-                WHERE seq = ? AND sequencia = ?
-                LIMIT 1
-            """, (seq, sequencia))
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            return {
-                "status": result[0],
-                "horario_inicio_real": result[1],
-                "horario_fim_real": result[2],
-                "atraso_minutos": result[3],
-                "observacoes": result[4],
-                "is_milestone": bool(result[5]) if result[5] is not None else False,
-                "predecessoras": result[6] if result[6] else ""
-            }
-        return None
+        return self.get_activity_dao().get(seq, sequencia, excel_data_id)
     
     def save_activity_control(self, seq, sequencia, status=None, 
                              horario_inicio_real=None, horario_fim_real=None,
@@ -381,6 +350,7 @@ class DatabaseManager:
                              is_milestone=None, predecessoras=None, excel_data_id=None):
         """
         Salva ou atualiza dados de controle de uma atividade
+        Campos None mantêm o valor atual (upsert único via ActivityDAO)
         
         Args:
             seq: Número sequencial
@@ -388,71 +358,16 @@ class DatabaseManager:
             excel_data_id: ID da linha no excel_data (opcional, para identificar linha única)
             ... outros parâmetros ...
         """
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Normalizar excel_data_id: None vira 0, mas manter 0 se fornecido explicitamente
-        if excel_data_id is None:
-            excel_data_id = 0
-        
-        # Verificar se já existe (sempre usar excel_data_id na busca, mesmo se for 0)
-        existing = self.get_activity_control(seq, sequencia, excel_data_id)
-        
-        if existing:
-            # Atualizar
-            updates = []
-            params = []
-            
-            if status is not None:
-                updates.append("status = ?")
-                params.append(status)
-            if horario_inicio_real is not None:
-                updates.append("horario_inicio_real = ?")
-                params.append(horario_inicio_real)
-            if horario_fim_real is not None:
-                updates.append("horario_fim_real = ?")
-                params.append(horario_fim_real)
-            if atraso_minutos is not None:
-                updates.append("atraso_minutos = ?")
-                params.append(atraso_minutos)
-            if observacoes is not None:
-                updates.append("observacoes = ?")
-                params.append(observacoes)
-            if is_milestone is not None:
-                updates.append("is_milestone = ?")
-                params.append(1 if is_milestone else 0)
-            if predecessoras is not None:
-                updates.append("predecessoras = ?")
-                params.append(predecessoras)
-            
-            updates.append("data_atualizacao = ?")
-            params.append(datetime.now().isoformat())
-            
-            # Sempre usar excel_data_id na cláusula WHERE (mesmo se for 0)
-            params.extend([seq, sequencia, excel_data_id])
-            cursor.execute(f"""
-                UPDATE activity_control
-                SET {', '.join(updates)}
-                WHERE seq = ? AND sequencia = ? AND excel_data_id = ?
-            """, params)
-        else:
-            # Inserir novo - sempre usar excel_data_id (mesmo se for 0)
-            cursor.execute("""
-                INSERT INTO activity_control 
-                (seq, sequencia, excel_data_id, status, horario_inicio_real, horario_fim_real, 
-                 atraso_minutos, observacoes, is_milestone, predecessoras)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (seq, sequencia, excel_data_id,
-                  status or "Planejado",
-                  horario_inicio_real,
-                  horario_fim_real,
-                  atraso_minutos or 0,
-                  observacoes,
-                  1 if is_milestone else 0,
-                  predecessoras or ""))
-        
-        conn.commit()
-        conn.close()
+        self.get_activity_dao().upsert(
+            seq, sequencia, excel_data_id,
+            status=status,
+            horario_inicio_real=horario_inicio_real,
+            horario_fim_real=horario_fim_real,
+            atraso_minutos=atraso_minutos,
+            observacoes=observacoes,
+            is_milestone=is_milestone,
+            predecessoras=predecessoras
+        )
     
     def get_all_activities_control(self):
         """Retorna todos os dados de controle"""
@@ -492,6 +407,264 @@ class DatabaseManager:
         
         return activities
     
+    # Grupo vazio (ou valor nulo gravado como texto) indica milestone
+    _SQL_GRUPO_VAZIO = "TRIM(COALESCE(e.grupo, '')) IN ('', 'nan', 'None', '<NA>')"
+    
+    def create_missing_controls(self, por_linha=False):
+        """
+        Cria em lote os registros de controle das linhas de excel_data que ainda não têm controle
+        
+        Tudo é feito com um único INSERT ... SELECT ... WHERE NOT EXISTS, em uma
+        transação, com a detecção de milestone (Grupo vazio) feita no próprio SQL.
+        
+        Args:
+            por_linha: Se True, cria um controle por linha do Excel (excel_data_id = id da linha)
+                       e herda milestone de um controle antigo sem excel_data_id.
+                       Se False, cria um controle por (sequencia, seq) com excel_data_id 0,
+                       ignorando linhas sem Seq original (Seq temporário).
+            
+        Returns:
+            int: Quantidade de controles criados
+        """
+        agora = datetime.now().isoformat()
+        
+        if por_linha:
+            sql = f"""
+                INSERT INTO activity_control
+                (seq, sequencia, excel_data_id, status, is_milestone, predecessoras, data_atualizacao)
+                SELECT e.seq, e.sequencia, e.id, 'Planejado',
+                       CASE WHEN {self._SQL_GRUPO_VAZIO} OR EXISTS (
+                           SELECT 1 FROM activity_control m
+                           WHERE m.seq = e.seq AND m.sequencia = e.sequencia
+                             AND COALESCE(m.excel_data_id, 0) = 0 AND m.is_milestone = 1
+                       ) THEN 1 ELSE 0 END,
+                       '', ?
+                FROM excel_data e
+                WHERE e.seq IS NOT NULL
+                  AND NOT EXISTS (
+                      SELECT 1 FROM activity_control c
+                      WHERE c.seq = e.seq AND c.sequencia = e.sequencia AND c.excel_data_id = e.id
+                  )
+            """
+            params = (agora,)
+        else:
+            # Primeira linha de cada (sequencia, seq) define o milestone (MIN(id))
+            sql = f"""
+                INSERT INTO activity_control
+                (seq, sequencia, excel_data_id, status, is_milestone, predecessoras, data_atualizacao)
+                SELECT seq, sequencia, 0, 'Planejado', is_milestone, '', ?
+                FROM (
+                    SELECT e.seq AS seq, e.sequencia AS sequencia, MIN(e.id),
+                           CASE WHEN {self._SQL_GRUPO_VAZIO} THEN 1 ELSE 0 END AS is_milestone
+                    FROM excel_data e
+                    WHERE e.seq IS NOT NULL AND e.seq < ?
+                    GROUP BY e.sequencia, e.seq
+                ) AS novas
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM activity_control c
+                    WHERE c.seq = novas.seq AND c.sequencia = novas.sequencia
+                )
+            """
+            params = (agora, self.SEQ_TEMPORARIO_BASE)
+        
+        conn = self.get_connection()
+        try:
+            with conn:
+                cursor = conn.execute(sql, params)
+                return cursor.rowcount
+        finally:
+            conn.close()
+    
+    # Campos disponíveis em list_activities (controle por linha com fallback para o controle antigo sem excel_data_id)
+    ACTIVITY_LIST_FIELDS = {
+        "excel_data_id": "e.id",
+        "sequencia": "e.sequencia",
+        "seq": "e.seq",
+        "atividade": "e.atividade",
+        "grupo": "e.grupo",
+        "localidade": "e.localidade",
+        "executor": "e.executor",
+        "telefone": "e.telefone",
+        "inicio": "e.inicio",
+        "fim": "e.fim",
+        "tempo": "e.tempo",
+        "status": "COALESCE(c.status, c0.status, 'Planejado')",
+        "horario_inicio_real": "COALESCE(c.horario_inicio_real, c0.horario_inicio_real)",
+        "horario_fim_real": "COALESCE(c.horario_fim_real, c0.horario_fim_real)",
+        "atraso_minutos": "COALESCE(c.atraso_minutos, c0.atraso_minutos, 0)",
+        "observacoes": "COALESCE(c.observacoes, c0.observacoes)",
+        "is_milestone": f"CASE WHEN COALESCE(c.is_milestone, c0.is_milestone, 0) = 1 OR {_SQL_GRUPO_VAZIO} THEN 1 ELSE 0 END",
+        "predecessoras": "COALESCE(c.predecessoras, c0.predecessoras, '')",
+        "is_rollback": "COALESCE(c.is_rollback, c0.is_rollback, 0)",
+        "arquivado": "COALESCE(c.arquivado, c0.arquivado, 0)",
+        "data_atualizacao": "COALESCE(c.data_atualizacao, c0.data_atualizacao)",
+    }
+    
+    _BOOLEAN_LIST_FIELDS = ("is_milestone", "is_rollback", "arquivado")
+    
+    def list_activities(self, sequencia=None, status=None, is_milestone=None, is_rollback=None,
+                        arquivado=None, q=None, fields=None, after=None, limit=100):
+        """
+        Lista atividades (excel_data + controle) com filtros e paginação por chave
+        
+        A ordem é (sequencia, seq, id) e a página seguinte começa após a última
+        chave retornada, sem OFFSET: o custo de cada página não depende da posição.
+        Filtros e busca são aplicados no SQL; apenas os campos pedidos são lidos.
+        
+        Args:
+            sequencia: Filtrar por CRQ
+            status: Lista de status aceitos
+            is_milestone: Filtrar milestones (True/False)
+            is_rollback: Filtrar atividades de rollback (True/False)
+            arquivado: Filtrar arquivadas (True/False)
+            q: Texto procurado em atividade (sem diferenciar maiúsculas)
+            fields: Lista de campos a retornar (padrão: todos de ACTIVITY_LIST_FIELDS)
+            after: Chave (sequencia, seq, excel_data_id) da última linha da página anterior
+            limit: Tamanho da página
+            
+        Returns:
+            tuple: (lista de dicts, chave da próxima página ou None)
+        """
+        fields = list(fields or self.ACTIVITY_LIST_FIELDS.keys())
+        colunas = [f"{self.ACTIVITY_LIST_FIELDS[campo]} AS {campo}" for campo in fields]
+        # Chave da paginação sempre lida (não é devolvida se não foi pedida)
+        colunas += ["e.sequencia AS _k_sequencia", "e.seq AS _k_seq", "e.id AS _k_id"]
+        
+        where = []
+        params = []
+        if sequencia:
+            where.append("e.sequencia = ?")
+            params.append(sequencia)
+        if status:
+            where.append(f"{self.ACTIVITY_LIST_FIELDS['status']} IN ({', '.join('?' * len(status))})")
+            params.extend(status)
+        for campo, valor in (("is_milestone", is_milestone), ("is_rollback", is_rollback), ("arquivado", arquivado)):
+            if valor is not None:
+                where.append(f"{self.ACTIVITY_LIST_FIELDS[campo]} = ?")
+                params.append(1 if valor else 0)
+        if q:
+            termo = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            where.append("e.atividade LIKE ? ESCAPE '\\'")
+            params.append(f"%{termo}%")
+        if after:
+            after_sequencia, after_seq, after_id = after
+            # Seq NULL vem primeiro na ordenação do SQLite
+            if after_seq is None:
+                where.append("(e.sequencia > ? OR (e.sequencia = ? AND (e.seq IS NOT NULL OR (e.seq IS NULL AND e.id > ?))))")
+                params.extend([after_sequencia, after_sequencia, after_id])
+            else:
+                where.append("(e.sequencia > ? OR (e.sequencia = ? AND (e.seq > ? OR (e.seq = ? AND e.id > ?))))")
+                params.extend([after_sequencia, after_sequencia, after_seq, after_seq, after_id])
+        
+        sql = f"""
+            SELECT {', '.join(colunas)}
+            FROM excel_data e
+            LEFT JOIN activity_control c
+                ON c.seq = e.seq AND c.sequencia = e.sequencia AND c.excel_data_id = e.id
+            LEFT JOIN activity_control c0
+                ON c0.seq = e.seq AND c0.sequencia = e.sequencia AND c0.excel_data_id = 0
+            {'WHERE ' + ' AND '.join(where) if where else ''}
+            ORDER BY e.sequencia, e.seq, e.id
+            LIMIT ?
+        """
+        params.append(limit + 1)
+        
+        conn = self.get_connection()
+        try:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+        
+        proxima = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            ultima = rows[-1]
+            proxima = (ultima["_k_sequencia"], ultima["_k_seq"], ultima["_k_id"])
+        
+        activities = []
+        for row in rows:
+            activity = {campo: row[campo] for campo in fields}
+            for campo in self._BOOLEAN_LIST_FIELDS:
+                if campo in activity:
+                    activity[campo] = bool(activity[campo])
+            activities.append(activity)
+        
+        return activities, proxima
+    
+    # Contadores por status usados em calculate_statistics (milestones ficam fora das contagens)
+    STATISTICS_COUNTERS = ["total", "concluidas", "em_execucao", "planejadas", "atrasadas", "adiantadas", "milestones"]
+    
+    def get_statistics(self, rollback=None):
+        """
+        Calcula as estatísticas do dashboard com uma única consulta agrupada
+        
+        Mesmas regras de calculate_statistics: milestones são contados à parte,
+        "Adiantado" conta como em execução e atividades com atraso > 0 contam
+        como atrasadas mesmo sem o status "Atrasado".
+        
+        Args:
+            rollback: None para todas, True apenas rollback, False apenas principais
+            
+        Returns:
+            dict: {"geral": {...}, "por_sequencia": {sequencia: {...}}} com contagens e percentuais
+        """
+        campos = self.ACTIVITY_LIST_FIELDS
+        where = ""
+        params = []
+        if rollback is not None:
+            where = f"WHERE {campos['is_rollback']} = ?"
+            params.append(1 if rollback else 0)
+        
+        sql = f"""
+            SELECT sequencia,
+                   SUM(1 - milestone) AS total,
+                   SUM(CASE WHEN milestone = 0 AND status = 'Concluído' THEN 1 ELSE 0 END) AS concluidas,
+                   SUM(CASE WHEN milestone = 0 AND status IN ('Em Execução', 'Adiantado') THEN 1 ELSE 0 END) AS em_execucao,
+                   SUM(CASE WHEN milestone = 0 AND status = 'Planejado' THEN 1 ELSE 0 END) AS planejadas,
+                   SUM(CASE WHEN milestone = 0 AND (status = 'Atrasado' OR atraso > 0) THEN 1 ELSE 0 END) AS atrasadas,
+                   SUM(CASE WHEN milestone = 0 AND status = 'Adiantado' THEN 1 ELSE 0 END) AS adiantadas,
+                   SUM(milestone) AS milestones
+            FROM (
+                SELECT e.sequencia AS sequencia,
+                       {campos['status']} AS status,
+                       {campos['atraso_minutos']} AS atraso,
+                       {campos['is_milestone']} AS milestone
+                FROM excel_data e
+                LEFT JOIN activity_control c
+                    ON c.seq = e.seq AND c.sequencia = e.sequencia AND c.excel_data_id = e.id
+                LEFT JOIN activity_control c0
+                    ON c0.seq = e.seq AND c0.sequencia = e.sequencia AND c0.excel_data_id = 0
+                {where}
+            )
+            GROUP BY sequencia
+        """
+        
+        conn = self.get_connection()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+        
+        stats = {
+            "geral": {contador: 0 for contador in self.STATISTICS_COUNTERS},
+            "por_sequencia": {}
+        }
+        for row in rows:
+            seq_stats = dict(zip(self.STATISTICS_COUNTERS, (int(v or 0) for v in row[1:])))
+            stats["por_sequencia"][row[0]] = seq_stats
+            for contador in self.STATISTICS_COUNTERS:
+                stats["geral"][contador] += seq_stats[contador]
+        
+        # Percentuais apenas quando há atividades (como em calculate_statistics)
+        for seq_stats in [stats["geral"]] + list(stats["por_sequencia"].values()):
+            total = seq_stats["total"]
+            if total > 0:
+                for contador in ["concluidas", "em_execucao", "planejadas", "atrasadas"]:
+                    seq_stats[f"pct_{contador}"] = (seq_stats[contador] / total) * 100
+        
+        return stats
+    
     def clear_all_control_data(self):
         """Limpa todos os dados de controle (útil para reset)"""
         conn = self.get_connection()
@@ -540,138 +713,143 @@ class DatabaseManager:
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        # Limpar dados antigos do Excel ANTES de salvar novos
-        # Isso garante que não haja dados duplicados ou antigos
-        cursor.execute("DELETE FROM excel_data")
-        conn.commit()
-        
-        # Verificar se há dados sendo salvos
-        if not data_dict or len(data_dict) == 0:
-            conn.close()
-            return 0
-        
-        # Contador de registros salvos
-        total_saved = 0
-        
-        # Salvar novos dados
-        for sequencia, data in data_dict.items():
-            df = data["dataframe"]
-            print(f"DEBUG: Salvando {len(df)} registros da sequência {sequencia}")
+        # Limpeza e gravação em uma única transação: outra importação (ou leitor)
+        # nunca vê a tabela vazia ou com linhas de dois arquivos misturadas
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            # Limpar dados antigos do Excel ANTES de salvar novos
+            # Isso garante que não haja dados duplicados ou antigos
+            cursor.execute("DELETE FROM excel_data")
             
-            for idx, row in df.iterrows():
-                try:
-                    # Converter datas para string ISO
-                    inicio_str = None
-                    fim_str = None
-                    
-                    if "Inicio" in row and pd.notna(row["Inicio"]):
-                        if hasattr(row["Inicio"], 'isoformat'):
-                            inicio_str = row["Inicio"].isoformat()
-                        elif isinstance(row["Inicio"], str):
-                            inicio_str = row["Inicio"]
-                        else:
-                            inicio_str = str(row["Inicio"])
-                    
-                    if "Fim" in row and pd.notna(row["Fim"]):
-                        if hasattr(row["Fim"], 'isoformat'):
-                            fim_str = row["Fim"].isoformat()
-                        elif isinstance(row["Fim"], str):
-                            fim_str = row["Fim"]
-                        else:
-                            fim_str = str(row["Fim"])
-                    
-                    # Converter Seq para int - ser mais tolerante
-                    seq_value = None
-                    if "Seq" in row:
-                        seq_raw = row["Seq"]
-                        if pd.notna(seq_raw):
-                            try:
-                                # Tentar converter diretamente
-                                seq_value = int(seq_raw)
-                            except (ValueError, TypeError):
-                                # Tentar extrair número de string
+            # Verificar se há dados sendo salvos
+            if not data_dict or len(data_dict) == 0:
+                conn.commit()
+                return 0
+            
+            # Contador de registros salvos
+            total_saved = 0
+            
+            # Salvar novos dados
+            for sequencia, data in data_dict.items():
+                df = data["dataframe"]
+                print(f"DEBUG: Salvando {len(df)} registros da sequência {sequencia}")
+                
+                for idx, row in df.iterrows():
+                    try:
+                        # Converter datas para string ISO
+                        inicio_str = None
+                        fim_str = None
+                        
+                        if "Inicio" in row and pd.notna(row["Inicio"]):
+                            if hasattr(row["Inicio"], 'isoformat'):
+                                inicio_str = row["Inicio"].isoformat()
+                            elif isinstance(row["Inicio"], str):
+                                inicio_str = row["Inicio"]
+                            else:
+                                inicio_str = str(row["Inicio"])
+                        
+                        if "Fim" in row and pd.notna(row["Fim"]):
+                            if hasattr(row["Fim"], 'isoformat'):
+                                fim_str = row["Fim"].isoformat()
+                            elif isinstance(row["Fim"], str):
+                                fim_str = row["Fim"]
+                            else:
+                                fim_str = str(row["Fim"])
+                        
+                        # Converter Seq para int - ser mais tolerante
+                        seq_value = None
+                        if "Seq" in row:
+                            seq_raw = row["Seq"]
+                            if pd.notna(seq_raw):
                                 try:
-                                    seq_str = str(seq_raw).strip()
-                                    # Remover caracteres não numéricos e tentar converter
-                                    import re
-                                    numbers = re.findall(r'\d+', seq_str)
-                                    if numbers:
-                                        seq_value = int(numbers[0])
-                                    else:
-                                        # Se não conseguir, usar índice como fallback
-                                        seq_value = 999000 + total_saved
-                                        print(f"AVISO: Seq inválido '{seq_raw}' na sequência {sequencia}, usando Seq temporário {seq_value}")
-                                except Exception as e:
-                                    # Usar índice como fallback
-                                    seq_value = 999000 + total_saved
-                                    print(f"AVISO: Erro ao processar Seq '{seq_raw}' na sequência {sequencia}: {e}, usando Seq temporário {seq_value}")
-                        else:
-                            # Seq é NaN, verificar se tem Atividade
-                            atividade = str(row.get("Atividade", "")).strip()
-                            if atividade and atividade != "":
-                                # Tem Atividade mas não Seq, gerar Seq temporário
-                                seq_value = 999000 + total_saved
-                                print(f"AVISO: Linha sem Seq mas com Atividade '{atividade[:50]}...' na sequência {sequencia}, usando Seq temporário {seq_value}")
+                                    # Tentar converter diretamente
+                                    seq_value = int(seq_raw)
+                                except (ValueError, TypeError):
+                                    # Tentar extrair número de string
+                                    try:
+                                        seq_str = str(seq_raw).strip()
+                                        # Remover caracteres não numéricos e tentar converter
+                                        import re
+                                        numbers = re.findall(r'\d+', seq_str)
+                                        if numbers:
+                                            seq_value = int(numbers[0])
+                                        else:
+                                            # Se não conseguir, usar índice como fallback
+                                            seq_value = self.SEQ_TEMPORARIO_BASE + total_saved
+                                            print(f"AVISO: Seq inválido '{seq_raw}' na sequência {sequencia}, usando Seq temporário {seq_value}")
+                                    except Exception as e:
+                                        # Usar índice como fallback
+                                        seq_value = self.SEQ_TEMPORARIO_BASE + total_saved
+                                        print(f"AVISO: Erro ao processar Seq '{seq_raw}' na sequência {sequencia}: {e}, usando Seq temporário {seq_value}")
                             else:
-                                # Sem Seq e sem Atividade, pular
-                                print(f"AVISO: Linha sem Seq e sem Atividade na sequência {sequencia}, linha pulada")
-                                continue
-                    
-                    if seq_value is None:
-                        print(f"AVISO: Não foi possível determinar Seq para linha na sequência {sequencia}, linha pulada")
-                        continue
-                    
-                    # Validar que temos pelo menos Seq e Atividade
-                    atividade = str(row.get("Atividade", "")).strip()
-                    if not atividade or atividade == "":
-                        print(f"AVISO: Linha com Seq {seq_value} mas sem Atividade na sequência {sequencia}, linha pulada")
+                                # Seq é NaN, verificar se tem Atividade
+                                atividade = str(row.get("Atividade", "")).strip()
+                                if atividade and atividade != "":
+                                    # Tem Atividade mas não Seq, gerar Seq temporário
+                                    seq_value = self.SEQ_TEMPORARIO_BASE + total_saved
+                                    print(f"AVISO: Linha sem Seq mas com Atividade '{atividade[:50]}...' na sequência {sequencia}, usando Seq temporário {seq_value}")
+                                else:
+                                    # Sem Seq e sem Atividade, pular
+                                    print(f"AVISO: Linha sem Seq e sem Atividade na sequência {sequencia}, linha pulada")
+                                    continue
+                        
+                        if seq_value is None:
+                            print(f"AVISO: Não foi possível determinar Seq para linha na sequência {sequencia}, linha pulada")
+                            continue
+                        
+                        # Validar que temos pelo menos Seq e Atividade
+                        atividade = str(row.get("Atividade", "")).strip()
+                        if not atividade or atividade == "":
+                            print(f"AVISO: Linha com Seq {seq_value} mas sem Atividade na sequência {sequencia}, linha pulada")
+                            continue
+                        
+                        # IMPORTANTE: Cada linha do Excel é única, mesmo que tenha o mesmo Seq
+                        # Não usar UNIQUE constraint, permitir múltiplas linhas com mesmo (sequencia, seq)
+                        # A chave primária 'id' garante unicidade de cada linha
+                        
+                        # Inserir novo registro (sempre INSERT, não UPDATE)
+                        # Como limpamos a tabela antes, não há risco de duplicatas de importação anterior
+                        cursor.execute("""
+                            INSERT INTO excel_data
+                            (sequencia, seq, atividade, grupo, localidade, executor, 
+                             telefone, inicio, fim, tempo)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        """, (
+                            sequencia,
+                            seq_value,
+                                atividade,
+                                str(row.get("Grupo", "")),
+                                str(row.get("Localidade", "")),
+                                str(row.get("Executor", "")),
+                                str(row.get("Telefone", "")),
+                                inicio_str,
+                                fim_str,
+                                float(row.get("Tempo", 0)) if pd.notna(row.get("Tempo", 0)) else 0
+                            ))
+                        total_saved += 1
+                    except Exception as e:
+                        # Log do erro mas continua
+                        import traceback
+                        print(f"ERRO ao salvar linha {row.get('Seq', 'N/A')} da sequência {sequencia}: {e}")
+                        print(traceback.format_exc())
                         continue
-                    
-                    # IMPORTANTE: Cada linha do Excel é única, mesmo que tenha o mesmo Seq
-                    # Não usar UNIQUE constraint, permitir múltiplas linhas com mesmo (sequencia, seq)
-                    # A chave primária 'id' garante unicidade de cada linha
-                    
-                    # Inserir novo registro (sempre INSERT, não UPDATE)
-                    # Como limpamos a tabela antes, não há risco de duplicatas de importação anterior
-                    cursor.execute("""
-                        INSERT INTO excel_data
-                        (sequencia, seq, atividade, grupo, localidade, executor, 
-                         telefone, inicio, fim, tempo)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        sequencia,
-                        seq_value,
-                            atividade,
-                            str(row.get("Grupo", "")),
-                            str(row.get("Localidade", "")),
-                            str(row.get("Executor", "")),
-                            str(row.get("Telefone", "")),
-                            inicio_str,
-                            fim_str,
-                            float(row.get("Tempo", 0)) if pd.notna(row.get("Tempo", 0)) else 0
-                        ))
-                    total_saved += 1
-                except Exception as e:
-                    # Log do erro mas continua
-                    import traceback
-                    print(f"ERRO ao salvar linha {row.get('Seq', 'N/A')} da sequência {sequencia}: {e}")
-                    print(traceback.format_exc())
-                    continue
+                
+                print(f"DEBUG: Processados {total_saved} registros até agora da sequência {sequencia}")
             
-            print(f"DEBUG: Processados {total_saved} registros até agora da sequência {sequencia}")
-        
-        # Fazer commit de todos os registros de uma vez
-        conn.commit()
-        
-        # Verificar quantos registros foram realmente salvos
-        cursor.execute("SELECT COUNT(*) FROM excel_data")
-        actual_count = cursor.fetchone()[0]
-        print(f"DEBUG: Total de registros realmente salvos no banco: {actual_count}")
-        
-        if actual_count != total_saved:
-            print(f"AVISO: Discrepância detectada! Processados {total_saved} mas salvos {actual_count}")
-        
-        conn.close()
+            # Verificar quantos registros foram realmente salvos (antes do commit)
+            cursor.execute("SELECT COUNT(*) FROM excel_data")
+            actual_count = cursor.fetchone()[0]
+            print(f"DEBUG: Total de registros realmente salvos no banco: {actual_count}")
+            
+            if actual_count != total_saved:
+                print(f"AVISO: Discrepância detectada! Processados {total_saved} mas salvos {actual_count}")
+            
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
         
         # Retornar o número real de registros salvos, não o contador
         return actual_count
@@ -684,7 +862,7 @@ class DatabaseManager:
             dict: Dicionário com dataframes de cada sequência ou None se não houver dados
         """
         import pandas as pd
-        from modules.calculations import convert_time_to_minutes
+        from modules.calculations import convert_time_series_to_minutes
         
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -730,7 +908,7 @@ class DatabaseManager:
                 "Telefone": row[7] or "",
                 "Inicio": inicio,
                 "Fim": fim,
-                "Tempo": convert_time_to_minutes(row[10]) if row[10] else 0,
+                "Tempo": row[10],
                 "CRQ": sequencia,
                 "Excel_Data_ID": excel_data_id  # ID único para identificar a linha
             })
@@ -744,21 +922,10 @@ class DatabaseManager:
                 # Converter Seq para Int64
                 if "Seq" in df.columns:
                     df["Seq"] = pd.to_numeric(df["Seq"], errors='coerce').astype('Int64')
+                # Converter Tempo para minutos de uma vez (coluna inteira)
+                df["Tempo"] = convert_time_series_to_minutes(df["Tempo"])
                 
-                # Converter colunas sensíveis para string (evitar tipos mistos do PyArrow)
-                def safe_str_convert(val):
-                    if pd.isna(val) or val is None:
-                        return ""
-                    try:
-                        if isinstance(val, (int, float)):
-                            return str(int(val)) if isinstance(val, float) and val.is_integer() else str(val)
-                        return str(val)
-                    except:
-                        return ""
-                
-                for col in ["Telefone", "Grupo", "Localidade", "Executor", "Tempo", "Atividade"]:
-                    if col in df.columns:
-                        df[col] = df[col].apply(safe_str_convert)
+                # Tipos finais (texto, categorias) são aplicados por apply_data_schema no merge
                 
                 data_dict[sequencia] = {
                     "dataframe": df,
@@ -960,4 +1127,125 @@ class DatabaseManager:
             
         except Exception as e:
             print(f"Erro ao importar dados: {e}")
-            return 0, 0, False
\ No newline at end of file
+            return 0, 0, False
+    
+    UPLOAD_JOB_FIELDS = ["filename", "status", "etapa", "total_rows", "total_saved",
+                         "control_created", "sequencias", "erro"]
+    UPLOAD_JOB_TERMINAL_STATUS = ("completed", "failed")
+    
+    def create_upload_job(self, job_id, filename):
+        """
+        Registra um novo job de upload na fila
+        
+        Args:
+            job_id: Identificador do job
+            filename: Nome do arquivo enviado
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            INSERT INTO upload_jobs (id, filename, status, etapa, data_atualizacao)
+            VALUES (?, ?, 'queued', 'Aguardando processamento', ?)
+        """, (job_id, filename, datetime.now().isoformat()))
+        
+        conn.commit()
+        conn.close()
+    
+    def update_upload_job(self, job_id, **fields):
+        """
+        Atualiza estado, progresso ou resultado de um job de upload
+        
+        Jobs já finalizados (completed/failed) não são alterados.
+        
+        Args:
+            job_id: Identificador do job
+            **fields: Campos a atualizar (status, etapa, total_rows, total_saved,
+                      control_created, sequencias, erro)
+            
+        Returns:
+            bool: True se o job foi atualizado
+        """
+        fields = {k: v for k, v in fields.items() if k in self.UPLOAD_JOB_FIELDS}
+        if not fields:
+            return False
+        
+        if isinstance(fields.get("sequencias"), list):
+            fields["sequencias"] = ",".join(fields["sequencias"])
+        
+        set_clause = ", ".join(f"{campo} = ?" for campo in fields)
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            f"UPDATE upload_jobs SET {set_clause}, data_atualizacao = ? "
+            f"WHERE id = ? AND status NOT IN (?, ?)",
+            list(fields.values()) + [datetime.now().isoformat(), job_id, *self.UPLOAD_JOB_TERMINAL_STATUS]
+        )
+        atualizado = cursor.rowcount > 0
+        
+        conn.commit()
+        conn.close()
+        return atualizado
+    
+    def get_upload_job(self, job_id):
+        """
+        Busca o estado de um job de upload
+        
+        Args:
+            job_id: Identificador do job
+            
+        Returns:
+            dict: Dados do job ou None se não existir
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT id, filename, status, etapa, total_rows, total_saved, control_created,
+                   sequencias, erro, data_criacao, data_atualizacao
+            FROM upload_jobs
+            WHERE id = ?
+        """, (job_id,))
+        
+        row = cursor.fetchone()
+        conn.close()
+        
+        if not row:
+            return None
+        
+        return {
+            "job_id": row[0],
+            "filename": row[1],
+            "status": row[2],
+            "etapa": row[3],
+            "total_rows": row[4] or 0,
+            "total_saved": row[5] or 0,
+            "control_created": row[6] or 0,
+            "sequencias": row[7].split(",") if row[7] else [],
+            "erro": row[8],
+            "data_criacao": row[9],
+            "data_atualizacao": row[10]
+        }
+    
+    def fail_interrupted_upload_jobs(self):
+        """
+        Marca como falhos os jobs que estavam na fila ou em execução quando o servidor parou
+        
+        Returns:
+            int: Quantidade de jobs marcados
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            UPDATE upload_jobs
+            SET status = 'failed', erro = 'Processamento interrompido (servidor reiniciado)',
+                data_atualizacao = ?
+            WHERE status IN ('queued', 'running')
+        """, (datetime.now().isoformat(),))
+        total = cursor.rowcount
+        
+        conn.commit()
+        conn.close()
+        return total
@@ -0,0 +1,386 @@
+"""
+Módulo para leitura e normalização do arquivo Excel (sem dependência do Streamlit)
+"""
+import io
+import os
+import threading
+
+import pandas as pd
+from config import SEQUENCIAS, EXCEL_PARSE_WORKERS
+from modules.data_schema import apply_data_schema
+
+# Colunas esperadas em cada aba, na ordem do arquivo
+EXPECTED_COLUMNS = ["Seq", "Atividade", "Grupo", "Localidade",
+                    "Executor", "Telefone", "Inicio", "Fim", "Tempo"]
+
+
+def identify_sequencia(sheet_name):
+    """
+    Identifica a sequência (CRQ) pelo nome da aba
+
+    Args:
+        sheet_name: Nome da aba do Excel
+
+    Returns:
+        str: Chave da sequência ou None se a aba não for reconhecida
+    """
+    nome = str(sheet_name).upper()
+    for seq_key in SEQUENCIAS.keys():
+        if seq_key in nome:
+            return seq_key
+    return None
+
+
+def _as_excel_source(source):
+    """
+    Prepara a origem do Excel para leitura pelo pandas
+
+    Args:
+        source: Caminho, bytes ou objeto arquivo do Excel
+
+    Returns:
+        Caminho ou objeto arquivo posicionado no início
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return source
+
+
+def read_workbook(source):
+    """
+    Lê o arquivo Excel uma única vez e retorna as abas reconhecidas
+
+    O workbook é aberto uma vez (pd.ExcelFile) e cada aba reconhecida é
+    lida a partir desse mesmo objeto, sem reprocessar o arquivo.
+
+    Args:
+        source: Caminho, bytes ou objeto arquivo do Excel
+
+    Returns:
+        dict: {sheet_name: DataFrame bruto} apenas das abas reconhecidas
+    """
+    source = _as_excel_source(source)
+
+    sheets = {}
+    with pd.ExcelFile(source) as excel_file:
+        for sheet_name in excel_file.sheet_names:
+            if identify_sequencia(sheet_name):
+                sheets[sheet_name] = excel_file.parse(sheet_name)
+    return sheets
+
+
+def validate_workbook_sheets(sheets):
+    """
+    Valida a estrutura a partir das abas já lidas
+
+    Args:
+        sheets: Dicionário {sheet_name: DataFrame} retornado por read_workbook
+
+    Returns:
+        bool: True se pelo menos uma aba reconhecida tem as colunas esperadas
+    """
+    expected_lower = [col.lower() for col in EXPECTED_COLUMNS[:5]]
+
+    for df in sheets.values():
+        if df.empty or len(df.columns) == 0:
+            continue
+        colunas = {str(col).strip().lower() for col in df.columns}
+        found_cols = sum(1 for col in expected_lower if col in colunas)
+        if found_cols >= 3:  # Pelo menos Seq, Atividade e mais uma
+            return True
+
+    return False
+
+
+def map_expected_columns(df):
+    """
+    Seleciona as colunas esperadas de uma aba de forma vetorizada
+
+    Cada coluna esperada é procurada pelo nome (sem diferenciar maiúsculas e
+    ignorando espaços); se não existir, usa a posição correspondente.
+
+    Args:
+        df: DataFrame bruto da aba
+
+    Returns:
+        DataFrame: Colunas EXPECTED_COLUMNS (None quando ausente) ou None se
+                   a aba não tiver o mínimo de colunas
+    """
+    nomes = [str(col).strip().lower() for col in df.columns]
+    posicoes = {}
+    for i, expected in enumerate(EXPECTED_COLUMNS):
+        chave = expected.lower()
+        if chave in nomes:
+            posicoes[expected] = nomes.index(chave)
+        elif i < len(nomes):
+            posicoes[expected] = i
+
+    if len(posicoes) < 5:  # Mínimo: Seq, Atividade, Inicio, Fim, Tempo
+        return None
+
+    selecionadas = df.iloc[:, list(posicoes.values())]
+    selecionadas.columns = list(posicoes.keys())
+    return selecionadas.reindex(columns=EXPECTED_COLUMNS)
+
+
+def normalize_sheet(df, sequencia, warn=None, sheet_name=None):
+    """
+    Normaliza uma aba bruta para o formato esperado pelo sistema
+
+    Args:
+        df: DataFrame bruto da aba
+        sequencia: Chave da sequência (CRQ)
+        warn: Função para avisos (ex: st.warning, logger.warning)
+        sheet_name: Nome da aba (usado nas mensagens)
+
+    Returns:
+        DataFrame: Aba normalizada e tipada, ou None se inválida
+    """
+    if df.empty or len(df.columns) == 0:
+        return None
+
+    mapped = map_expected_columns(df)
+    if mapped is None:
+        if warn:
+            warn(f"Estrutura da aba {sheet_name or sequencia} pode estar incorreta. Colunas encontradas: {list(df.columns[:9])}")
+        return None
+
+    # Remover apenas linhas onde AMBOS Seq E Atividade estão vazios
+    vazios = ["", "nan", "None", "<NA>", "NaT"]
+    seq_txt = mapped["Seq"].astype(str).str.strip()
+    atividade_txt = mapped["Atividade"].astype(str).str.strip()
+    mask_valid = (
+        (mapped["Seq"].notna() & ~seq_txt.isin(vazios)) |
+        (mapped["Atividade"].notna() & ~atividade_txt.isin(vazios))
+    )
+    df = mapped[mask_valid].copy()
+
+    # Seq inválido vira NA, mas a linha é mantida (o banco trata Seq ausente)
+    df["Seq"] = pd.to_numeric(df["Seq"], errors='coerce').astype('Int64')
+
+    for col in ["Inicio", "Fim"]:
+        df[col] = pd.to_datetime(df[col], errors='coerce')
+
+    df["CRQ"] = sequencia
+
+    return apply_data_schema(df).reset_index(drop=True)
+
+
+def build_sequencia_frames(sheets, warn=None):
+    """
+    Monta os dataframes por sequência a partir das abas lidas
+
+    Args:
+        sheets: Dicionário {sheet_name: DataFrame} retornado por read_workbook
+        warn: Função para avisos (ex: st.warning, logger.warning)
+
+    Returns:
+        dict: {sequencia: {"dataframe": df, "sheet_name": nome}}
+    """
+    dados = {}
+    for sheet_name, raw_df in sheets.items():
+        sequencia = identify_sequencia(sheet_name)
+        if not sequencia:
+            continue
+
+        df = normalize_sheet(raw_df, sequencia, warn=warn, sheet_name=sheet_name)
+        if df is None:
+            continue
+
+        dados[sequencia] = {
+            "dataframe": df,
+            "sheet_name": sheet_name
+        }
+
+    return dados
+
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def _get_parse_workers():
+    """
+    Quantidade de processos para leitura paralela das abas
+
+    Returns:
+        int: Número de processos (1 = sequencial)
+    """
+    if EXCEL_PARSE_WORKERS > 0:
+        return EXCEL_PARSE_WORKERS
+    return min(len(SEQUENCIAS), os.cpu_count() or 1)
+
+
+def _get_process_pool():
+    """
+    Retorna o pool de processos compartilhado (criado no primeiro uso)
+
+    Returns:
+        ProcessPoolExecutor: Pool de processos
+    """
+    global _process_pool
+
+    with _process_pool_lock:
+        if _process_pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # spawn: o processo da API tem threads, fork não é seguro
+            _process_pool = ProcessPoolExecutor(
+                max_workers=_get_parse_workers(),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+
+
+def shutdown_process_pool():
+    """Encerra o pool de processos de leitura, se tiver sido criado"""
+    global _process_pool
+
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=True, cancel_futures=True)
+            _process_pool = None
+
+
+def _frame_to_arrow(df):
+    """
+    Serializa um dataframe em Arrow IPC (pickle quando pyarrow não está disponível)
+
+    Args:
+        df: DataFrame a serializar
+
+    Returns:
+        bytes ou DataFrame: Frame serializado
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return df
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _frame_from_arrow(data):
+    """
+    Reconstrói o dataframe serializado por _frame_to_arrow
+
+    Args:
+        data: Bytes Arrow IPC ou DataFrame
+
+    Returns:
+        DataFrame: Frame reconstruído
+    """
+    if isinstance(data, pd.DataFrame):
+        return data
+
+    import pyarrow as pa
+    return pa.ipc.open_stream(data).read_pandas()
+
+
+def parse_sheet_worker(source, sheet_name):
+    """
+    Lê e normaliza uma única aba (executado em processo separado)
+
+    Args:
+        source: Caminho ou bytes do Excel (compartilhado entre as abas)
+        sheet_name: Nome da aba a processar
+
+    Returns:
+        tuple: (frame serializado em Arrow ou None, lista de avisos)
+    """
+    avisos = []
+    raw_df = pd.read_excel(_as_excel_source(source), sheet_name=sheet_name)
+    df = normalize_sheet(raw_df, identify_sequencia(sheet_name), warn=avisos.append, sheet_name=sheet_name)
+    return (_frame_to_arrow(df) if df is not None else None), avisos
+
+
+def parse_workbook_parallel(source, warn=None):
+    """
+    Lê as abas reconhecidas em paralelo, uma aba por processo
+
+    Cada processo lê sua aba a partir da mesma origem e devolve o frame já
+    normalizado em Arrow IPC. Com uma única aba (ou um único processo) a
+    leitura é sequencial.
+
+    Args:
+        source: Caminho ou bytes do Excel
+        warn: Função para avisos (ex: logger.warning)
+
+    Returns:
+        dict: {sequencia: {"dataframe": df, "sheet_name": nome}}
+    """
+    if isinstance(source, (bytearray, memoryview)):
+        source = bytes(source)
+
+    with pd.ExcelFile(_as_excel_source(source)) as excel_file:
+        sheet_names = [nome for nome in excel_file.sheet_names if identify_sequencia(nome)]
+
+    if len(sheet_names) < 2 or _get_parse_workers() < 2:
+        return build_sequencia_frames(read_workbook(source), warn=warn)
+
+    from concurrent.futures.process import BrokenProcessPool
+
+    try:
+        pool = _get_process_pool()
+        futures = [(nome, pool.submit(parse_sheet_worker, source, nome)) for nome in sheet_names]
+        resultados = [(nome, future.result()) for nome, future in futures]
+    except BrokenProcessPool:
+        print("AVISO: Pool de processos indisponível, lendo abas sequencialmente")
+        return build_sequencia_frames(read_workbook(source), warn=warn)
+
+    dados = {}
+    for sheet_name, (frame, avisos) in resultados:
+        if warn:
+            for aviso in avisos:
+                warn(aviso)
+        if frame is None:
+            continue
+
+        dados[identify_sequencia(sheet_name)] = {
+            "dataframe": _frame_from_arrow(frame),
+            "sheet_name": sheet_name
+        }
+
+    return dados
+
+
+def load_workbook_frames(source, warn=None, reader=None, parallel=False):
+    """
+    Carrega os dataframes por sequência usando o cache de planilhas processadas
+
+    O arquivo é identificado pelo SHA-256 dos bytes; se a mesma planilha já foi
+    processada, os frames são lidos do cache (Arrow) sem abrir o Excel.
+
+    Args:
+        source: Caminho, bytes ou objeto arquivo do Excel
+        warn: Função para avisos (ex: st.warning, logger.warning)
+        reader: Função de leitura das abas (padrão: read_workbook)
+        parallel: Se True, lê as abas em paralelo (parse_workbook_parallel)
+
+    Returns:
+        dict: {sequencia: {"dataframe": df, "sheet_name": nome}}
+    """
+    from modules import parse_cache
+
+    def _parse():
+        if parallel:
+            return parse_workbook_parallel(source, warn=warn)
+        return build_sequencia_frames((reader or read_workbook)(source), warn=warn)
+
+    if not parse_cache.is_enabled():
+        return _parse()
+
+    file_hash = parse_cache.compute_file_hash(source)
+    dados = parse_cache.load_cached_frames(file_hash)
+    if dados is not None:
+        return dados
+
+    dados = _parse()
+    parse_cache.store_frames(file_hash, dados)
+    return dados
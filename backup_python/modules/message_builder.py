@@ -2,131 +2,298 @@
 Módulo para construção de mensagem consolidada para WhatsApp
 """
 from datetime import datetime, timezone, timedelta
+from functools import lru_cache
+import pandas as pd
 from config import DATE_FORMAT, SEQUENCIAS
 from modules.calculations import (
-    calculate_statistics, get_delayed_activities, 
-    is_sequence_completed, format_delay
+    calculate_statistics, build_activity_status_index, format_delay
 )
+from modules.data_cache import versioned_cache
 
+SEPARADOR = "━━━━━━━━━━━━━━━━━━"
 
-def build_whatsapp_message(data_dict):
+# Contadores exibidos nos blocos de status (geral e por CRQ)
+CAMPOS_STATUS = ["total", "concluidas", "em_execucao", "planejadas", "atrasadas", "adiantadas",
+                 "pct_concluidas", "pct_em_execucao", "pct_planejadas", "pct_atrasadas"]
+
+
+def _stats_key(stats):
     """
-    Constrói mensagem consolidada para WhatsApp
-    
+    Converte as estatísticas em tupla (chave do cache de seções e comparação entre envios)
+
+    Args:
+        stats: Dicionário de estatísticas (geral ou de um CRQ)
+
+    Returns:
+        tuple: Valores de CAMPOS_STATUS na ordem
+    """
+    return tuple(stats.get(campo, 0) for campo in CAMPOS_STATUS)
+
+
+@versioned_cache(maxsize=8)
+def build_message_snapshot(data_dict):
+    """
+    Agrega (uma vez por versão dos dados) tudo o que a mensagem exibe
+
+    Estatísticas gerais e por CRQ, CRQs concluídas e atividades atrasadas
+    vêm de uma única passada; o snapshot também é o registro do último
+    envio usado no modo delta.
+
     Args:
         data_dict: Dicionário com dataframes por CRQ
-        
+
     Returns:
-        str: Mensagem formatada para WhatsApp
+        dict: {"geral": tupla de status, "crqs": {crq: {"stats", "iniciada", "concluida", "atrasadas"}}}
     """
     stats = calculate_statistics(data_dict)
-    
-    # Obter total real importado
-    total_geral = stats['geral']['total']
-    
-    # Cabeçalho - usar GMT-3 (Brasil)
-    gmt_minus_3 = timezone(timedelta(hours=-3))
-    now = datetime.now(gmt_minus_3)
-    data_str = now.strftime("%d/%m/%Y")
-    hora_str = now.strftime("%H:%M:%S")
-    
-    # Construir mensagem com quebras de linha explícitas
-    message = f"🚀 *JANELA DE MUDANÇA - REDE*\n\n"
-    message += f"📅 Data: {data_str} | 🕐 Horário: {hora_str}\n\n"
-    message += f"━━━━━━━━━━━━━━━━━━\n\n"
-    message += f"📈 *STATUS CRQ GERAL*\n"
-    message += f"  ✅ Concluídas: {stats['geral']['concluidas']}/{total_geral} ({stats['geral'].get('pct_concluidas', 0):.1f}%)\n"
-    message += f"  ⏳ Em Execução: {stats['geral']['em_execucao']}/{total_geral} ({stats['geral'].get('pct_em_execucao', 0):.1f}%)\n"
-    message += f"  🟡 Planejadas: {stats['geral']['planejadas']}/{total_geral} ({stats['geral'].get('pct_planejadas', 0):.1f}%)\n"
-    message += f"  🔴 Atrasadas: {stats['geral']['atrasadas']}/{total_geral} ({stats['geral'].get('pct_atrasadas', 0):.1f}%)\n\n"
-    message += f"━━━━━━━━━━━━━━━━━━\n"
-    
-    # Separar CRQs iniciadas das não iniciadas
-    crqs_iniciadas = []
-    crqs_nao_iniciadas = []
-    
-    for sequencia_key, sequencia_info in SEQUENCIAS.items():
-        if sequencia_key in stats["por_sequencia"]:
-            seq_stats = stats["por_sequencia"][sequencia_key]
-            
-            if seq_stats["total"] > 0:
-                # CRQ está iniciada se tiver atividades em execução, concluídas, atrasadas ou adiantadas
-                # (ou seja, se não estiver 100% planejada)
-                if (seq_stats["em_execucao"] > 0 or 
-                    seq_stats["concluidas"] > 0 or 
-                    seq_stats["atrasadas"] > 0 or
-                    seq_stats.get("adiantadas", 0) > 0):
-                    crqs_iniciadas.append((sequencia_key, sequencia_info, seq_stats))
-                else:
-                    crqs_nao_iniciadas.append((sequencia_key, sequencia_info, seq_stats))
-    
+    indice = build_activity_status_index(data_dict)
+
+    crqs = {}
+    for sequencia_key in SEQUENCIAS.keys():
+        if sequencia_key not in stats["por_sequencia"]:
+            continue
+        seq_stats = stats["por_sequencia"][sequencia_key]
+
+        # CRQ está iniciada se não estiver 100% planejada
+        iniciada = seq_stats["total"] > 0 and (
+            seq_stats["em_execucao"] > 0 or
+            seq_stats["concluidas"] > 0 or
+            seq_stats["atrasadas"] > 0 or
+            seq_stats.get("adiantadas", 0) > 0
+        )
+
+        delayed_df = indice.delayed(sequencia_key)
+        total_atrasadas = len(delayed_df)
+        atividades = delayed_df["Atividade"].tolist()
+        seqs = delayed_df["Seq"].tolist() if "Seq" in delayed_df.columns else atividades
+        excel_ids = delayed_df["Excel_Data_ID"].tolist() if "Excel_Data_ID" in delayed_df.columns else [0] * total_atrasadas
+        atrasos = delayed_df["Atraso_Minutos"].tolist() if "Atraso_Minutos" in delayed_df.columns else [0] * total_atrasadas
+        observacoes = delayed_df["Observacoes"].tolist() if "Observacoes" in delayed_df.columns else [""] * total_atrasadas
+        # Cada atraso é identificado pela atividade (Seq, Excel_Data_ID): mudanças no
+        # valor do atraso ou na observação não fazem a atividade voltar como atraso novo
+        atrasadas = tuple(
+            ((seq, 0 if pd.isna(excel_id) else int(excel_id)), atividade,
+             0 if pd.isna(atraso) else atraso, None if pd.isna(obs) else obs)
+            for seq, excel_id, atividade, atraso, obs in zip(seqs, excel_ids, atividades, atrasos, observacoes)
+        )
+
+        crqs[sequencia_key] = {
+            "stats": _stats_key(seq_stats),
+            "iniciada": iniciada,
+            "concluida": seq_stats["total"] > 0 and seq_stats["concluidas"] == seq_stats["total"],
+            "atrasadas": atrasadas
+        }
+
+    return {"geral": _stats_key(stats["geral"]), "crqs": crqs}
+
+
+def new_delayed_activities(atrasadas, anteriores):
+    """
+    Atrasos de atividades que não estavam atrasadas no snapshot anterior
+
+    Args:
+        atrasadas: Atrasos atuais de uma CRQ (campo "atrasadas" do snapshot)
+        anteriores: Atrasos da mesma CRQ no snapshot anterior
+
+    Returns:
+        tuple: Atrasos novos, na ordem atual
+    """
+    ja_atrasadas = {identidade for identidade, *_ in anteriores}
+    return tuple(atraso for atraso in atrasadas if atraso[0] not in ja_atrasadas)
+
+
+@lru_cache(maxsize=64)
+def _render_status_lines(stats):
+    """
+    Linhas de contagem por status (seção cacheada pelos valores)
+
+    Args:
+        stats: Tupla retornada por _stats_key
+
+    Returns:
+        str: Bloco com concluídas, em execução, planejadas e atrasadas
+    """
+    s = dict(zip(CAMPOS_STATUS, stats))
+    total = s["total"]
+    return "".join([
+        f"  ✅ Concluídas: {s['concluidas']}/{total} ({s['pct_concluidas']:.1f}%)\n",
+        f"  ⏳ Em Execução: {s['em_execucao']}/{total} ({s['pct_em_execucao']:.1f}%)\n",
+        f"  🟡 Planejadas: {s['planejadas']}/{total} ({s['pct_planejadas']:.1f}%)\n",
+        f"  🔴 Atrasadas: {s['atrasadas']}/{total} ({s['pct_atrasadas']:.1f}%)\n"
+    ])
+
+
+@lru_cache(maxsize=64)
+def _render_crq_block(sequencia_key, stats):
+    """
+    Bloco de status de uma CRQ iniciada (reaproveitado enquanto os números não mudam)
+
+    Args:
+        sequencia_key: Chave da CRQ
+        stats: Tupla retornada por _stats_key
+
+    Returns:
+        str: Bloco formatado
+    """
+    info = SEQUENCIAS[sequencia_key]
+    return f"\n{info['emoji']} *STATUS CRQ {info['nome']}*\n" + _render_status_lines(stats)
+
+
+@lru_cache(maxsize=64)
+def _render_delayed_block(sequencia_key, atrasadas):
+    """
+    Bloco das atividades atrasadas de uma CRQ (reaproveitado enquanto não mudam)
+
+    Args:
+        sequencia_key: Chave da CRQ
+        atrasadas: Tupla de (identidade, atividade, atraso em minutos, observações)
+
+    Returns:
+        str: Bloco formatado
+    """
+    info = SEQUENCIAS[sequencia_key]
+    partes = []
+    for _, atividade, atraso_min, observacoes in atrasadas:
+        partes.append(f"\n  {info['emoji']} [{info['nome']}] {atividade}: {format_delay(atraso_min)}\n")
+        if observacoes and str(observacoes).strip():
+            partes.append(f"     Observação: {observacoes}\n")
+    return "".join(partes)
+
+
+def _now_gmt3():
+    """Data/hora atual em GMT-3 (Brasil)"""
+    return datetime.now(timezone(timedelta(hours=-3)))
+
+
+def _render_full(snapshot, now):
+    """
+    Monta a mensagem completa a partir do snapshot
+
+    Args:
+        snapshot: Snapshot retornado por build_message_snapshot
+        now: Data/hora da mensagem
+
+    Returns:
+        str: Mensagem formatada
+    """
+    crqs = snapshot["crqs"]
+    partes = [
+        "🚀 *JANELA DE MUDANÇA - REDE*\n\n",
+        f"📅 Data: {now.strftime('%d/%m/%Y')} | 🕐 Horário: {now.strftime('%H:%M:%S')}\n\n",
+        f"{SEPARADOR}\n\n",
+        "📈 *STATUS CRQ GERAL*\n",
+        _render_status_lines(snapshot["geral"]),
+        f"\n{SEPARADOR}\n"
+    ]
+
     # Mostrar primeiro CRQs iniciadas (com detalhamento)
-    if crqs_iniciadas:
-        message += "\n📊 *CRQs INICIADAS*\n"
-        for sequencia_key, sequencia_info, seq_stats in crqs_iniciadas:
-            emoji = sequencia_info["emoji"]
-            nome = sequencia_info["nome"]
-            total = seq_stats["total"]
-            
-            message += f"\n{emoji} *STATUS CRQ {nome}*\n"
-            message += f"  ✅ Concluídas: {seq_stats['concluidas']}/{total} ({seq_stats.get('pct_concluidas', 0):.1f}%)\n"
-            message += f"  ⏳ Em Execução: {seq_stats['em_execucao']}/{total} ({seq_stats.get('pct_em_execucao', 0):.1f}%)\n"
-            message += f"  🟡 Planejadas: {seq_stats['planejadas']}/{total} ({seq_stats.get('pct_planejadas', 0):.1f}%)\n"
-            message += f"  🔴 Atrasadas: {seq_stats['atrasadas']}/{total} ({seq_stats.get('pct_atrasadas', 0):.1f}%)\n"
-    
+    iniciadas = [k for k, crq in crqs.items() if crq["iniciada"]]
+    if iniciadas:
+        partes.append("\n📊 *CRQs INICIADAS*\n")
+        partes.extend(_render_crq_block(k, crqs[k]["stats"]) for k in iniciadas)
+
     # Mostrar depois CRQs não iniciadas (apenas indicador)
-    if crqs_nao_iniciadas:
-        message += "\n\n⏸️ *CRQs NÃO INICIADAS*\n"
-        nomes_nao_iniciadas = []
-        for sequencia_key, sequencia_info, seq_stats in crqs_nao_iniciadas:
-            emoji = sequencia_info["emoji"]
-            nome = sequencia_info["nome"]
-            nomes_nao_iniciadas.append(f"{emoji} {nome}")
-        
-        message += f"  {', '.join(nomes_nao_iniciadas)}\n"
-    
-    message += "\n━━━━━━━━━━━━━━━━━━\n\n"
-    
+    nao_iniciadas = [k for k, crq in crqs.items() if not crq["iniciada"] and crq["stats"][0] > 0]
+    if nao_iniciadas:
+        nomes = [f"{SEQUENCIAS[k]['emoji']} {SEQUENCIAS[k]['nome']}" for k in nao_iniciadas]
+        partes.append("\n\n⏸️ *CRQs NÃO INICIADAS*\n")
+        partes.append(f"  {', '.join(nomes)}\n")
+
+    partes.append(f"\n{SEPARADOR}\n\n")
+
     # CRQs concluídos
-    concluidas = []
-    for sequencia_key in SEQUENCIAS.keys():
-        if is_sequence_completed(data_dict, sequencia_key):
-            concluidas.append(SEQUENCIAS[sequencia_key]["nome"])
-    
+    concluidas = [SEQUENCIAS[k]["nome"] for k, crq in crqs.items() if crq["concluida"]]
     if concluidas:
-        message += "📋 *CONCLUÍDAS*\n"
-        message += f"  {', '.join(concluidas)}\n\n"
-        message += "━━━━━━━━━━━━━━━━━━\n\n"
-    
-    # Atividades atrasadas
-    delayed_df = get_delayed_activities(data_dict)
-    
-    if len(delayed_df) > 0:
-        message += "🚨 *ATIVIDADES ATRASADAS*\n"
-        
-        # Agrupar por CRQ
-        for sequencia_key, sequencia_info in SEQUENCIAS.items():
-            seq_delayed = delayed_df[delayed_df["CRQ"] == sequencia_key]
-            
-            if len(seq_delayed) > 0:
-                emoji = sequencia_info["emoji"]
-                nome = sequencia_info["nome"]
-                
-                for _, row in seq_delayed.iterrows():
-                    atividade = row["Atividade"]
-                    atraso_min = row.get("Atraso_Minutos", 0)
-                    observacoes = row.get("Observacoes", "")
-                    
-                    atraso_str = format_delay(atraso_min)
-                    
-                    message += f"\n  {emoji} [{nome}] {atividade}: {atraso_str}\n"
-                    if observacoes and str(observacoes).strip():
-                        message += f"     Observação: {observacoes}\n"
-        
-        message += "\n━━━━━━━━━━━━━━━━━━\n\n"
-    
-    # Rodapé - usar o mesmo horário GMT-3
-    atualizado_str = now.strftime("%d/%m/%Y %H:%M:%S")
-    message += f"✅ Atualizado em: {atualizado_str}\n"
-    
-    return message
+        partes.append("📋 *CONCLUÍDAS*\n")
+        partes.append(f"  {', '.join(concluidas)}\n\n")
+        partes.append(f"{SEPARADOR}\n\n")
+
+    # Atividades atrasadas (agrupadas por CRQ)
+    if any(crq["atrasadas"] for crq in crqs.values()):
+        partes.append("🚨 *ATIVIDADES ATRASADAS*\n")
+        partes.extend(_render_delayed_block(k, crq["atrasadas"]) for k, crq in crqs.items() if crq["atrasadas"])
+        partes.append(f"\n{SEPARADOR}\n\n")
+
+    partes.append(f"✅ Atualizado em: {now.strftime('%d/%m/%Y %H:%M:%S')}\n")
+    return "".join(partes)
+
+
+def _render_delta(snapshot, anterior, now):
+    """
+    Monta apenas as mudanças em relação ao snapshot do último envio
+
+    Args:
+        snapshot: Snapshot atual
+        anterior: Snapshot do último envio
+        now: Data/hora da mensagem
+
+    Returns:
+        str: Mensagem com as seções alteradas
+    """
+    crqs = snapshot["crqs"]
+    crqs_anteriores = anterior.get("crqs", {})
+    partes = [
+        "🔄 *ATUALIZAÇÃO - JANELA DE MUDANÇA - REDE*\n\n",
+        f"📅 Data: {now.strftime('%d/%m/%Y')} | 🕐 Horário: {now.strftime('%H:%M:%S')}\n\n",
+        f"{SEPARADOR}\n\n"
+    ]
+    houve_mudanca = False
+
+    if snapshot["geral"] != anterior.get("geral"):
+        houve_mudanca = True
+        partes.append("📈 *STATUS CRQ GERAL*\n")
+        partes.append(_render_status_lines(snapshot["geral"]))
+
+    alteradas = [k for k, crq in crqs.items()
+                 if crq["iniciada"] and crq["stats"] != crqs_anteriores.get(k, {}).get("stats")]
+    if alteradas:
+        houve_mudanca = True
+        partes.append("\n📊 *CRQs ATUALIZADAS*\n")
+        partes.extend(_render_crq_block(k, crqs[k]["stats"]) for k in alteradas)
+
+    novas_concluidas = [SEQUENCIAS[k]["nome"] for k, crq in crqs.items()
+                        if crq["concluida"] and not crqs_anteriores.get(k, {}).get("concluida")]
+    if novas_concluidas:
+        houve_mudanca = True
+        partes.append(f"\n{SEPARADOR}\n\n")
+        partes.append("📋 *CONCLUÍDAS DESDE O ÚLTIMO ENVIO*\n")
+        partes.append(f"  {', '.join(novas_concluidas)}\n")
+
+    novos_atrasos = {}
+    for k, crq in crqs.items():
+        novas = new_delayed_activities(crq["atrasadas"], crqs_anteriores.get(k, {}).get("atrasadas", ()))
+        if novas:
+            novos_atrasos[k] = novas
+    if novos_atrasos:
+        houve_mudanca = True
+        partes.append(f"\n{SEPARADOR}\n\n")
+        partes.append("🚨 *NOVOS ATRASOS*\n")
+        partes.extend(_render_delayed_block(k, novas) for k, novas in novos_atrasos.items())
+
+    if not houve_mudanca:
+        partes.append("Sem alterações desde o último envio.\n")
+
+    partes.append(f"\n{SEPARADOR}\n\n")
+    partes.append(f"✅ Atualizado em: {now.strftime('%d/%m/%Y %H:%M:%S')}\n")
+    return "".join(partes)
+
+
+def build_whatsapp_message(data_dict, since_snapshot=None, data_version=None):
+    """
+    Constrói mensagem consolidada para WhatsApp
+
+    Args:
+        data_dict: Dicionário com dataframes por CRQ
+        since_snapshot: Snapshot do último envio (build_message_snapshot); se
+                        informado, a mensagem traz apenas as mudanças desde então
+        data_version: Token de versão dos dados (opcional, evita recalcular)
+
+    Returns:
+        str: Mensagem formatada para WhatsApp
+    """
+    snapshot = build_message_snapshot(data_dict, data_version=data_version)
+    now = _now_gmt3()
+
+    if since_snapshot:
+        return _render_delta(snapshot, since_snapshot, now)
+    return _render_full(snapshot, now)
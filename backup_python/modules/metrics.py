@@ -0,0 +1,286 @@
+"""
+Módulo de métricas de desempenho (formato texto do Prometheus, sem dependências)
+
+Mantém contadores, gauges e histogramas em memória e instrumenta as conexões
+SQLite: toda conexão aberta com factory=InstrumentedConnection contabiliza
+quantidade e tempo das consultas, no total do processo e na requisição HTTP
+em andamento (via contextvars). O tempo inclui a execução e a leitura das
+linhas (fetch*/iteração); a quantidade conta apenas as execuções.
+"""
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+# Limites dos histogramas
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 500, 1000)
+
+
+def _escape(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(nomes, valores, extra=""):
+    partes = [f'{nome}="{_escape(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _format_value(valor):
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+
+class Counter:
+    """Contador monotônico com rótulos"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            itens = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, valores)} {_format_value(valor)}"
+                for valores, valor in itens]
+
+
+class Gauge(Counter):
+    """Valor que sobe e desce (ex: requisições em andamento)"""
+
+    kind = "gauge"
+
+    def dec(self, amount=1, *label_values):
+        self.inc(-amount, *label_values)
+
+
+class Histogram:
+    """Histograma cumulativo com rótulos (buckets fixos)"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        indice = bisect_left(self.buckets, value)
+        with self._lock:
+            serie = self._values.get(label_values)
+            if serie is None:
+                # [contagem por bucket (+Inf no fim), soma, total]
+                serie = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += value
+            serie[2] += 1
+
+    def samples(self):
+        with self._lock:
+            itens = [(valores, list(serie[0]), serie[1], serie[2]) for valores, serie in self._values.items()]
+        linhas = []
+        for valores, contagens, soma, total in itens:
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + (float("inf"),), contagens):
+                acumulado += contagem
+                le = "+Inf" if limite == float("inf") else _format_value(float(limite))
+                rotulos = _format_labels(self.labels, valores, 'le="' + le + '"')
+                linhas.append(f"{self.name}_bucket{rotulos} {acumulado}")
+            linhas.append(f"{self.name}_sum{_format_labels(self.labels, valores)} {_format_value(soma)}")
+            linhas.append(f"{self.name}_count{_format_labels(self.labels, valores)} {total}")
+        return linhas
+
+
+class MetricsRegistry:
+    """Conjunto de métricas exportadas em /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Gera o texto no formato de exposição do Prometheus (versão 0.0.4)
+
+        Returns:
+            str: Métricas formatadas
+        """
+        linhas = []
+        for metric in self._metrics:
+            linhas.append(f"# HELP {metric.name} {metric.help}")
+            linhas.append(f"# TYPE {metric.name} {metric.kind}")
+            linhas.extend(metric.samples())
+        return "\n".join(linhas) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUESTS_TOTAL = registry.register(Counter(
+    "api_requests_total", "Requisições HTTP atendidas", ("method", "route", "status")))
+REQUEST_DURATION = registry.register(Histogram(
+    "api_request_duration_seconds", "Latência das requisições HTTP", ("method", "route")))
+REQUESTS_IN_FLIGHT = registry.register(Gauge(
+    "api_requests_in_flight", "Requisições HTTP em andamento"))
+REQUEST_SIZE = registry.register(Histogram(
+    "api_request_size_bytes", "Tamanho do corpo das requisições", ("method", "route"), SIZE_BUCKETS))
+RESPONSE_SIZE = registry.register(Histogram(
+    "api_response_size_bytes", "Tamanho do corpo das respostas (após compressão)", ("method", "route"), SIZE_BUCKETS))
+REQUEST_SQLITE_QUERIES = registry.register(Histogram(
+    "api_request_sqlite_queries", "Consultas SQLite por requisição", ("method", "route"), QUERY_COUNT_BUCKETS))
+REQUEST_SQLITE_SECONDS = registry.register(Histogram(
+    "api_request_sqlite_seconds", "Tempo em consultas SQLite por requisição (execução e leitura das linhas)",
+    ("method", "route")))
+SQLITE_QUERIES_TOTAL = registry.register(Counter(
+    "sqlite_queries_total", "Consultas SQLite executadas pelo processo"))
+SQLITE_QUERY_SECONDS_TOTAL = registry.register(Counter(
+    "sqlite_query_seconds_total", "Tempo total em consultas SQLite (execução e leitura das linhas)"))
+
+# Consultas da requisição em andamento: [quantidade, segundos] (None fora de requisições)
+_request_queries = ContextVar("request_queries", default=None)
+
+# Rastreador opcional de SQL (modules.sql_trace); None quando desativado
+query_tracer = None
+
+
+def start_request_queries():
+    """
+    Inicia a contagem de consultas SQLite da requisição atual
+
+    Returns:
+        tuple: (token para finish_request_queries, lista [quantidade, segundos])
+    """
+    consultas = [0, 0.0]
+    return _request_queries.set(consultas), consultas
+
+
+def finish_request_queries(token):
+    """Encerra a contagem iniciada em start_request_queries"""
+    _request_queries.reset(token)
+
+
+def record_query(elapsed, sql=None):
+    """
+    Contabiliza uma consulta SQLite (no processo e na requisição atual)
+
+    Args:
+        elapsed: Duração em segundos
+        sql: Texto do comando (repassado ao rastreador de SQL, se ativo)
+    """
+    if query_tracer is not None:
+        query_tracer.record(sql, elapsed)
+    SQLITE_QUERIES_TOTAL.inc()
+    SQLITE_QUERY_SECONDS_TOTAL.inc(elapsed)
+    consultas = _request_queries.get()
+    if consultas is not None:
+        consultas[0] += 1
+        consultas[1] += elapsed
+
+
+def record_fetch(elapsed):
+    """
+    Soma ao tempo das consultas a leitura de linhas (sem contar nova consulta)
+
+    Args:
+        elapsed: Duração em segundos
+    """
+    SQLITE_QUERY_SECONDS_TOTAL.inc(elapsed)
+    consultas = _request_queries.get()
+    if consultas is not None:
+        consultas[1] += elapsed
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor que mede execute/executemany/executescript e a leitura das linhas"""
+
+    def execute(self, sql, parameters=()):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_query(time.perf_counter() - inicio, sql)
+
+    def executemany(self, sql, seq_of_parameters):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_query(time.perf_counter() - inicio, sql)
+
+    def executescript(self, sql_script):
+        inicio = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            record_query(time.perf_counter() - inicio, sql_script)
+
+    # O SQLite avança a consulta a cada linha lida: sem medir o fetch, o tempo
+    # de SELECTs grandes ficaria quase todo fora da métrica. A iteração linha a
+    # linha (__next__) paga a medição por linha; para muitas linhas prefira fetchall
+    def fetchone(self):
+        inicio = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            record_fetch(time.perf_counter() - inicio)
+
+    def fetchmany(self, size=None):
+        inicio = time.perf_counter()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            record_fetch(time.perf_counter() - inicio)
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            record_fetch(time.perf_counter() - inicio)
+
+    def __next__(self):
+        inicio = time.perf_counter()
+        try:
+            return super().__next__()
+        finally:
+            record_fetch(time.perf_counter() - inicio)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Conexão cujos cursores (inclusive os de conn.execute) são instrumentados"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if query_tracer is not None:
+            self.set_trace_callback(query_tracer.on_statement)
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
@@ -0,0 +1,214 @@
+"""
+Módulo para cache em disco das planilhas já processadas (endereçado por conteúdo)
+
+Cada arquivo Excel é identificado pelo SHA-256 dos seus bytes. Os frames por
+sequência são gravados em Arrow IPC (Feather) em um diretório por hash e
+versão do formato, com remoção LRU quando o tamanho total passa do limite
+configurado.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+
+from config import PARSE_CACHE_DIR, PARSE_CACHE_MAX_MB
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+MANIFEST_NAME = "manifest.json"
+# Versão do formato dos frames gravados: incrementar sempre que a leitura ou a
+# normalização das abas (excel_parser) mudar o resultado; entradas de outra
+# versão não são encontradas e saem do cache pelo LRU
+PARSE_CACHE_FORMAT = 1
+_CHUNK_SIZE = 1024 * 1024
+_lock = threading.Lock()
+
+
+def is_enabled():
+    """
+    Indica se o cache está disponível (requer pyarrow e limite maior que zero)
+
+    Returns:
+        bool: True se o cache pode ser usado
+    """
+    return feather is not None and PARSE_CACHE_MAX_MB > 0
+
+
+def compute_file_hash(source):
+    """
+    Calcula o SHA-256 do conteúdo do arquivo
+
+    Args:
+        source: Bytes, caminho do arquivo ou objeto arquivo
+
+    Returns:
+        str: Hash hexadecimal
+    """
+    digest = hashlib.sha256()
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            for bloco in iter(lambda: f.read(_CHUNK_SIZE), b""):
+                digest.update(bloco)
+    elif hasattr(source, "getbuffer"):
+        digest.update(source.getbuffer())
+    else:
+        posicao = source.tell()
+        source.seek(0)
+        for bloco in iter(lambda: source.read(_CHUNK_SIZE), b""):
+            digest.update(bloco)
+        source.seek(posicao)
+
+    return digest.hexdigest()
+
+
+def _entry_dir(file_hash):
+    return os.path.join(PARSE_CACHE_DIR, f"{file_hash}-v{PARSE_CACHE_FORMAT}")
+
+
+def has_cached_frames(file_hash):
+    """
+    Verifica se existe entrada no cache para o hash
+
+    Args:
+        file_hash: SHA-256 do arquivo
+
+    Returns:
+        bool: True se a entrada existe
+    """
+    return is_enabled() and os.path.exists(os.path.join(_entry_dir(file_hash), MANIFEST_NAME))
+
+
+def load_cached_frames(file_hash):
+    """
+    Carrega os frames por sequência do cache (sem abrir o Excel)
+
+    Args:
+        file_hash: SHA-256 do arquivo
+
+    Returns:
+        dict: {sequencia: {"dataframe": df, "sheet_name": nome}} ou None se não houver cache
+    """
+    if not has_cached_frames(file_hash):
+        return None
+
+    entry_dir = _entry_dir(file_hash)
+    manifest_path = os.path.join(entry_dir, MANIFEST_NAME)
+
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("formato") != PARSE_CACHE_FORMAT:
+            raise ValueError(f"formato {manifest.get('formato')} (esperado {PARSE_CACHE_FORMAT})")
+
+        dados = {}
+        for sequencia, info in manifest.get("sequencias", {}).items():
+            df = feather.read_feather(os.path.join(entry_dir, info["arquivo"]))
+            dados[sequencia] = {
+                "dataframe": df,
+                "sheet_name": info["sheet_name"]
+            }
+
+        # Atualizar data de acesso (ordem do LRU)
+        os.utime(manifest_path, None)
+        return dados
+    except Exception as e:
+        print(f"AVISO: Cache de planilha inválido ({file_hash[:12]}): {e}")
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        return None
+
+
+def store_frames(file_hash, dados):
+    """
+    Grava os frames por sequência no cache e aplica o limite de tamanho
+
+    Args:
+        file_hash: SHA-256 do arquivo
+        dados: Dicionário {sequencia: {"dataframe": df, "sheet_name": nome}}
+
+    Returns:
+        bool: True se gravou com sucesso
+    """
+    if not is_enabled() or not dados:
+        return False
+
+    os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+    entry_dir = _entry_dir(file_hash)
+    tmp_dir = os.path.join(PARSE_CACHE_DIR, f".tmp-{uuid.uuid4().hex}")
+
+    try:
+        os.makedirs(tmp_dir)
+        manifest = {"formato": PARSE_CACHE_FORMAT, "sequencias": {}}
+        for sequencia, data in dados.items():
+            arquivo = f"{sequencia}.arrow"
+            df = data["dataframe"].reset_index(drop=True)
+            feather.write_feather(df, os.path.join(tmp_dir, arquivo))
+            manifest["sequencias"][sequencia] = {
+                "sheet_name": data["sheet_name"],
+                "arquivo": arquivo
+            }
+
+        with open(os.path.join(tmp_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+
+        with _lock:
+            if os.path.exists(entry_dir):
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+            evict_lru()
+        return True
+    except Exception as e:
+        print(f"AVISO: Não foi possível gravar cache da planilha: {e}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return False
+
+
+def _dir_size(path):
+    total = 0
+    for nome in os.listdir(path):
+        caminho = os.path.join(path, nome)
+        if os.path.isfile(caminho):
+            total += os.path.getsize(caminho)
+    return total
+
+
+def evict_lru(max_bytes=None):
+    """
+    Remove as entradas menos recentemente usadas até caber no limite
+
+    Args:
+        max_bytes: Limite em bytes (padrão: PARSE_CACHE_MAX_MB)
+
+    Returns:
+        int: Quantidade de entradas removidas
+    """
+    if max_bytes is None:
+        max_bytes = PARSE_CACHE_MAX_MB * 1024 * 1024
+    if not os.path.isdir(PARSE_CACHE_DIR):
+        return 0
+
+    entradas = []
+    for nome in os.listdir(PARSE_CACHE_DIR):
+        caminho = os.path.join(PARSE_CACHE_DIR, nome)
+        manifest_path = os.path.join(caminho, MANIFEST_NAME)
+        if nome.startswith(".") or not os.path.exists(manifest_path):
+            continue
+        entradas.append((os.path.getmtime(manifest_path), _dir_size(caminho), caminho))
+
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    removidas = 0
+    for _, tamanho, caminho in sorted(entradas):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(caminho, ignore_errors=True)
+        total -= tamanho
+        removidas += 1
+
+    return removidas
@@ -0,0 +1,287 @@
+"""
+Módulo de rastreamento de SQL (opcional, para diagnóstico de desempenho)
+
+Ativado com SQL_TRACE=true. Cada comando executado pelas conexões
+instrumentadas (modules.metrics.InstrumentedConnection) é normalizado
+(literais e parâmetros viram ?) e agregado por quantidade, tempo total e p95.
+O texto expandido de cada execução, obtido com sqlite3.set_trace_callback,
+permite apontar comandos idênticos repetidos; comandos de mesmo formato
+executados muitas vezes na mesma requisição são sinalizados como N+1.
+"""
+import logging
+import math
+import re
+import threading
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+
+from modules import metrics
+
+logger = logging.getLogger(__name__)
+
+# Durações guardadas por comando para o cálculo do p95 (as mais recentes)
+AMOSTRAS_POR_COMANDO = 2048
+# Alertas de N+1/repetição mantidos para o relatório
+MAX_ALERTAS = 100
+# Controle de transação não entra na detecção de N+1
+COMANDOS_IGNORADOS_N_PLUS_ONE = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+_RE_STRING = re.compile(r"'(?:[^']|'')*'")
+_RE_PARAM = re.compile(r"(?<!\w)[:@$]\w+|\?\d*")
+_RE_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+# NULL expandido de parâmetro None (apenas em listas de valores; "IS NULL" é mantido)
+_RE_NULL_VALUE = re.compile(r"(?<=[(,])\s*NULL\s*(?=[,)])", re.IGNORECASE)
+_RE_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_SPACES = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def normalize_sql(sql):
+    """
+    Normaliza um comando SQL para agregação
+
+    Literais, números, parâmetros e NULL em listas de valores viram ?, listas
+    de IN viram (?) e os espaços são colapsados; comandos que diferem só nos
+    valores ficam iguais.
+
+    Args:
+        sql: Texto do comando (com parâmetros ou já expandido)
+
+    Returns:
+        str: Comando normalizado
+    """
+    texto = _RE_STRING.sub("?", sql)
+    texto = _RE_PARAM.sub("?", texto)
+    texto = _RE_NUMBER.sub("?", texto)
+    texto = _RE_NULL_VALUE.sub("?", texto)
+    texto = _RE_IN_LIST.sub("(?)", texto)
+    return _RE_SPACES.sub(" ", texto).strip()
+
+
+def _percentile(valores, percentual):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(percentual / 100 * len(ordenados)) - 1)]
+
+
+class SQLTracer:
+    """Agrega comandos SQL por formato e detecta N+1 por requisição"""
+
+    def __init__(self, n_plus_one_min=10):
+        self.n_plus_one_min = n_plus_one_min
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._request = ContextVar("sql_trace_request", default=None)
+        self.reset()
+
+    def reset(self):
+        """Descarta as estatísticas e alertas acumulados"""
+        with self._lock:
+            self._stats = {}
+            self._alertas = deque(maxlen=MAX_ALERTAS)
+            self._ocorrencias = Counter()
+
+    def on_statement(self, expanded_sql):
+        """
+        Callback de set_trace_callback: guarda o texto expandido até o fim da chamada
+
+        Args:
+            expanded_sql: Comando com os valores dos parâmetros
+        """
+        pendentes = getattr(self._local, "pendentes", None)
+        if pendentes is None:
+            pendentes = self._local.pendentes = []
+        pendentes.append(expanded_sql)
+
+    def record(self, sql, elapsed):
+        """
+        Registra uma chamada execute/executemany/executescript
+
+        Os textos expandidos recebidos pelo callback durante a chamada são
+        associados a ela; os demais (BEGIN/COMMIT implícitos) entram sem tempo.
+
+        Args:
+            sql: Texto do comando como foi passado ao cursor
+            elapsed: Duração da chamada em segundos
+        """
+        comando = normalize_sql(sql) if sql else "?"
+        executados = []
+        pendentes = getattr(self._local, "pendentes", None)
+        if pendentes:
+            self._local.pendentes = []
+            for texto in pendentes:
+                if normalize_sql(texto) == comando:
+                    executados.append(texto)
+                else:
+                    self._add(normalize_sql(texto), 0.0, [texto])
+        self._add(comando, elapsed, executados)
+
+    def _add(self, comando, elapsed, executados):
+        with self._lock:
+            stats = self._stats.get(comando)
+            if stats is None:
+                stats = self._stats[comando] = {
+                    "chamadas": 0, "total": 0.0, "max": 0.0,
+                    "amostras": deque(maxlen=AMOSTRAS_POR_COMANDO)
+                }
+            stats["chamadas"] += 1
+            stats["total"] += elapsed
+            stats["max"] = max(stats["max"], elapsed)
+            stats["amostras"].append(elapsed)
+
+        requisicao = self._request.get()
+        if requisicao is not None:
+            requisicao["formatos"][comando] += 1
+            requisicao["identicos"].update(executados)
+
+    def start_request(self):
+        """
+        Inicia a coleta dos comandos de uma requisição
+
+        Returns:
+            Token para finish_request
+        """
+        return self._request.set({"formatos": Counter(), "identicos": Counter()})
+
+    def finish_request(self, token, rota):
+        """
+        Encerra a coleta da requisição e sinaliza N+1 e comandos repetidos
+
+        Args:
+            token: Retorno de start_request
+            rota: Identificação da requisição (ex: "GET /activities")
+        """
+        requisicao = self._request.get()
+        self._request.reset(token)
+        if not requisicao:
+            return
+
+        identicos_por_formato = Counter()
+        for texto, quantidade in requisicao["identicos"].items():
+            formato = normalize_sql(texto)
+            identicos_por_formato[formato] = max(identicos_por_formato[formato], quantidade)
+
+        for comando, execucoes in requisicao["formatos"].items():
+            if comando.upper().startswith(COMANDOS_IGNORADOS_N_PLUS_ONE):
+                continue
+            identicas = identicos_por_formato[comando]
+            if execucoes >= self.n_plus_one_min:
+                tipo = "n+1"
+            elif identicas >= 2:
+                tipo = "repetida"
+            else:
+                continue
+            alerta = {
+                "tipo": tipo,
+                "rota": rota,
+                "comando": comando,
+                "execucoes": execucoes,
+                "identicas": identicas,
+                "quando": datetime.now().isoformat()
+            }
+            with self._lock:
+                self._alertas.append(alerta)
+                self._ocorrencias[(tipo, rota, comando)] += 1
+            logger.warning(f"SQL {tipo} em {rota}: {execucoes}x ({identicas} idênticas) {comando[:200]}")
+
+    def report(self, limit=50):
+        """
+        Relatório dos comandos agregados
+
+        Args:
+            limit: Quantidade máxima de comandos (ordenados por tempo total)
+
+        Returns:
+            dict: Comandos com chamadas, tempo total, média, p95 e máximo;
+                  ocorrências de N+1/repetição por rota e alertas recentes
+        """
+        with self._lock:
+            itens = [(comando, dict(stats, amostras=list(stats["amostras"])))
+                     for comando, stats in self._stats.items()]
+            ocorrencias = list(self._ocorrencias.items())
+            alertas = list(self._alertas)
+
+        itens.sort(key=lambda item: item[1]["total"], reverse=True)
+        comandos = [{
+            "comando": comando,
+            "chamadas": stats["chamadas"],
+            "tempo_total_ms": round(stats["total"] * 1000, 3),
+            "media_ms": round(stats["total"] * 1000 / stats["chamadas"], 3),
+            "p95_ms": round(_percentile(stats["amostras"], 95) * 1000, 3),
+            "max_ms": round(stats["max"] * 1000, 3)
+        } for comando, stats in itens[:limit]]
+
+        return {
+            "n_plus_one_min": self.n_plus_one_min,
+            "total_comandos": len(itens),
+            "comandos": comandos,
+            "ocorrencias": [
+                {"tipo": tipo, "rota": rota, "comando": comando, "requisicoes": quantidade}
+                for (tipo, rota, comando), quantidade in sorted(ocorrencias, key=lambda item: -item[1])
+            ],
+            "alertas_recentes": alertas
+        }
+
+    def format_report(self, limit=50):
+        """
+        Relatório em texto (para log ou terminal)
+
+        Args:
+            limit: Quantidade máxima de comandos
+
+        Returns:
+            str: Tabela de comandos seguida das ocorrências de N+1/repetição
+        """
+        relatorio = self.report(limit)
+        linhas = [f"{'chamadas':>9} {'total ms':>11} {'média ms':>9} {'p95 ms':>9} {'máx ms':>9}  comando"]
+        for item in relatorio["comandos"]:
+            linhas.append(
+                f"{item['chamadas']:>9} {item['tempo_total_ms']:>11.3f} {item['media_ms']:>9.3f} "
+                f"{item['p95_ms']:>9.3f} {item['max_ms']:>9.3f}  {item['comando'][:160]}"
+            )
+        if relatorio["ocorrencias"]:
+            linhas.append("")
+            linhas.append("Ocorrências de N+1 / comandos repetidos:")
+            for item in relatorio["ocorrencias"]:
+                linhas.append(f"  [{item['tipo']}] {item['rota']} ({item['requisicoes']} requisições): "
+                              f"{item['comando'][:160]}")
+        return "\n".join(linhas) + "\n"
+
+
+_tracer = None
+
+
+def enable(n_plus_one_min=10):
+    """
+    Ativa o rastreamento (conexões abertas a partir daqui recebem o trace callback)
+
+    Args:
+        n_plus_one_min: Execuções do mesmo formato em uma requisição para sinalizar N+1
+
+    Returns:
+        SQLTracer: Rastreador ativo
+    """
+    global _tracer
+    if _tracer is None:
+        _tracer = SQLTracer(n_plus_one_min)
+    _tracer.n_plus_one_min = n_plus_one_min
+    metrics.query_tracer = _tracer
+    return _tracer
+
+
+def disable():
+    """Desativa o rastreamento (as estatísticas coletadas são mantidas)"""
+    metrics.query_tracer = None
+
+
+def get_tracer():
+    """
+    Retorna o rastreador ativo
+
+    Returns:
+        SQLTracer: Rastreador ou None se o rastreamento estiver desativado
+    """
+    return metrics.query_tracer
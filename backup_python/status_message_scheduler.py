@@ -0,0 +1,232 @@
+"""
+Agendador da mensagem de status para WhatsApp (sem Streamlit)
+
+Lê os dados diretamente do banco, gera a mensagem consolidada em intervalos
+fixos e também quando ocorre um evento relevante (CRQ concluída ou novo
+atraso), gravando o resultado na pasta outbox e/ou enviando para um webhook.
+
+Uso:
+    python status_message_scheduler.py [--interval MIN] [--poll SEG] [--outbox DIR] [--webhook URL] [--once]
+
+Parâmetros:
+    --interval, -i: Intervalo entre mensagens completas em minutos (padrão: STATUS_MESSAGE_INTERVAL_MIN)
+    --poll, -p: Intervalo de verificação de alterações no banco em segundos (padrão: STATUS_MESSAGE_POLL_SECONDS)
+    --outbox, -o: Pasta onde as mensagens são gravadas (padrão: STATUS_MESSAGE_OUTBOX_DIR)
+    --webhook, -w: URL que recebe a mensagem via POST (padrão: STATUS_MESSAGE_WEBHOOK_URL)
+    --once: Gera uma única mensagem completa e encerra
+
+Exemplos:
+    python status_message_scheduler.py
+    python status_message_scheduler.py --interval 5 --poll 10
+    python status_message_scheduler.py --once --outbox C:\\mensagens
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+
+from config import (
+    STATUS_MESSAGE_INTERVAL_MIN, STATUS_MESSAGE_POLL_SECONDS,
+    STATUS_MESSAGE_OUTBOX_DIR, STATUS_MESSAGE_WEBHOOK_URL
+)
+from modules.database import DatabaseManager, DataVersionWatcher
+from modules.data_merge import load_merged_data
+from modules.message_builder import build_whatsapp_message, build_message_snapshot, new_delayed_activities
+from modules.data_cache import get_data_version
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def detect_events(snapshot, anterior):
+    """
+    Identifica eventos que justificam um envio imediato
+
+    Args:
+        snapshot: Snapshot atual (build_message_snapshot)
+        anterior: Snapshot do último envio
+
+    Returns:
+        list: Descrição dos eventos (vazia se não houver)
+    """
+    eventos = []
+    crqs_anteriores = anterior.get("crqs", {})
+    for crq, dados in snapshot["crqs"].items():
+        dados_anteriores = crqs_anteriores.get(crq, {})
+        if dados["concluida"] and not dados_anteriores.get("concluida"):
+            eventos.append(f"CRQ {crq} concluída")
+        novas = new_delayed_activities(dados["atrasadas"], dados_anteriores.get("atrasadas", ()))
+        if novas:
+            eventos.append(f"{len(novas)} novo(s) atraso(s) em {crq}")
+    return eventos
+
+
+def write_to_outbox(outbox_dir, message, motivo):
+    """
+    Grava a mensagem na pasta outbox (escrita atômica)
+
+    Args:
+        outbox_dir: Pasta de saída
+        message: Texto da mensagem
+        motivo: Sufixo do arquivo (ex: "agendada", "evento")
+
+    Returns:
+        str: Caminho do arquivo gravado
+    """
+    os.makedirs(outbox_dir, exist_ok=True)
+    nome = f"status_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{motivo}.txt"
+    caminho = os.path.join(outbox_dir, nome)
+    tmp = caminho + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(message)
+    os.replace(tmp, caminho)
+    return caminho
+
+
+def send_to_webhook(url, message, motivo):
+    """
+    Envia a mensagem para o webhook configurado
+
+    Args:
+        url: URL do webhook
+        message: Texto da mensagem
+        motivo: Motivo do envio
+
+    Returns:
+        bool: True se o webhook aceitou a mensagem
+    """
+    import requests
+
+    try:
+        response = requests.post(url, json={"text": message, "motivo": motivo}, timeout=10)
+        response.raise_for_status()
+        return True
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Erro ao enviar mensagem para o webhook: {e}")
+        return False
+
+
+class StatusMessageScheduler:
+    """Gera a mensagem de status em intervalos fixos e em eventos relevantes"""
+
+    def __init__(self, interval_min, poll_seconds, outbox_dir=None, webhook_url=None):
+        self.interval_seconds = interval_min * 60
+        self.poll_seconds = poll_seconds
+        self.outbox_dir = outbox_dir
+        self.webhook_url = webhook_url
+        self.db_manager = DatabaseManager()
+        self._watcher = DataVersionWatcher(self.db_manager.db_path)
+        self._db_version = None
+        self._ultimo_snapshot = None
+        self._ultimo_envio = 0.0
+
+    def database_changed(self):
+        """Verifica (sem ler os dados) se o banco foi alterado desde a última verificação"""
+        versao = self._watcher.version()
+        mudou = versao != self._db_version
+        self._db_version = versao
+        return mudou
+
+    def publish(self, message, motivo):
+        """
+        Publica a mensagem na outbox e/ou no webhook
+
+        Args:
+            message: Texto da mensagem
+            motivo: Motivo do envio
+        """
+        if self.outbox_dir:
+            caminho = write_to_outbox(self.outbox_dir, message, motivo)
+            logger.info(f"Mensagem ({motivo}) gravada em {caminho}")
+        if self.webhook_url and send_to_webhook(self.webhook_url, message, motivo):
+            logger.info(f"Mensagem ({motivo}) enviada para o webhook")
+
+    def tick(self):
+        """
+        Executa uma verificação: envio agendado ou por evento
+
+        Returns:
+            str: Motivo do envio realizado ou None
+        """
+        agendado = time.monotonic() - self._ultimo_envio >= self.interval_seconds
+        if not agendado and not self.database_changed():
+            return None
+
+        data_dict = load_merged_data(self.db_manager)
+        if not data_dict:
+            logger.warning("Nenhum dado salvo no banco; mensagem não gerada")
+            return None
+
+        data_version = get_data_version(data_dict)
+        snapshot = build_message_snapshot(data_dict, data_version=data_version)
+
+        if agendado or self._ultimo_snapshot is None:
+            motivo = "agendada"
+            message = build_whatsapp_message(data_dict, data_version=data_version)
+        else:
+            eventos = detect_events(snapshot, self._ultimo_snapshot)
+            if not eventos:
+                return None
+            logger.info(f"Eventos detectados: {', '.join(eventos)}")
+            motivo = "evento"
+            message = build_whatsapp_message(
+                data_dict, since_snapshot=self._ultimo_snapshot, data_version=data_version
+            )
+
+        self.publish(message, motivo)
+        self._ultimo_snapshot = snapshot
+        self._ultimo_envio = time.monotonic()
+        return motivo
+
+    def run(self):
+        """Loop principal (encerra com Ctrl+C)"""
+        logger.info(f"Agendador iniciado: mensagem completa a cada {self.interval_seconds // 60} min, "
+                    f"verificação de eventos a cada {self.poll_seconds}s")
+        try:
+            while True:
+                try:
+                    self.tick()
+                except Exception as e:
+                    logger.error(f"Erro ao gerar mensagem de status: {e}")
+                time.sleep(self.poll_seconds)
+        except KeyboardInterrupt:
+            logger.info("Agendador encerrado")
+        finally:
+            self._watcher.close()
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description='Gera a mensagem de status para WhatsApp periodicamente')
+    parser.add_argument('--interval', '-i', type=int, default=STATUS_MESSAGE_INTERVAL_MIN,
+                        help='Intervalo entre mensagens completas (minutos)')
+    parser.add_argument('--poll', '-p', type=int, default=STATUS_MESSAGE_POLL_SECONDS,
+                        help='Intervalo de verificação de alterações (segundos)')
+    parser.add_argument('--outbox', '-o', default=STATUS_MESSAGE_OUTBOX_DIR,
+                        help='Pasta onde as mensagens são gravadas')
+    parser.add_argument('--webhook', '-w', default=STATUS_MESSAGE_WEBHOOK_URL,
+                        help='URL do webhook que recebe as mensagens (opcional)')
+    parser.add_argument('--once', action='store_true', help='Gera uma única mensagem e encerra')
+    args = parser.parse_args()
+
+    if not args.outbox and not args.webhook:
+        logger.error("Informe uma pasta outbox ou uma URL de webhook")
+        sys.exit(1)
+
+    scheduler = StatusMessageScheduler(args.interval, args.poll, args.outbox, args.webhook)
+
+    if args.once:
+        if not scheduler.tick():
+            sys.exit(1)
+        return
+
+    scheduler.run()
+
+
+if __name__ == "__main__":
+    main()